@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from cassandra import cqltypes
+from cassandra.query import BatchStatement, BoundStatement, PreparedStatement
+
+# CQL types of the columns used by src.cassandra_utils, for binding
+COLUMN_TYPES = {
+    'ticker': cqltypes.UTF8Type,
+    'indicator': cqltypes.UTF8Type,
+    'bucket': cqltypes.Int32Type,
+    'interval': cqltypes.UTF8Type,
+    'day': cqltypes.SimpleDateType,
+    'ts': cqltypes.DateType,
+    'catalog': cqltypes.UTF8Type,
+    'date': cqltypes.SimpleDateType,
+    'first_date': cqltypes.SimpleDateType,
+    'last_date': cqltypes.SimpleDateType,
+    'open': cqltypes.FloatType,
+    'high': cqltypes.FloatType,
+    'low': cqltypes.FloatType,
+    'close': cqltypes.FloatType,
+    'sma_50': cqltypes.FloatType,
+    'sma_200': cqltypes.FloatType,
+    'value': cqltypes.DoubleType,
+    'volume': cqltypes.LongType,
+    'row_count': cqltypes.LongType,
+    'load_timestamp': cqltypes.DateType,
+    'updated_at': cqltypes.DateType,
+    'keyspace_name': cqltypes.UTF8Type,
+    'table_name': cqltypes.UTF8Type,
+    'column_name': cqltypes.UTF8Type,
+}
+# Indicator columns of the wide price tables (ema_12, rsi_14, ...) are floats
+INDICATOR_COLUMN_TYPE = cqltypes.FloatType
+PROTOCOL_VERSION = 4
+# Number of leading columns that form each table's partition key
+PARTITION_KEY_COLUMNS = {
+    'stock_bars_intraday': 3,
+    'stock_indicators': 2,
+    'stock_prices_by_year': 2,
+    'stock_prices_by_month': 2,
+}
+# Clustering column each row is keyed on within its partition
+CLUSTERING_COLUMNS = {
+    'stock_bars_intraday': 'ts',
+    'ticker_catalog': 'ticker',
+}
+
+ColumnSpec = namedtuple('ColumnSpec', 'keyspace_name table_name name type')
+
+TABLE_PATTERN = re.compile(r'\b(?:INTO|FROM|UPDATE)\s+(?:(\w+)\.)?(\w+)', re.IGNORECASE)
+INSERT_COLUMNS_PATTERN = re.compile(r'\(([^)]*)\)\s*VALUES', re.IGNORECASE)
+SELECT_COLUMNS_PATTERN = re.compile(r'SELECT\s+(.*?)\s+FROM', re.IGNORECASE | re.DOTALL)
+WHERE_MARKER_PATTERN = re.compile(r"(\w+)\s*(=|>=|<=|>|<)\s*(\?|'[^']*')")
+ADD_COLUMN_PATTERN = re.compile(r'ALTER\s+TABLE\s+(?:\w+\.)?(\w+)\s+ADD\s+(\w+)', re.IGNORECASE)
+
+class _EventLoop:
+    """
+    One callback thread, like the driver's event loop. Callbacks scheduled
+    with a delay fire once it has elapsed, in due order.
+    """
+
+    def __init__(self):
+        self.queue = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def call_later(self, delay, fn, *args):
+        with self.condition:
+            heapq.heappush(self.queue, (time.monotonic() + delay, next(self.sequence), fn, args))
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue or self.queue[0][0] > time.monotonic():
+                    timeout = self.queue[0][0] - time.monotonic() if self.queue else None
+                    self.condition.wait(timeout)
+                _, _, fn, args = heapq.heappop(self.queue)
+            fn(*args)
+
+class FakeResponseFuture:
+    """The parts of cassandra.cluster.ResponseFuture that execute_concurrent uses."""
+    has_more_pages = False
+    _col_names = None
+    _col_types = None
+    _continuous_paging_session = None
+
+    def __init__(self, loop, latency, rows=None, error=None):
+        self.loop = loop
+        self.latency = latency
+        self.rows = rows if rows is not None else []
+        self.error = error
+
+    def add_callbacks(self, callback, errback, callback_args=(), errback_args=(),
+                      callback_kwargs=None, errback_kwargs=None):
+        if self.error is not None:
+            self.loop.call_later(self.latency, errback, self.error, *errback_args)
+        else:
+            self.loop.call_later(self.latency, callback, self.rows, *callback_args)
+
+    def clear_callbacks(self):
+        pass
+
+    def result(self):
+        if self.error is not None:
+            raise self.error
+        return self.rows
+
+class FakeCassandraSession:
+    """
+    In-process stand-in for a cassandra Session, for benchmarking the client
+    side of the Cassandra writers without a cluster.
+
+    prepare() returns real PreparedStatements, so batches are bound and
+    serialized exactly as they would be for a server. Writes keep the last
+    serialized row per (table, partition key, clustering key), so rewriting a
+    row replaces it. SELECTs with COUNT(*) return (first date, last date,
+    count) over the partitions whose key starts with the bound values, within
+    any bound date range, which is what the catalog update reads; SELECT
+    DISTINCT returns the partition keys, and system_schema.columns the
+    columns added by ALTER TABLE; other SELECTs return the selected columns
+    of the matching rows.
+    Responses arrive on a single callback thread after `latency` seconds.
+    """
+
+    def __init__(self, latency=0.0, column_types=COLUMN_TYPES):
+        self.latency = latency
+        self.column_types = column_types
+        self.loop = _EventLoop()
+        self.lock = threading.Lock()
+        self.insert_columns = {}
+        self.where_markers = {}
+        self.partitions = defaultdict(lambda: defaultdict(dict))
+        self.added_columns = defaultdict(list)
+        self.rows_written = 0
+        self.requests = 0
+
+    def prepare(self, query):
+        keyspace, table = TABLE_PATTERN.search(query).groups()
+        if query.lstrip().upper().startswith('INSERT'):
+            names = [name.strip() for name in INSERT_COLUMNS_PATTERN.search(query).group(1).split(',')]
+            self.insert_columns[table] = names
+        else:
+            self.where_markers[query] = WHERE_MARKER_PATTERN.findall(query)
+            names = [name for name, _, value in self.where_markers[query] if value == '?']
+        columns = [ColumnSpec(keyspace, table, name, self.column_types.get(name, INDICATOR_COLUMN_TYPE))
+                   for name in names]
+        return PreparedStatement(columns, table.encode(), [0], query, keyspace,
+                                 PROTOCOL_VERSION, None, None)
+
+    def set_keyspace(self, keyspace):
+        pass
+
+    def write(self, table, values):
+        """Records one inserted row of table (serialized values); the caller holds the lock."""
+        names = self.insert_columns[table]
+        key = tuple(values[:PARTITION_KEY_COLUMNS.get(table, 1)])
+        clustering = values[names.index(CLUSTERING_COLUMNS.get(table, 'date'))]
+        self.partitions[table][key][clustering] = values
+        self.rows_written += 1
+
+    def matching_rows(self, table, markers, values):
+        """
+        The rows of the partitions whose key starts with the '=' restrictions,
+        within the range restrictions. Serialized dates are big-endian, so
+        they compare in date order as bytes.
+        """
+        values = iter(values)
+        restrictions = [
+            (op, next(values) if value == '?' else
+             self.column_types[name].serialize(value.strip("'"), PROTOCOL_VERSION))
+            for name, op, value in markers
+        ]
+        prefix = tuple(value for op, value in restrictions if op == '=')
+        bounds = [(op, value) for op, value in restrictions if op != '=']
+        for key, rows in self.partitions[table].items():
+            if key[:len(prefix)] != prefix:
+                continue
+            for clustering, row in rows.items():
+                if all({'>=': clustering >= bound, '<=': clustering <= bound,
+                        '>': clustering > bound, '<': clustering < bound}[op] for op, bound in bounds):
+                    yield clustering, row
+
+    def stats(self, table, markers, values):
+        """(first date, last date, count) over the matching rows of table."""
+        dates = [clustering for clustering, _ in self.matching_rows(table, markers, values)]
+        if not dates:
+            return None, None, 0
+        first, last = [cqltypes.SimpleDateType.deserialize(d, PROTOCOL_VERSION) for d in (min(dates), max(dates))]
+        return first, last, len(dates)
+
+    def select(self, table, query, markers, values):
+        """The selected columns of the matching rows of table, deserialized."""
+        names = self.insert_columns.get(table)
+        if names is None:
+            return []
+        selected = [name.strip() for name in SELECT_COLUMNS_PATTERN.search(query).group(1).split(',')]
+        return [
+            tuple(self.column_types[name].deserialize(row[names.index(name)], PROTOCOL_VERSION)
+                  if row[names.index(name)] is not None else None for name in selected)
+            for _, row in self.matching_rows(table, markers, values)
+        ]
+
+    def distinct(self, table, query):
+        """The partition keys of table, deserialized, like SELECT DISTINCT."""
+        names = [name.strip() for name in SELECT_COLUMNS_PATTERN.search(query).group(1).split(',')]
+        names[0] = names[0].split()[-1]   # drop DISTINCT
+        return [
+            tuple(self.column_types[name].deserialize(value, PROTOCOL_VERSION) for name, value in zip(names, key))
+            for key, rows in self.partitions[table].items() if rows
+        ]
+
+    def respond(self, statement, parameters):
+        """Applies one statement and returns its result rows."""
+        if isinstance(statement, BatchStatement):
+            with self.lock:
+                for _, table, values in statement._statements_and_parameters:
+                    self.write(table.decode(), values)
+            return []
+
+        if isinstance(statement, PreparedStatement):
+            statement = statement.bind(parameters or ())
+        if not isinstance(statement, BoundStatement):
+            added = ADD_COLUMN_PATTERN.search(str(statement))
+            if added:
+                self.added_columns[added.group(1)].append(added.group(2))
+            return []   # plain CQL such as DDL
+
+        prepared = statement.prepared_statement
+        table = prepared.query_id.decode()
+        query = prepared.query_string
+        if query.lstrip().upper().startswith('SELECT'):
+            markers = self.where_markers[query]
+            with self.lock:
+                if 'COUNT(*)' in query.upper():
+                    return [self.stats(table, markers, statement.values)]
+                if 'DISTINCT' in query.upper():
+                    return self.distinct(table, query)
+                if table == 'columns':
+                    # the schema check of ensure_price_columns: (keyspace, table) are bound
+                    name = cqltypes.UTF8Type.deserialize(statement.values[1], PROTOCOL_VERSION)
+                    return [(column,) for column in self.added_columns[name]]
+                return self.select(table, query, markers, statement.values)
+
+        with self.lock:
+            self.write(table, statement.values)
+        return []
+
+    def execute_async(self, statement, parameters=None, *args, **kwargs):
+        self.requests += 1
+        try:
+            rows = self.respond(statement, parameters)
+        except Exception as e:
+            return FakeResponseFuture(self.loop, self.latency, error=e)
+        return FakeResponseFuture(self.loop, self.latency, rows=rows)
+
+    def execute(self, statement, parameters=None, *args, **kwargs):
+        return self.execute_async(statement, parameters).result()
+
+    def submit(self, fn, *args, **kwargs):
+        self.loop.call_later(0, fn, *args)
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,303 @@
+"""
+Benchmark harness for the stock and e-commerce pipeline stages.
+
+Runs every selected stage at one or more workload sizes against local
+stand-ins (embedded Postgres via pgserver, a temporary SQLite file, an
+in-process Cassandra fake) and writes rows/sec, min and median latency and
+peak RSS to a JSON report. With a baseline report, throughput or memory that is
+worse than the baseline by more than --tolerance is flagged as a regression
+and the exit code is 1.
+
+    python benchmarks/run.py --size small
+    python benchmarks/run.py --stage cassandra_load --param batch_rows=20,50,100
+    python benchmarks/run.py --size medium --save-baseline
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+REPEATS = 5
+TOLERANCE = 0.15   # relative slowdown / memory growth tolerated before flagging
+
+# --- Measurement (runs in a fresh child process per case) ---
+
+def reset_peak_rss():
+    """Resets the kernel's high-water mark so setup memory is not attributed to the stage (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxrss / 1024.0
+
+def run_case(stage_name, params, repeats, verbose, results):
+    """Child process body: setup once, then time `repeats` runs of the stage."""
+    from benchmarks.stages import STAGES
+    stage = STAGES[stage_name]
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    try:
+        with output:
+            context = stage['setup'](params)
+            rss_reset = reset_peak_rss()
+            durations = []
+            rows = 0
+            try:
+                for _ in range(repeats):
+                    if stage.get('reset'):
+                        stage['reset'](context, params)
+                    start = time.perf_counter()
+                    rows = stage['run'](context, params) or 0
+                    durations.append(time.perf_counter() - start)
+            finally:
+                if stage.get('teardown'):
+                    stage['teardown'](context)
+        results.put({'rows': rows, 'durations': durations, 'peak_rss_mb': peak_rss_mb(),
+                     'rss_excludes_setup': rss_reset})
+    except Exception as e:
+        results.put({'error': f"{type(e).__name__}: {e}"})
+
+def summarize(stage_name, params, measurement):
+    result = {'stage': stage_name, 'params': params}
+    if 'error' in measurement:
+        result['error'] = measurement['error']
+        return result
+    durations = measurement['durations']
+    median = statistics.median(durations)
+    result.update({
+        'rows': measurement['rows'],
+        'repeats': len(durations),
+        'rows_per_sec': measurement['rows'] / median if median else None,
+        # a handful of repetitions supports no tail percentiles
+        'latency_ms': {'min': round(min(durations) * 1000.0, 2), 'median': round(median * 1000.0, 2)},
+        'peak_rss_mb': round(measurement['peak_rss_mb'], 1),
+        'rss_excludes_setup': measurement['rss_excludes_setup'],
+    })
+    return result
+
+def measure(stage_name, params, repeats, verbose):
+    """Runs one case in a spawned process, so imports, caches and peak RSS are its own."""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=run_case, args=(stage_name, params, repeats, verbose, results))
+    process.start()
+    while True:
+        try:
+            measurement = results.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                measurement = {'error': f"benchmark process exited with code {process.exitcode}"}
+                break
+    process.join()
+    return summarize(stage_name, params, measurement)
+
+# --- Environment ---
+
+@contextlib.contextmanager
+def postgres(mode):
+    """
+    Yields True when a Postgres server is available to the stages.
+    'embedded' starts a throwaway pgserver instance; 'env' uses the PG_*
+    settings as they are (benchmark tables are truncated, so point them at a
+    scratch database); 'none' skips the Postgres stages.
+    """
+    if mode == 'none':
+        yield False
+        return
+    if mode == 'env':
+        yield True
+        return
+    try:
+        import pgserver
+    except ImportError:
+        print("pgserver is not installed; skipping the Postgres stages (use --postgres env for a real server).")
+        yield False
+        return
+
+    data_dir = tempfile.mkdtemp(prefix='bench_pg_')
+    server = pgserver.get_server(data_dir, cleanup_mode='delete')
+    # children inherit the environment; src.connections reads PG_* at import
+    os.environ.update(PG_HOST=data_dir, PG_DATABASE='postgres', PG_USER='postgres',
+                      PG_PASSWORD='', PG_PORT='5432')
+    try:
+        yield True
+    finally:
+        server.cleanup()
+
+@contextlib.contextmanager
+def scratch_lake():
+    """Points the Parquet lake (src.lake) at a temporary directory for the run."""
+    lake_dir = tempfile.mkdtemp(prefix='bench_lake_')
+    # children inherit the environment; src.lake reads LAKE_DIR at import
+    os.environ['LAKE_DIR'] = lake_dir
+    try:
+        yield lake_dir
+    finally:
+        shutil.rmtree(lake_dir, ignore_errors=True)
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+# --- Baseline comparison ---
+
+def case_key(result):
+    return result['stage'] + ' ' + json.dumps(result['params'], sort_keys=True)
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regression messages, printing a comparison line per case."""
+    previous = {case_key(r): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for result in results:
+        base = previous.get(case_key(result))
+        if base is None or 'error' in result:
+            continue
+        line = f"{result['stage']:<16} {json.dumps(result['params'], sort_keys=True)}"
+        if base['rows_per_sec'] and result['rows_per_sec'] is not None:
+            change = result['rows_per_sec'] / base['rows_per_sec'] - 1.0
+            line += f"  rows/sec {change:+.1%}"
+            if change < -tolerance:
+                regressions.append(f"{line}: throughput regression")
+        if base['peak_rss_mb']:
+            growth = result['peak_rss_mb'] / base['peak_rss_mb'] - 1.0
+            line += f"  peak RSS {growth:+.1%}"
+            if growth > tolerance:
+                regressions.append(f"{line}: memory regression")
+        print(line)
+    return regressions
+
+# --- CLI ---
+
+def parse_param(text):
+    """'batch_rows=20,50' -> ('batch_rows', [20, 50]); values are parsed as JSON when possible."""
+    name, _, values = text.partition('=')
+    parsed = []
+    for value in values.split(','):
+        try:
+            parsed.append(json.loads(value))
+        except ValueError:
+            parsed.append(value)
+    return name, parsed
+
+def expand_cases(stages, sizes, overrides):
+    """Yields (stage, params) for every stage x size x combination of --param values."""
+    from benchmarks.stages import SIZES, STAGES
+    for stage_name in stages:
+        stage = STAGES[stage_name]
+        known = set(stage['sizes']) | set(stage['params'])
+        for size in sizes:
+            base = {key: SIZES[size][key] for key in stage['sizes']}
+            base.update(stage['params'])
+            names = [name for name in overrides if name in known]
+            for values in itertools.product(*(overrides[name] for name in names)):
+                params = dict(base, size=size)
+                params.update(zip(names, values))
+                yield stage_name, params
+
+def parse_args(argv):
+    from benchmarks.stages import SIZES, STAGES
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages.")
+    parser.add_argument('--stage', action='append', choices=sorted(STAGES),
+                        help="stage to run (repeatable; default: all)")
+    parser.add_argument('--size', action='append', choices=list(SIZES),
+                        help="workload size (repeatable; default: small)")
+    parser.add_argument('--param', action='append', default=[], type=parse_param,
+                        help="override a stage or size parameter, e.g. batch_size=1000,10000")
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--postgres', choices=['embedded', 'env', 'none'], default='embedded')
+    parser.add_argument('--output', help="report path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="also write the report to the baseline path")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--verbose', action='store_true', help="show the stages' own output")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from benchmarks.stages import STAGES
+    args = parse_args(argv)
+    stages = args.stage or list(STAGES)
+    sizes = args.size or ['small']
+    overrides = dict(args.param)
+
+    results = []
+    with postgres(args.postgres) as have_postgres, scratch_lake():
+        for stage_name, params in expand_cases(stages, sizes, overrides):
+            if STAGES[stage_name]['requires'] == 'postgres' and not have_postgres:
+                print(f"Skipping {stage_name}: no Postgres.")
+                continue
+            print(f"Running {stage_name} {json.dumps(params, sort_keys=True)}...")
+            result = measure(stage_name, params, args.repeats, args.verbose)
+            if 'error' in result:
+                print(f"  failed: {result['error']}")
+            else:
+                print(f"  {result['rows']} rows, {result['rows_per_sec'] or 0:,.0f} rows/sec, "
+                      f"median {result['latency_ms']['median']} ms, peak RSS {result['peak_rss_mb']} MB")
+            results.append(result)
+
+    report = {'environment': environment_info(), 'results': results}
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nComparing with baseline {args.baseline} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    failed = any('error' in r for r in results)
+    return 1 if regressions or failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,246 @@
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# ingestion_script and data_generator use bare imports from src/
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+from src import cassandra_utils, extract, indicators, intraday, lake, load, transform, transformation_script
+from src.db_utils import initialize_database, pg_connection
+from src.price_sources import SyntheticSource, synthetic_tickers
+import data_generator
+import ingestion_script
+from benchmarks.fakes import FakeCassandraSession
+
+SEED = 42
+# The columns the Cassandra loader stores
+SMA_INDICATORS = [{'indicator': 'sma', 'window': 50}, {'indicator': 'sma', 'window': 200}]
+
+# Workload sizes; any value can be overridden with --param on the command line
+SIZES = {
+    'small': {'tickers': 20, 'days': 730, 'transactions': 20000, 'users': 2000, 'products': 200},
+    'medium': {'tickers': 200, 'days': 2920, 'transactions': 200000, 'users': 20000, 'products': 2000},
+    'large': {'tickers': 2000, 'days': 7300, 'transactions': 2000000, 'users': 200000, 'products': 20000},
+}
+
+# --- Shared setup helpers ---
+
+def truncate(*tables):
+    with pg_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+        conn.commit()
+        cursor.close()
+
+def load_synthetic_raw(params):
+    """Fills raw_stock_data with params['tickers'] synthetic tickers over params['days'] days."""
+    initialize_database()
+    truncate('raw_stock_data', 'analyzed_stock_data')
+    tickers = synthetic_tickers(params['tickers'])
+    extract.fetch_and_load_data(tickers, backfill=True, fetch_fn=SyntheticSource(seed=SEED),
+                                lookback_days=params['days'])
+    return tickers
+
+def synthetic_analyzed_frame(params):
+    """A transform_data-shaped frame built in memory, without Postgres."""
+    tickers = synthetic_tickers(params['tickers'])
+    end = pd.Timestamp.now().normalize()
+    start = end - pd.Timedelta(days=params['days'])
+    frames = SyntheticSource(seed=SEED)(tickers, start, end)
+    df = pd.concat(
+        [frame[['Close']].assign(Ticker=ticker) for ticker, frame in frames.items()]
+    ).reset_index()
+    df = indicators.compute_indicators(df[['Date', 'Ticker', 'Close']], SMA_INDICATORS)
+    df['Date'] = df['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+def synthetic_transactions(params):
+    """Raw transactions as dicts, shaped like the rows extract_raw_data yields."""
+    users, products = data_generator.generate_master_data(params['users'], params['products'], SEED)
+    columns = data_generator.generate_transactions(
+        np.random.default_rng(SEED),
+        np.array([u['user_id'] for u in users]),
+        np.array([p['product_id'] for p in products]),
+        np.array([p['unit_price'] for p in products]),
+        0, params['transactions'], params['transactions'], pd.Timestamp('2025-01-01').to_pydatetime()
+    )
+    names = ['transaction_id', 'user_id', 'product_id', 'quantity', 'price', 'timestamp']
+    values = [columns[name].tolist() if isinstance(columns[name], np.ndarray) else columns[name]
+              for name in names]
+    # ingest_seq follows the raw rows' insertion order, as the BIGSERIAL would
+    return [dict(zip(names, row), ingest_seq=seq) for seq, row in enumerate(zip(*values), 1)]
+
+# --- Stages ---
+# sizes: the SIZES keys the stage depends on
+# setup(params) -> context, called once per process and not timed
+# reset(context, params), called before every timed repetition (optional)
+# run(context, params) -> rows processed, timed
+
+def setup_extract(params):
+    initialize_database()
+    return {'tickers': synthetic_tickers(params['tickers']), 'source': SyntheticSource(seed=SEED)}
+
+def reset_extract(context, params):
+    # every repetition starts from empty raw tables (and lake), so it backfills the same rows
+    truncate('raw_stock_data', 'raw_intraday_bars')
+    shutil.rmtree(lake.dataset_dir(lake.RAW_DATASET), ignore_errors=True)
+
+def run_extract(context, params):
+    return extract.fetch_and_load_data(context['tickers'], backfill=True, fetch_fn=context['source'],
+                                       batch_size=params['batch_size'], max_workers=params['workers'],
+                                       lookback_days=params['days'], interval=params['interval'])
+
+def setup_rollup(params):
+    initialize_database()
+    truncate('raw_intraday_bars', 'intraday_rollups')
+    tickers = synthetic_tickers(params['tickers'])
+    extract.fetch_and_load_data(tickers, backfill=True, fetch_fn=SyntheticSource(seed=SEED),
+                                lookback_days=params['days'], interval=params['interval'])
+    return {'tickers': tickers}
+
+def reset_rollup(context, params):
+    truncate('intraday_rollups')
+
+def run_rollup(context, params):
+    intraday.rollup_intraday(context['tickers'], params['interval'], full_refresh=True)
+    # throughput is measured in source bars
+    with pg_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM raw_intraday_bars WHERE "Interval" = %s', (params['interval'],))
+        bars = cursor.fetchone()[0]
+        cursor.close()
+    return bars
+
+def setup_transform(params):
+    return {'tickers': load_synthetic_raw(params)}
+
+def run_transform(context, params):
+    return len(transform.transform_data(context['tickers'], full_refresh=True, source=params['source']))
+
+def setup_load(params):
+    tickers = load_synthetic_raw(params)
+    return {'df': transform.transform_data(tickers, full_refresh=True)}
+
+def reset_load(context, params):
+    truncate('analyzed_stock_data', 'stock_indicators')
+
+def run_load(context, params):
+    # load_data adds a column to the frame it is given
+    return load.load_data(context['df'].copy(), layout=params['layout'])
+
+def setup_cassandra_load(params):
+    session = FakeCassandraSession(latency=params['latency_ms'] / 1000.0)
+    cassandra_utils.get_cassandra_session = lambda keyspace=None: session
+    return {'df': synthetic_analyzed_frame(params)}
+
+def run_cassandra_load(context, params):
+    if params['layout'] == 'long':
+        return cassandra_utils.load_indicators_to_cassandra(context['df'], concurrency=params['concurrency'],
+                                                            batch_rows=params['batch_rows'])
+    return cassandra_utils.load_data_to_cassandra(context['df'], concurrency=params['concurrency'],
+                                                  batch_rows=params['batch_rows'], bucketing=params['bucketing'])
+
+def setup_cassandra_intraday_load(params):
+    session = FakeCassandraSession(latency=params['latency_ms'] / 1000.0)
+    cassandra_utils.get_cassandra_session = lambda keyspace=None: session
+    tickers = synthetic_tickers(params['tickers'])
+    end = pd.Timestamp.now().normalize()
+    start = end - pd.Timedelta(days=min(params['days'], intraday.INTRADAY_LOOKBACK_DAYS[params['interval']]))
+    frames = SyntheticSource(seed=SEED)(tickers, start, end, interval=params['interval'])
+    bars = pd.concat(
+        [extract.prepare_intraday_frame(ticker, frame, None, params['interval']) for ticker, frame in frames.items()],
+        ignore_index=True
+    )
+    return {'df': bars}
+
+def run_cassandra_intraday_load(context, params):
+    return cassandra_utils.load_intraday_to_cassandra(context['df'], concurrency=params['concurrency'],
+                                                      batch_rows=params['batch_rows'])
+
+def setup_ingest(params):
+    work_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+    path = data_generator.main([
+        '--transactions', str(params['transactions']), '--users', str(params['users']),
+        '--products', str(params['products']), '--seed', str(SEED), '--start', '2025-01-01T00:00:00',
+        '--format', params['format'], '--workers', '1', '--output-dir', work_dir,
+    ])
+    ingestion_script.DB_PATH = os.path.join(work_dir, 'warehouse.db')
+    return {'path': path, 'work_dir': work_dir}
+
+def reset_ingest(context, params):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(ingestion_script.DB_PATH + suffix):
+            os.remove(ingestion_script.DB_PATH + suffix)
+
+def run_ingest(context, params):
+    return ingestion_script.ingest_data(context['path'], batch_size=params['batch_size'])
+
+def teardown_ingest(context):
+    shutil.rmtree(context['work_dir'], ignore_errors=True)
+
+def setup_star_schema(params):
+    with pg_connection() as conn:
+        transformation_script.initialize_dwh(conn)
+    return {'raw_data': synthetic_transactions(params)}
+
+def reset_star_schema(context, params):
+    truncate('fact_orders', 'dim_users', 'dim_products')
+    transformation_script.USER_KEYS.clear()
+    transformation_script.PRODUCT_KEYS.clear()
+
+def run_star_schema(context, params):
+    return transformation_script.transform_and_load(context['raw_data'])
+
+STAGES = {
+    'extract': {
+        'sizes': ('tickers', 'days'),
+        'requires': 'postgres',
+        'params': {'batch_size': extract.BATCH_SIZE, 'workers': extract.MAX_WORKERS, 'interval': '1d'},
+        'setup': setup_extract, 'reset': reset_extract, 'run': run_extract,
+    },
+    # intraday lookbacks are capped (INTRADAY_LOOKBACK_DAYS), so 'days' saturates quickly
+    'rollup': {
+        'sizes': ('tickers', 'days'),
+        'requires': 'postgres', 'params': {'interval': '5m'},
+        'setup': setup_rollup, 'reset': reset_rollup, 'run': run_rollup,
+    },
+    'transform': {
+        'sizes': ('tickers', 'days'),
+        'requires': 'postgres', 'params': {'source': 'postgres'},
+        'setup': setup_transform, 'run': run_transform,
+    },
+    'load': {
+        'sizes': ('tickers', 'days'),
+        'requires': 'postgres', 'params': {'layout': 'wide'},
+        'setup': setup_load, 'reset': reset_load, 'run': run_load,
+    },
+    'cassandra_load': {
+        'sizes': ('tickers', 'days'),
+        'requires': None,
+        'params': {'concurrency': cassandra_utils.WRITE_CONCURRENCY, 'batch_rows': cassandra_utils.BATCH_ROWS,
+                   'latency_ms': 0.0, 'layout': 'wide', 'bucketing': 'none'},
+        'setup': setup_cassandra_load, 'run': run_cassandra_load,
+    },
+    'cassandra_intraday_load': {
+        'sizes': ('tickers', 'days'),
+        'requires': None,
+        'params': {'concurrency': cassandra_utils.WRITE_CONCURRENCY, 'batch_rows': cassandra_utils.BATCH_ROWS,
+                   'latency_ms': 0.0, 'interval': '5m'},
+        'setup': setup_cassandra_intraday_load, 'run': run_cassandra_intraday_load,
+    },
+    'ingest': {
+        'sizes': ('transactions', 'users', 'products'),
+        'requires': None, 'params': {'batch_size': ingestion_script.BATCH_SIZE, 'format': 'jsonl'},
+        'setup': setup_ingest, 'reset': reset_ingest, 'run': run_ingest, 'teardown': teardown_ingest,
+    },
+    'star_schema': {
+        'sizes': ('transactions', 'users', 'products'),
+        'requires': 'postgres', 'params': {},
+        'setup': setup_star_schema, 'reset': reset_star_schema, 'run': run_star_schema,
+    },
+}
@@ -2,48 +2,118 @@ from __future__ import annotations
 import pendulum
 import sys
 import os
+from airflow.decorators import task, task_group
+from airflow.exceptions import AirflowSkipException
 from airflow.models.dag import DAG
-from airflow.operators.python import PythonOperator 
+from airflow.models.param import Param
+from airflow.operators.python import PythonOperator
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.db_utils import initialize_database
-from src.extract import fetch_and_load_data, TICKERS
-from src.transform import transform_data
+from src.extract import fetch_and_load_data, make_ticker_shards, TICKERS, TICKER_SHARD_SIZE, LOOKBACK_DAYS, INTERVALS
+from src.intraday import is_intraday, rollup_intraday
+from src.price_sources import PRICE_SOURCES, get_price_source, synthetic_tickers
+from src.transform import transform_to_artifact, TRANSFORM_SOURCES, STORAGE_LAYOUTS
 from src.load import load_data
+from src.metrics import push_metrics
+
+# Upper bound on shards running the same step at once
+MAX_PARALLEL_SHARDS = 8
 
 with DAG(
     dag_id="stock_price_etl_pipeline",
     start_date=pendulum.datetime(2024, 1, 1, tz="UTC"),
-    schedule=None, 
+    schedule=None,
     catchup=False,
     tags=["etl", "stock_market"],
+    params={
+        # Set to true on a manual trigger to re-download the full history window
+        "backfill": Param(False, type="boolean"),
+        "shard_size": Param(TICKER_SHARD_SIZE, type="integer", minimum=1),
+        "lookback_days": Param(LOOKBACK_DAYS, type="integer", minimum=1),
+        # "synthetic" generates seeded GBM bars offline, for load testing
+        "price_source": Param("yfinance", type="string", enum=sorted(PRICE_SOURCES)),
+        # With the synthetic source: size of a made-up ticker universe (0 = TICKERS)
+        "synthetic_tickers": Param(0, type="integer", minimum=0),
+        "seed": Param(0, type="integer"),
+        # "lake" reads raw closes from the Parquet lake instead of raw_stock_data
+        "transform_source": Param("postgres", type="string", enum=list(TRANSFORM_SOURCES)),
+        # Recompute the SMAs over the whole history instead of only new bars
+        "full_refresh": Param(False, type="boolean"),
+        # "long" stores one row per indicator value in stock_indicators instead of analyzed_stock_data
+        "storage_layout": Param("wide", type="string", enum=list(STORAGE_LAYOUTS)),
+        # "1m"/"5m" ingest intraday bars into raw_intraday_bars and roll them up hourly/daily
+        "interval": Param("1d", type="string", enum=list(INTERVALS)),
+    },
     default_args={
         "owner": "airflow",
         "retries": 1,
     }
 ) as dag:
-    
+
     t1 = PythonOperator(
         task_id="initialize_database",
         python_callable=initialize_database,
     )
 
-    t2 = PythonOperator(
-        task_id="extract_raw_data",
-        python_callable=fetch_and_load_data,
-        op_kwargs={"tickers": TICKERS},
-    )
+    def push_task_metrics(ti):
+        # one Pushgateway group per task (and shard), so mapped tasks don't overwrite each other
+        push_metrics("stock_price_etl_pipeline", {"task": ti.task_id, "map_index": str(ti.map_index)})
 
-    t3 = PythonOperator(
-        task_id="transform_data",
-        python_callable=transform_data,
-    )
+    def price_source(params):
+        if params["price_source"] == "synthetic":
+            return get_price_source("synthetic", seed=params["seed"])
+        return get_price_source(params["price_source"])
 
-    t4 = PythonOperator(
-        task_id="load_analyzed_data",
-        python_callable=load_data,
-        op_kwargs={"transformed_df": t3.output},
-    )
+    @task(task_id="plan_ticker_shards")
+    def plan_ticker_shards(params=None):
+        tickers = TICKERS
+        if params["price_source"] == "synthetic" and params["synthetic_tickers"]:
+            tickers = synthetic_tickers(params["synthetic_tickers"])
+        return make_ticker_shards(tickers, params["shard_size"])
+
+    @task_group(group_id="ticker_shard")
+    def process_shard(tickers):
+        """One extract >> transform >> load chain per shard, retried independently."""
+
+        @task(task_id="extract_raw_data", retries=3, max_active_tis_per_dagrun=MAX_PARALLEL_SHARDS)
+        def extract(tickers, params=None, ti=None):
+            try:
+                return fetch_and_load_data(tickers, backfill=params["backfill"],
+                                           fetch_fn=price_source(params),
+                                           lookback_days=params["lookback_days"],
+                                           interval=params["interval"])
+            finally:
+                push_task_metrics(ti)
+
+        @task(task_id="transform_data", retries=2, max_active_tis_per_dagrun=MAX_PARALLEL_SHARDS)
+        def transform(tickers, params=None, ti=None):
+            # Only the artifact manifest goes through XCom, not the DataFrame
+            try:
+                if is_intraday(params["interval"]):
+                    # intraday bars are rolled up in Postgres; nothing to hand to the load
+                    return rollup_intraday(tickers, params["interval"], full_refresh=params["full_refresh"])
+                return transform_to_artifact(tickers, full_refresh=params["full_refresh"],
+                                             source=params["transform_source"],
+                                             layout=params["storage_layout"])
+            finally:
+                push_task_metrics(ti)
+
+        @task(task_id="load_analyzed_data", retries=2, max_active_tis_per_dagrun=MAX_PARALLEL_SHARDS)
+        def load(artifact, params=None, ti=None):
+            if is_intraday(params["interval"]):
+                raise AirflowSkipException("Intraday runs have no indicator artifact to load.")
+            try:
+                return load_data(artifact=artifact, layout=params["storage_layout"],
+                                 replace=params["full_refresh"])
+            finally:
+                push_task_metrics(ti)
+
+        manifest = transform(tickers)
+        extract(tickers) >> manifest
+        load(manifest)
 
-    t1 >> t2 >> t3 >> t4
\ No newline at end of file
+    shards = plan_ticker_shards()
+    t1 >> shards
+    process_shard.expand(tickers=shards)
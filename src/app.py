@@ -1,38 +1,207 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-from cassandra.cluster import Cluster
+from datetime import date, timedelta
+from cassandra.concurrent import execute_concurrent_with_args
 from cassandra.query import dict_factory
 import plotly.express as px
 
+# `streamlit run src/app.py` only puts src/ on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.cassandra_utils import (
+    CASSANDRA_KEYSPACE,
+    PRICE_BUCKETING,
+    PRICE_TABLES,
+    TICKER_CATALOG_PARTITION,
+    buckets_between
+)
+from src.connections import get_cassandra_cluster
+from src.downsample import lttb, min_max
+
 # Configuration
-CASSANDRA_HOSTS = ['cassandra']
-CASSANDRA_KEYSPACE = 'stock_keyspace'
+CACHE_TTL_SECONDS = 300
+LOAD_VERSION_TTL_SECONDS = 30   # how quickly a new load becomes visible
+PAGE_SIZE = 5000           # rows per Cassandra page
+READ_CONCURRENCY = 32      # bucket queries in flight for one chart
+DEFAULT_RANGE_DAYS = 365 * 2
+# 'long' reads stock_indicators (one partition per ticker and series) instead of stock_prices
+STORAGE_LAYOUT = os.environ.get('STORAGE_LAYOUT', 'wide')
+# Chart column -> series name in stock_indicators
+CHART_SERIES = {'close': 'Close', 'sma_50': 'SMA_50', 'sma_200': 'SMA_200'}
+# Points kept per series, about the chart's width in pixels; more can't be told apart
+CHART_POINTS = int(os.environ.get('CHART_POINTS', '1500'))
+# 'lttb' keeps the line's shape, 'minmax' every spike
+CHART_DOWNSAMPLER = os.environ.get('CHART_DOWNSAMPLER', 'lttb')
+# Above this many plotted points the traces are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_THRESHOLD = 1000
+
+# The date predicate is pushed down onto the clustering key
+SELECT_PRICES_CQL = """
+SELECT date, close, sma_50, sma_200 FROM stock_prices
+WHERE ticker = ? AND date >= ? AND date <= ?
+"""
+# Single-partition read of the catalog maintained by the load step
+SELECT_TICKER_CATALOG_CQL = """
+SELECT ticker, first_date, last_date, row_count FROM ticker_catalog WHERE catalog = ?
+"""
+# Rows are clustered by date DESC, so the first row is the most recent bar
+SELECT_LATEST_LOAD_CQL = "SELECT load_timestamp FROM stock_prices WHERE ticker = ? LIMIT 1"
+
+# Bucketed stock_prices (PRICE_BUCKETING): one query per (ticker, bucket) partition
+SELECT_BUCKET_PRICES_CQL = """
+SELECT date, close, sma_50, sma_200 FROM {table}
+WHERE ticker = ? AND bucket = ? AND date >= ? AND date <= ?
+"""
+# The newest bar's bucket is not known up front, but the catalog entry is rewritten by every load
+SELECT_CATALOG_UPDATED_CQL = "SELECT updated_at FROM ticker_catalog WHERE catalog = ? AND ticker = ?"
+
+# Long layout: one query per series partition, pivoted client-side
+SELECT_SERIES_CQL = """
+SELECT date, value FROM stock_indicators
+WHERE ticker = ? AND indicator = ? AND date >= ? AND date <= ?
+"""
+SELECT_LATEST_SERIES_LOAD_CQL = """
+SELECT load_timestamp FROM stock_indicators WHERE ticker = ? AND indicator = 'Close' LIMIT 1
+"""
 
 @st.cache_resource
 def get_cassandra_session():
     """Connects to the Cassandra cluster and returns a session."""
     try:
-        cluster = Cluster(CASSANDRA_HOSTS)
-        session = cluster.connect(CASSANDRA_KEYSPACE)
+        # Dedicated session: the dashboard switches it to dict rows
+        session = get_cassandra_cluster().connect(CASSANDRA_KEYSPACE)
         session.row_factory = dict_factory
         return session
     except Exception as e:
         st.error(f"Could not connect to Cassandra: {e}")
         return None
 
-def fetch_stock_data(session, ticker):
-    """Fetches all historical data for a given ticker from Cassandra."""
-    query = f"SELECT date, close, sma_50, sma_200 FROM stock_prices WHERE ticker = '{ticker}'"
-    rows = session.execute(query)
+@st.cache_resource
+def get_prepared_statements(_session):
+    """Prepares the dashboard queries once per session."""
+    if STORAGE_LAYOUT == 'long':
+        series = _session.prepare(SELECT_SERIES_CQL)
+        series.fetch_size = PAGE_SIZE
+        return {
+            'series': series,
+            'latest_load': _session.prepare(SELECT_LATEST_SERIES_LOAD_CQL),
+            'catalog': _session.prepare(SELECT_TICKER_CATALOG_CQL),
+        }
+    if PRICE_BUCKETING != 'none':
+        prices = _session.prepare(SELECT_BUCKET_PRICES_CQL.format(table=PRICE_TABLES[PRICE_BUCKETING]))
+        prices.fetch_size = PAGE_SIZE
+        return {
+            'prices': prices,
+            'latest_load': _session.prepare(SELECT_CATALOG_UPDATED_CQL),
+            'catalog': _session.prepare(SELECT_TICKER_CATALOG_CQL),
+        }
+    return {
+        'prices': _session.prepare(SELECT_PRICES_CQL),
+        'latest_load': _session.prepare(SELECT_LATEST_LOAD_CQL),
+        'catalog': _session.prepare(SELECT_TICKER_CATALOG_CQL),
+    }
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def fetch_ticker_catalog(_session):
+    """
+    Returns the ticker catalog (ticker, first_date, last_date, row_count).
+    Falls back to a DISTINCT scan if the catalog has not been populated yet.
+    """
+    statement = get_prepared_statements(_session)['catalog']
+    catalog = pd.DataFrame(list(_session.execute(statement, (TICKER_CATALOG_PARTITION,))))
+    if catalog.empty and STORAGE_LAYOUT == 'long':
+        rows = _session.execute("SELECT DISTINCT ticker, indicator FROM stock_indicators")
+        catalog = pd.DataFrame({'ticker': sorted({row['ticker'] for row in rows})})
+    elif catalog.empty and PRICE_BUCKETING != 'none':
+        rows = _session.execute(f"SELECT DISTINCT ticker, bucket FROM {PRICE_TABLES[PRICE_BUCKETING]}")
+        catalog = pd.DataFrame({'ticker': sorted({row['ticker'] for row in rows})})
+    elif catalog.empty:
+        rows = _session.execute("SELECT DISTINCT ticker FROM stock_prices")
+        catalog = pd.DataFrame({'ticker': [row['ticker'] for row in rows]})
+    return catalog
+
+@st.cache_data(ttl=LOAD_VERSION_TTL_SECONDS, show_spinner=False)
+def get_load_version(_session, ticker):
+    """Returns the load_timestamp of the newest bar; it changes whenever a new load lands."""
+    statement = get_prepared_statements(_session)['latest_load']
+    if STORAGE_LAYOUT != 'long' and PRICE_BUCKETING != 'none':
+        row = _session.execute(statement, (TICKER_CATALOG_PARTITION, ticker)).one()
+        return row['updated_at'] if row else None
+    row = _session.execute(statement, (ticker,)).one()
+    return row['load_timestamp'] if row else None
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=256, show_spinner=False)
+def fetch_stock_data(_session, ticker, start_date, end_date, load_version=None):
+    """
+    Fetches one ticker's bars between start_date and end_date (inclusive).
+    Results are cached per (ticker, range, load_version); passing the current
+    load_version invalidates the entry as soon as a new load lands.
+    With PRICE_BUCKETING set, the buckets overlapping the range are queried
+    concurrently and their rows concatenated in date order.
+    """
+    statement = get_prepared_statements(_session)['prices']
+    if PRICE_BUCKETING != 'none':
+        # newest bucket first, so the rows arrive newest first as from a single partition
+        buckets = buckets_between(start_date, end_date, PRICE_BUCKETING)[::-1]
+        # raises on the first failed query, like a single execute
+        results = execute_concurrent_with_args(_session, statement,
+                                               [(ticker, bucket, start_date, end_date) for bucket in buckets],
+                                               concurrency=READ_CONCURRENCY)
+        rows = [row for _, result in results for row in result]
+    else:
+        bound = statement.bind((ticker, start_date, end_date))
+        bound.fetch_size = PAGE_SIZE
+        rows = list(_session.execute(bound))
     df = pd.DataFrame(rows)
     
     if df.empty:
         return pd.DataFrame()
         
-    # Convert date to datetime object for plotting
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values(by='date')
-    return df
+    # Convert date to datetime object for plotting; rows arrive newest first
+    df['date'] = pd.to_datetime(df['date'].astype(str))
+    return df.iloc[::-1].reset_index(drop=True)
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=256, show_spinner=False)
+def fetch_series_data(_session, ticker, start_date, end_date, load_version=None, columns=tuple(CHART_SERIES)):
+    """
+    Long-layout counterpart of fetch_stock_data: reads each series partition
+    of stock_indicators concurrently and pivots them into one frame with a
+    column per series, oldest bar first.
+    """
+    statement = get_prepared_statements(_session)['series']
+    parameters = [(ticker, CHART_SERIES[column], start_date, end_date) for column in columns]
+    # raises on the first failed query, like a single execute
+    results = execute_concurrent_with_args(_session, statement, parameters)
+
+    series = {}
+    for column, (_, rows) in zip(columns, results):
+        values = pd.DataFrame(list(rows), columns=['date', 'value'])
+        series[column] = values.set_index('date')['value']
+    df = pd.concat(series, axis=1)
+    if df.empty:
+        return pd.DataFrame()
+
+    df.index = pd.to_datetime(df.index.astype(str))
+    return df.sort_index().rename_axis('date').reset_index()
+
+def downsample_series(df, columns, points=CHART_POINTS):
+    """
+    Melts df into (date, Metric, Value) rows for plotting, reducing each
+    series to at most about `points` points with CHART_DOWNSAMPLER. Series
+    that already fit are kept at full resolution.
+    """
+    frames = []
+    for column in columns:
+        series = df[['date', column]].dropna()
+        dates, values = series['date'].to_numpy(), series[column].to_numpy()
+        if CHART_DOWNSAMPLER == 'minmax':
+            keep = min_max(values, points)
+        else:
+            keep = lttb(dates.view('int64'), values, points)
+        frames.append(pd.DataFrame({'date': dates[keep], 'Metric': column, 'Value': values[keep]}))
+    return pd.concat(frames, ignore_index=True)
 
 def main():
     st.set_page_config(layout="wide")
@@ -42,27 +211,52 @@ def main():
     if session is None:
         st.stop()
 
-    # Get a list of available tickers from Cassandra
+    # Get the available tickers from the catalog
     try:
-        ticker_rows = session.execute("SELECT DISTINCT ticker FROM stock_prices")
-        available_tickers = [row['ticker'] for row in ticker_rows]
+        catalog = fetch_ticker_catalog(session)
     except Exception as e:
         st.error(f"Error fetching available tickers: {e}")
-        available_tickers = ['AAPL', 'MSFT', 'GOOGL'] # Fallback
+        catalog = pd.DataFrame({'ticker': ['AAPL', 'MSFT', 'GOOGL']}) # Fallback
         
-    if not available_tickers:
+    if catalog.empty:
         st.warning("No data found in Cassandra. Please run the Airflow DAG first.")
         st.stop()
 
     # Sidebar for user selection
     st.sidebar.header("Select Stock")
+    search = st.sidebar.text_input("Search ticker").strip().upper()
+    available_tickers = catalog['ticker'].tolist()
+    if search:
+        available_tickers = [t for t in available_tickers if search in t]
+    if not available_tickers:
+        st.sidebar.warning(f"No ticker matches '{search}'.")
+        st.stop()
     selected_ticker = st.sidebar.selectbox("Ticker Symbol", available_tickers)
 
+    if 'row_count' in catalog.columns:
+        entry = catalog.set_index('ticker').loc[selected_ticker]
+        st.sidebar.caption(f"{entry['row_count']} bars from {entry['first_date']} to {entry['last_date']}")
+
+    today = date.today()
+    date_range = st.sidebar.date_input(
+        "Date range",
+        value=(today - timedelta(days=DEFAULT_RANGE_DAYS), today),
+        max_value=today,
+    )
+    if not isinstance(date_range, (tuple, list)) or len(date_range) != 2:
+        st.info("Select a start and an end date.")
+        st.stop()
+    start_date, end_date = date_range
+
     # Fetch and display data
     st.header(f"Historical Data for {selected_ticker}")
     
     data_load_state = st.text("Loading data from Cassandra...")
-    df = fetch_stock_data(session, selected_ticker)
+    load_version = get_load_version(session, selected_ticker)
+    if STORAGE_LAYOUT == 'long':
+        df = fetch_series_data(session, selected_ticker, start_date, end_date, load_version)
+    else:
+        df = fetch_stock_data(session, selected_ticker, start_date, end_date, load_version)
     data_load_state.text("Loading data... done!")
 
     if df.empty:
@@ -76,14 +270,27 @@ def main():
 
     # Create the line chart
     st.subheader('Price and Moving Averages')
-    
-    # Melt the DataFrame for Plotly
-    df_melt = df.melt(id_vars=['date'], value_vars=['close', 'sma_50', 'sma_200'], 
-                      var_name='Metric', value_name='Value')
+
+    # Zooming re-plots the selected window from the fetched bars, so detail
+    # comes back (down to every bar) as the window narrows
+    visible = df
+    first, last = df['date'].iloc[0].to_pydatetime(), df['date'].iloc[-1].to_pydatetime()
+    if first < last:
+        zoom_start, zoom_end = st.slider("Zoom", min_value=first, max_value=last,
+                                         value=(first, last), format="YYYY-MM-DD")
+        visible = df[(df['date'] >= zoom_start) & (df['date'] <= zoom_end)]
+
+    # Melt the DataFrame for Plotly, at most CHART_POINTS points per series
+    series_columns = ['close', 'sma_50', 'sma_200']
+    df_melt = downsample_series(visible, series_columns)
+    total_points = int(visible[series_columns].count().sum())
+    if len(df_melt) < total_points:
+        st.caption(f"Showing {len(df_melt):,} of {total_points:,} points. Zoom in for full resolution.")
     
     fig = px.line(df_melt, x='date', y='Value', color='Metric', 
                   title=f'{selected_ticker} Closing Price and Moving Averages',
-                  labels={'Value': 'Price (USD)', 'date': 'Date'})
+                  labels={'Value': 'Price (USD)', 'date': 'Date'},
+                  render_mode='webgl' if len(df_melt) > WEBGL_THRESHOLD else 'svg')
     
     # Customize line colors
     fig.update_traces(
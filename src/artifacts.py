@@ -0,0 +1,54 @@
+import os
+import time
+import uuid
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Shared between Airflow workers via the project volume mount
+STAGING_DIR = os.environ.get(
+    'STAGING_DIR',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'staging')
+)
+ARTIFACT_RETENTION_HOURS = 24
+
+def cleanup_staging(max_age_hours=ARTIFACT_RETENTION_HOURS):
+    """Removes artifacts older than max_age_hours from the staging directory."""
+    if not os.path.isdir(STAGING_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(STAGING_DIR):
+        path = os.path.join(STAGING_DIR, name)
+        if name.endswith('.arrow') and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+def write_artifact(df, name):
+    """
+    Writes a DataFrame to the staging directory as an uncompressed Arrow IPC file.
+    Returns a small JSON-serializable manifest to pass through XCom instead of the data.
+    """
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    cleanup_staging()
+
+    path = os.path.abspath(os.path.join(STAGING_DIR, f"{name}_{uuid.uuid4().hex}.arrow"))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    print(f"Wrote {table.num_rows} rows to artifact {path}.")
+    return {
+        'path': path,
+        'format': 'arrow_ipc',
+        'rows': table.num_rows,
+        'columns': table.column_names,
+    }
+
+def read_artifact(manifest):
+    """
+    Memory-maps an artifact written by write_artifact.
+    The Arrow buffers point straight into the mapped file; only the pandas
+    conversion materializes columns that need it (e.g. strings).
+    """
+    source = pa.memory_map(manifest['path'], 'r')
+    table = ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
@@ -1,37 +1,76 @@
-import time
-from cassandra.cluster import Cluster
-from cassandra.auth import PlainTextAuthProvider
+import os
+from collections import deque
+from datetime import date, datetime
+import pandas as pd
+from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args
+from cassandra.query import BatchStatement, BatchType
+from src.connections import get_cassandra_session
+from src.indicator_store import series_columns, to_long
+from src.indicators import load_indicator_config, output_columns
+from src.metrics import stage_timer, record_batch, record_error, record_rows, record_round_trips
 
-# Configuration
-CASSANDRA_HOSTS = ['cassandra']
+# Configuration (hosts and retries live in src.connections)
 CASSANDRA_KEYSPACE = 'stock_keyspace'
 
-def get_cassandra_session():
+# Writer settings
+WRITE_CONCURRENCY = 64   # max batches in flight
+BATCH_ROWS = 50          # rows per unlogged batch; every batch targets one partition
+
+# All catalog rows share one partition so the dashboard reads it in a single request
+TICKER_CATALOG_PARTITION = 'all'
+
+# 'year' or 'month' splits each ticker's bars into (ticker, bucket) partitions
+# of a bucketed table, so partitions stay bounded as history accumulates;
+# 'none' keeps the single per-ticker partition of stock_prices.
+PRICE_BUCKETING = os.environ.get('PRICE_BUCKETING', 'none')
+PRICE_TABLES = {
+    'none': 'stock_prices',
+    'year': 'stock_prices_by_year',
+    'month': 'stock_prices_by_month',
+}
+
+def bucket_keys(dates, bucketing):
+    """The bucket of each date: 2024 by year, 202405 by month."""
+    dates = pd.DatetimeIndex(dates)
+    if bucketing == 'year':
+        return dates.year
+    return dates.year * 100 + dates.month
+
+def buckets_between(start, end, bucketing):
+    """The buckets covering start..end (inclusive), oldest first."""
+    periods = pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq='Y' if bucketing == 'year' else 'M')
+    return bucket_keys(periods.to_timestamp(), bucketing).tolist()
+
+def price_columns(indicators):
+    """The CQL columns of the wide price tables for an indicator config (SMA_50 -> sma_50)."""
+    return [column.lower() for column in output_columns(indicators)]
+
+def ensure_price_columns(session, table, columns):
     """
-    Connects to the Cassandra cluster and returns a session.
-    Retries connection to wait for Cassandra service to be up.
+    Adds the indicator columns that a wide price table is missing (e.g. new
+    indicators from the config). The schema is checked first, so ALTER TABLE
+    only runs when something changes.
     """
-    max_retries = 10
-    retry_delay = 5  # seconds
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"Attempting to connect to Cassandra at {CASSANDRA_HOSTS} (Attempt {attempt + 1}/{max_retries})...")
-            # In a docker-compose network, we can use the service name 'cassandra'
-            cluster = Cluster(CASSANDRA_HOSTS)
-            session = cluster.connect()
-            print("Successfully connected to Cassandra.")
-            return session
-        except Exception as e:
-            print(f"Connection failed: {e}. Retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
-            
-    raise ConnectionError("Failed to connect to Cassandra after multiple retries.")
-
-def initialize_cassandra_schema():
-    """
-    Creates the Keyspace and the stock_prices table.
+    rows = session.execute(session.prepare(SELECT_TABLE_COLUMNS_CQL), (CASSANDRA_KEYSPACE, table))
+    existing = {name for (name,) in rows}
+    missing = [c for c in columns if c not in existing]
+    for column in missing:
+        session.execute(ADD_PRICE_COLUMN_CQL.format(keyspace=CASSANDRA_KEYSPACE, table=table, column=column))
+    record_round_trips('cassandra', table, 1 + len(missing))
+    if missing:
+        print(f"Added columns to {table}: {', '.join(missing)}")
+    return missing
+
+def initialize_cassandra_schema(catalog_table=None, indicators=None):
     """
+    Creates the Keyspace and the stock_prices table, with one column per
+    indicator of the config (default INDICATOR_CONFIG), then catalogs the
+    tickers of catalog_table (by default the price table of
+    PRICE_BUCKETING; 'stock_indicators' for the long layout) that have no
+    catalog row yet.
+    """
+    columns = price_columns(indicators or load_indicator_config())
+    indicator_columns = ''.join(f"{column} float,\n            " for column in columns)
     session = get_cassandra_session()
     
     # 1. Create Keyspace
@@ -41,72 +80,526 @@ def initialize_cassandra_schema():
         WITH replication = {{'class': 'SimpleStrategy', 'replication_factor': '1'}}
     """)
     
-    # 2. Set the Keyspace
-    session.set_keyspace(CASSANDRA_KEYSPACE)
+    # 2. Switch to a session bound to the Keyspace
+    session = get_cassandra_session(CASSANDRA_KEYSPACE)
     
     # 3. Create Table
     print("Creating table stock_prices if it doesn't exist...")
-    session.execute("""
+    session.execute(f"""
         CREATE TABLE IF NOT EXISTS stock_prices (
             ticker text,
             date date,
             close float,
-            sma_50 float,
-            sma_200 float,
-            load_timestamp timestamp,
+            {indicator_columns}load_timestamp timestamp,
             PRIMARY KEY ((ticker), date)
         ) WITH CLUSTERING ORDER BY (date DESC)
     """)
+    ensure_price_columns(session, 'stock_prices', columns)
     
+    # 4. Create the bucketed price table, if one is configured
+    if PRICE_BUCKETING != 'none':
+        table = PRICE_TABLES[PRICE_BUCKETING]
+        print(f"Creating table {table} if it doesn't exist...")
+        session.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                ticker text,
+                bucket int,
+                date date,
+                close float,
+                {indicator_columns}load_timestamp timestamp,
+                PRIMARY KEY ((ticker, bucket), date)
+            ) WITH CLUSTERING ORDER BY (date DESC)
+        """)
+        ensure_price_columns(session, table, columns)
+    
+    # 5. Create the intraday bar table: one partition per ticker, bar size and day
+    print("Creating table stock_bars_intraday if it doesn't exist...")
+    session.execute("""
+        CREATE TABLE IF NOT EXISTS stock_bars_intraday (
+            ticker text,
+            interval text,
+            day date,
+            ts timestamp,
+            open float,
+            high float,
+            low float,
+            close float,
+            volume bigint,
+            load_timestamp timestamp,
+            PRIMARY KEY ((ticker, interval, day), ts)
+        ) WITH CLUSTERING ORDER BY (ts DESC)
+    """)
+    
+    # 6. Create the long/narrow table: one partition per (ticker, series)
+    print("Creating table stock_indicators if it doesn't exist...")
+    session.execute("""
+        CREATE TABLE IF NOT EXISTS stock_indicators (
+            ticker text,
+            indicator text,
+            date date,
+            value double,
+            load_timestamp timestamp,
+            PRIMARY KEY ((ticker, indicator), date)
+        ) WITH CLUSTERING ORDER BY (date DESC)
+    """)
+    
+    # 7. Create the ticker catalog maintained by the loaders
+    print("Creating table ticker_catalog if it doesn't exist...")
+    session.execute("""
+        CREATE TABLE IF NOT EXISTS ticker_catalog (
+            catalog text,
+            ticker text,
+            first_date date,
+            last_date date,
+            row_count bigint,
+            updated_at timestamp,
+            PRIMARY KEY ((catalog), ticker)
+        )
+    """)
+    
+    # 8. Catalog tickers loaded before the catalog was maintained
+    table = catalog_table or PRICE_TABLES[PRICE_BUCKETING]
+    bucketing = next((b for b, t in PRICE_TABLES.items() if t == table), 'none')
+    backfilled = backfill_ticker_catalog(session, table, bucketing=bucketing)
+    if backfilled:
+        print(f"Backfilled the ticker catalog with {backfilled} tickers from {table}.")
+
     print("Cassandra schema initialized successfully.")
-    session.shutdown()
 
 # CQL for inserting data
-INSERT_STOCK_PRICE_CQL = f"""
-INSERT INTO {CASSANDRA_KEYSPACE}.stock_prices 
-(ticker, date, close, sma_50, sma_200, load_timestamp)
+# The wide price tables take one column per indicator of the loaded frame
+INSERT_STOCK_PRICE_CQL = """
+INSERT INTO {keyspace}.{table}
+({columns})
+VALUES ({markers})
+"""
+
+SELECT_TABLE_COLUMNS_CQL = """
+SELECT column_name FROM system_schema.columns WHERE keyspace_name = ? AND table_name = ?
+"""
+
+ADD_PRICE_COLUMN_CQL = "ALTER TABLE {keyspace}.{table} ADD {column} float"
+
+# ts is the bar's exchange-local start time, as stored in raw_intraday_bars
+INSERT_INTRADAY_BAR_CQL = f"""
+INSERT INTO {CASSANDRA_KEYSPACE}.stock_bars_intraday
+(ticker, interval, day, ts, open, high, low, close, volume, load_timestamp)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_STOCK_INDICATOR_CQL = f"""
+INSERT INTO {CASSANDRA_KEYSPACE}.stock_indicators
+(ticker, indicator, date, value, load_timestamp)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+# CQL for maintaining the ticker catalog. A load only aggregates the date
+# range it wrote; the catalog row carries the rest of the ticker's history.
+SELECT_TICKER_RANGE_STATS_CQL = f"""
+SELECT MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS row_count
+FROM {CASSANDRA_KEYSPACE}.stock_prices WHERE ticker = ? AND date >= ? AND date <= ?
+"""
+
+# In the long layout a ticker's bars are the rows of its Close series
+SELECT_INDICATOR_RANGE_STATS_CQL = f"""
+SELECT MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS row_count
+FROM {CASSANDRA_KEYSPACE}.stock_indicators WHERE ticker = ? AND indicator = 'Close' AND date >= ? AND date <= ?
+"""
+
+# A bucketed table is aggregated one (ticker, bucket) partition at a time
+SELECT_BUCKETED_RANGE_STATS_CQL = """
+SELECT MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS row_count
+FROM {keyspace}.{table} WHERE ticker = ? AND bucket = ? AND date >= ? AND date <= ?
+"""
+
+SELECT_TICKER_CATALOG_CQL = f"""
+SELECT ticker, first_date, last_date, row_count FROM {CASSANDRA_KEYSPACE}.ticker_catalog WHERE catalog = ?
+"""
+
+UPSERT_TICKER_CATALOG_CQL = f"""
+INSERT INTO {CASSANDRA_KEYSPACE}.ticker_catalog
+(catalog, ticker, first_date, last_date, row_count, updated_at)
 VALUES (?, ?, ?, ?, ?, ?)
 """
 
-def load_data_to_cassandra(transformed_df):
+# Partition keys of each table, to find the tickers it holds. In the long
+# layout only the Close partitions count.
+SELECT_PARTITION_KEYS_CQL = {
+    'stock_prices': f"SELECT DISTINCT ticker FROM {CASSANDRA_KEYSPACE}.stock_prices",
+    'stock_indicators': f"SELECT DISTINCT ticker, indicator FROM {CASSANDRA_KEYSPACE}.stock_indicators",
+    'stock_prices_by_year': f"SELECT DISTINCT ticker, bucket FROM {CASSANDRA_KEYSPACE}.stock_prices_by_year",
+    'stock_prices_by_month': f"SELECT DISTINCT ticker, bucket FROM {CASSANDRA_KEYSPACE}.stock_prices_by_month",
+}
+
+# Date bounds that cover a ticker's whole history in a range aggregate
+HISTORY_START = date(1, 1, 1)
+HISTORY_END = date(9999, 12, 31)
+
+RANGE_STATS_CQL = {
+    'stock_prices': SELECT_TICKER_RANGE_STATS_CQL,
+    'stock_indicators': SELECT_INDICATOR_RANGE_STATS_CQL,
+    'stock_prices_by_year': SELECT_BUCKETED_RANGE_STATS_CQL.format(
+        keyspace=CASSANDRA_KEYSPACE, table='stock_prices_by_year'),
+    'stock_prices_by_month': SELECT_BUCKETED_RANGE_STATS_CQL.format(
+        keyspace=CASSANDRA_KEYSPACE, table='stock_prices_by_month'),
+}
+
+def read_ticker_catalog(session):
+    """The stored catalog as {ticker: (first_date, last_date, row_count)}, dates as datetime.date."""
+    catalog = {}
+    for ticker, first_date, last_date, row_count in session.execute(session.prepare(SELECT_TICKER_CATALOG_CQL),
+                                                                    (TICKER_CATALOG_PARTITION,)):
+        catalog[ticker] = (first_date.date(), last_date.date(), row_count or 0)
+    record_round_trips('cassandra', 'ticker_catalog')
+    return catalog
+
+def catalog_slices(ticker_dates, bucketing='none'):
+    """
+    The (ticker, [bucket,] first, last) date ranges a load writes: one per
+    ticker, or one per (ticker, bucket) it touches for a bucketed table.
+    """
+    if bucketing == 'none':
+        ranges = ticker_dates.groupby('Ticker')['Date'].agg(['min', 'max'])
+        return [(ticker, first, last) for ticker, first, last in ranges.itertuples()]
+    ranges = ticker_dates.groupby(['Ticker', 'Bucket'])['Date'].agg(['min', 'max'])
+    return [(ticker, int(bucket), first, last) for (ticker, bucket), first, last in ranges.itertuples()]
+
+def range_stats(session, table, slices, concurrency=WRITE_CONCURRENCY):
     """
-    Loads the transformed DataFrame into the Cassandra stock_prices table.
+    Runs the range aggregate of `table` over each catalog slice and combines
+    the slices of each ticker. Returns ({ticker: (first_date, last_date,
+    row_count)}, failed tickers); a ticker with no rows in its slices has no
+    dates.
+    """
+    stats_stmt = session.prepare(RANGE_STATS_CQL[table])
+    results = execute_concurrent_with_args(session, stats_stmt, slices,
+                                           concurrency=concurrency, raise_on_first_error=False)
+    record_round_trips('cassandra', table, len(slices))
+
+    stats = {}
+    failed = set()
+    for params, (success, result) in zip(slices, results):
+        ticker = params[0]
+        if not success:
+            print(f"Error reading catalog stats for {ticker}: {result}")
+            failed.add(ticker)
+            continue
+        first_date, last_date, row_count = tuple(result.one())
+        dates = [d.date() for d in (first_date, last_date) if d is not None]
+        if ticker in stats:
+            first, last, count = stats[ticker]
+            dates += [d for d in (first, last) if d is not None]
+            row_count += count
+        stats[ticker] = (min(dates), max(dates), row_count) if dates else (None, None, row_count)
+    return stats, failed
+
+def partition_keys(session, table):
+    """The partition keys of `table` as tuples, without the indicator in the long layout."""
+    rows = session.execute(session.prepare(SELECT_PARTITION_KEYS_CQL[table]))
+    record_round_trips('cassandra', table)
+    if table == 'stock_indicators':
+        return [(ticker,) for ticker, indicator in rows if indicator == 'Close']
+    return [tuple(row) for row in rows]
+
+def history_stats(session, table, tickers, concurrency=WRITE_CONCURRENCY, bucketing='none', keys=None):
+    """
+    Aggregates the whole stored history of each of `tickers`, like
+    range_stats. A bucketed table's buckets are looked up in `keys` (from
+    partition_keys, which is read if not given); the other tables hold one
+    partition per ticker.
+    """
+    tickers = set(tickers)
+    if bucketing == 'none':
+        keys = [(ticker,) for ticker in tickers]
+    elif keys is None:
+        keys = partition_keys(session, table)
+    slices = [key + (HISTORY_START, HISTORY_END) for key in keys if key[0] in tickers]
+    return range_stats(session, table, slices, concurrency)
+
+def backfill_ticker_catalog(session, table, concurrency=WRITE_CONCURRENCY, bucketing='none'):
+    """
+    Catalogs every ticker stored in `table` that has no catalog row yet, for
+    data written before the loaders maintained the catalog. Costs one scan
+    of the table's partition keys plus one aggregate per new partition.
+    """
+    stored = read_ticker_catalog(session)
+    keys = partition_keys(session, table)
+    missing = {key[0] for key in keys} - set(stored)
+    if not missing:
+        return 0
+    stats, _ = history_stats(session, table, missing, concurrency, bucketing, keys)
+    updated_at = datetime.now()
+    catalog_rows = [(TICKER_CATALOG_PARTITION, ticker, first_date, last_date, row_count, updated_at)
+                    for ticker, (first_date, last_date, row_count) in stats.items() if row_count]
+    write_catalog_rows(session, catalog_rows, concurrency)
+    return len(catalog_rows)
+
+def begin_catalog_update(session, table, ticker_dates, concurrency=WRITE_CONCURRENCY, bucketing='none'):
+    """
+    Prepares the catalog update for a load of ticker_dates (the Ticker and
+    Date, as datetime.date, and for a bucketed table the Bucket, of the rows
+    about to be written to `table`). Reads the stored catalog, aggregates
+    the whole history of loaded tickers it does not list yet and, for
+    tickers whose loaded range starts at or before their cataloged last
+    date, counts the rows already in the slices the load writes. Pass the
+    result to finish_catalog_update once the rows are written.
+    """
+    ranges = ticker_dates.groupby('Ticker')['Date'].agg(['min', 'max', 'count'])
+    loaded = {ticker: (first, last, int(count)) for ticker, first, last, count in ranges.itertuples()}
+    stored = read_ticker_catalog(session)
+    # rows written before the catalog existed are counted once, here
+    history, history_failed = history_stats(session, table, set(loaded) - set(stored), concurrency, bucketing)
+    stored.update((ticker, stats) for ticker, stats in history.items() if stats[2])
+    overlapping = {ticker for ticker, (first, _, _) in loaded.items()
+                   if ticker in stored and first <= stored[ticker][1]}
+    slices = catalog_slices(ticker_dates, bucketing)
+    before, failed = range_stats(session, table, [s for s in slices if s[0] in overlapping], concurrency)
+    return {
+        'table': table, 'loaded': loaded, 'stored': stored, 'slices': slices,
+        'overlapping': overlapping, 'before': before, 'failed': failed | history_failed,
+    }
+
+def finish_catalog_update(session, update, complete, concurrency=WRITE_CONCURRENCY):
+    """
+    Folds a load prepared by begin_catalog_update into ticker_catalog: each
+    ticker's row count becomes its cataloged count plus the rows in the
+    loaded range after the load minus those before it, and its dates widen
+    to cover the range. A load appending past the cataloged last date
+    without failed batches (complete=True) is merged from the loaded rows
+    alone; otherwise the slices the load wrote are aggregated again. The
+    rest of a ticker's history is never re-read.
+    """
+    table, loaded, stored = update['table'], update['loaded'], update['stored']
+    updated_at = datetime.now()
+
+    after = {}
+    for ticker, (first, last, count) in loaded.items():
+        if complete and ticker not in update['overlapping']:
+            after[ticker] = (first, last, count)
+    recount = [s for s in update['slices'] if s[0] not in after]
+    recounted, failed = range_stats(session, table, recount, concurrency)
+    after.update(recounted)
+    failed |= update['failed']
+
+    catalog_rows = []
+    for ticker, (first_loaded, last_loaded, count_after) in after.items():
+        if ticker in failed:
+            continue
+        first_date, last_date, row_count = stored.get(ticker, (None, None, 0))
+        row_count += count_after - update['before'].get(ticker, (None, None, 0))[2]
+        dates = [d for d in (first_date, last_date, first_loaded, last_loaded) if d is not None]
+        if not row_count or not dates:
+            continue
+        catalog_rows.append((TICKER_CATALOG_PARTITION, ticker, min(dates), max(dates), row_count, updated_at))
+    write_catalog_rows(session, catalog_rows, concurrency)
+
+def write_catalog_rows(session, catalog_rows, concurrency=WRITE_CONCURRENCY):
+    upsert_stmt = session.prepare(UPSERT_TICKER_CATALOG_CQL)
+    results = execute_concurrent_with_args(session, upsert_stmt, catalog_rows,
+                                           concurrency=concurrency, raise_on_first_error=False)
+    record_round_trips('cassandra', 'ticker_catalog', len(catalog_rows))
+    for params, (success, result) in zip(catalog_rows, results):
+        if not success:
+            print(f"Error writing catalog entry for {params[1]}: {result}")
+    print(f"Ticker catalog updated for {len(catalog_rows)} tickers.")
+
+def iter_partition_batches(prepared_stmt, records_df, load_timestamp, batch_rows, bucketed=False, series=('Close',)):
+    """
+    Yields (BatchStatement, partition, dates) with up to batch_rows rows each.
+    Rows are grouped by ticker (and Bucket, if bucketed) so every unlogged
+    batch stays within one partition; each row binds Date and `series`.
+    """
+    keys = ['Ticker', 'Bucket'] if bucketed else ['Ticker']
+    for key, group in records_df.groupby(keys, sort=False):
+        rows = list(zip(group['Date'], *(group[column] for column in series)))
+        for i in range(0, len(rows), batch_rows):
+            chunk = rows[i:i + batch_rows]
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            for row in chunk:
+                batch.add(prepared_stmt, (*key, *row, load_timestamp))
+            yield batch, '/'.join(map(str, key)), [row[0] for row in chunk]
+
+def iter_indicator_batches(prepared_stmt, long_df, load_timestamp, batch_rows):
+    """Like iter_partition_batches, for the (ticker, indicator) partitions of stock_indicators."""
+    for (ticker, indicator), group in long_df.groupby(['Ticker', 'Indicator'], sort=False):
+        rows = list(zip(group['Date'], group['Value']))
+        for i in range(0, len(rows), batch_rows):
+            chunk = rows[i:i + batch_rows]
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            for date, value in chunk:
+                batch.add(prepared_stmt, (ticker, indicator, date, value, load_timestamp))
+            yield batch, f"{ticker}/{indicator}", [row[0] for row in chunk]
+
+def iter_intraday_batches(prepared_stmt, bars_df, load_timestamp, batch_rows):
+    """Like iter_partition_batches, for the (ticker, interval, day) partitions of stock_bars_intraday."""
+    for (ticker, interval, day), group in bars_df.groupby(['Ticker', 'Interval', 'Day'], sort=False):
+        rows = list(zip(group['Timestamp'].dt.to_pydatetime(), group['Open'], group['High'], group['Low'],
+                        group['Close'], group['Volume']))
+        for i in range(0, len(rows), batch_rows):
+            chunk = rows[i:i + batch_rows]
+            batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+            for ts, open_, high, low, close, volume in chunk:
+                batch.add(prepared_stmt, (ticker, interval, day, ts, open_, high, low, close, volume, load_timestamp))
+            yield batch, f"{ticker}/{interval}/{day}", [row[0] for row in chunk]
+
+def execute_batches(session, batches, table, concurrency=WRITE_CONCURRENCY):
+    """
+    Sends (BatchStatement, partition, dates) items with at most `concurrency`
+    in flight. Failed batches are reported row by row and do not stop the
+    load. Returns (rows loaded, rows failed).
+    """
+    # Results come back in submission order, so the metadata of each batch is
+    # queued as it is handed to the driver and popped as its result arrives.
+    submitted = deque()
+
+    def statements():
+        for batch, partition, dates in batches:
+            submitted.append((partition, dates))
+            record_batch('cassandra_load', len(dates))
+            yield batch, None
+
+    loaded_count = 0
+    failed_count = 0
+    results = execute_concurrent(session, statements(), concurrency=concurrency,
+                                 raise_on_first_error=False, results_generator=True)
+    for success, result in results:
+        partition, dates = submitted.popleft()
+        record_round_trips('cassandra', table)
+        if success:
+            loaded_count += len(dates)
+            continue
+        failed_count += len(dates)
+        record_error('cassandra_load')
+        for date in dates:
+            print(f"Error loading record for {partition} on {date}: {result}")
+    return loaded_count, failed_count
+
+@stage_timer('cassandra_load')
+def load_data_to_cassandra(transformed_df, concurrency=WRITE_CONCURRENCY, batch_rows=BATCH_ROWS,
+                           bucketing=PRICE_BUCKETING):
+    """
+    Loads the transformed DataFrame into the Cassandra stock_prices table, or
+    the bucketed table of `bucketing` ('year' or 'month'), one column per
+    indicator of the frame. Indicator columns the table does not have yet
+    are added first.
+    Writes per-partition unlogged batches with at most `concurrency` requests
+    in flight. Failed batches are reported row by row and do not stop the load.
     """
     if transformed_df.empty:
         print("Warning: Transformed DataFrame is empty. Skipping load.")
         return 0
 
-    session = get_cassandra_session()
-    session.set_keyspace(CASSANDRA_KEYSPACE)
+    # Filter out rows still in an indicator's warm-up (NaN)
+    indicator_columns = [c for c in series_columns(transformed_df) if c != 'Close']
+    records_df = transformed_df.dropna(subset=indicator_columns)
+    record_rows('cassandra_load', len(transformed_df) - len(records_df), 'rejected')
+    if records_df.empty:
+        print("Warning: No valid records after filtering. Skipping load.")
+        return 0
+
+    # Data types must match the CQL definition: (text, [int,] date, float, float..., timestamp)
+    dates = pd.to_datetime(records_df['Date'])
+    records_df = records_df.assign(Date=dates.dt.date)
+    bucketed = bucketing != 'none'
+    if bucketed:
+        records_df = records_df.assign(Bucket=bucket_keys(dates, bucketing))
+    load_timestamp = datetime.now()
+    table = PRICE_TABLES[bucketing]
+
+    session = get_cassandra_session(CASSANDRA_KEYSPACE)
     
+    columns = [column.lower() for column in indicator_columns]
+    ensure_price_columns(session, table, columns)
+
     # Prepare the statement once
-    prepared_stmt = session.prepare(INSERT_STOCK_PRICE_CQL)
-    
-    loaded_count = 0
-    print("Starting data loading to Cassandra...")
-    
-    # Iterate over the DataFrame and execute the prepared statement
-    for index, row in transformed_df.iterrows():
-        # Filter out rows where SMA_200 is NaN
-        if pd.isna(row['SMA_200']):
-            continue
-            
-        try:
-            # Data types must match the CQL definition: (text, date, float, float, float, timestamp)
-            session.execute(prepared_stmt, (
-                row['Ticker'],
-                row['Date'], # Date is already a string 'YYYY-MM-DD' from transform.py
-                row['Close'],
-                row['SMA_50'],
-                row['SMA_200'],
-                datetime.now() # Use current time for load_timestamp
-            ))
-            loaded_count += 1
-        except Exception as e:
-            print(f"Error loading record for {row['Ticker']} on {row['Date']}: {e}")
-            
-    session.shutdown()
-    print(f"Loading complete. {loaded_count} records loaded into Cassandra.")
+    names = ['ticker'] + (['bucket'] if bucketed else []) + ['date', 'close'] + columns + ['load_timestamp']
+    prepared_stmt = session.prepare(INSERT_STOCK_PRICE_CQL.format(
+        keyspace=CASSANDRA_KEYSPACE, table=table, columns=', '.join(names), markers=', '.join('?' * len(names))
+    ))
+
+    catalog_update = begin_catalog_update(session, table, records_df, concurrency, bucketing)
+
+    print(f"Starting data loading to Cassandra {table} ({concurrency} batches in flight)...")
+    batches = iter_partition_batches(prepared_stmt, records_df, load_timestamp, batch_rows, bucketed,
+                                     ['Close'] + indicator_columns)
+    loaded_count, failed_count = execute_batches(session, batches, table, concurrency)
+
+    print(f"Loading complete. {loaded_count} records loaded into Cassandra, {failed_count} failed.")
+    record_rows('cassandra_load', loaded_count)
+    record_rows('cassandra_load', failed_count, 'failed')
+
+    finish_catalog_update(session, catalog_update, failed_count == 0, concurrency)
+    return loaded_count
+
+@stage_timer('cassandra_load')
+def load_indicators_to_cassandra(transformed_df, series=None, concurrency=WRITE_CONCURRENCY,
+                                 batch_rows=BATCH_ROWS):
+    """
+    Long-layout counterpart of load_data_to_cassandra: writes Close and the
+    indicator columns of the frame (or only `series`) to stock_indicators,
+    one partition per (ticker, series). Warm-up (NaN) values are skipped
+    rather than rejecting the whole bar, and backfilling a new indicator
+    only writes its own partitions.
+    """
+    series = series or series_columns(transformed_df)
+    long_df = to_long(transformed_df, series)
+    record_rows('cassandra_load', len(transformed_df) * len(series) - len(long_df), 'rejected')
+    if long_df.empty:
+        print("Warning: No indicator values to load. Skipping load.")
+        return 0
+
+    # Data types must match the CQL definition: (text, text, date, double, timestamp)
+    long_df = long_df.assign(Date=pd.to_datetime(long_df['Date']).dt.date)
+    load_timestamp = datetime.now()
+
+    session = get_cassandra_session(CASSANDRA_KEYSPACE)
+    prepared_stmt = session.prepare(INSERT_STOCK_INDICATOR_CQL)
+    # the catalog follows the Close series; loads without it leave the catalog alone
+    closes = long_df.loc[long_df['Indicator'] == 'Close', ['Ticker', 'Date']]
+    if not closes.empty:
+        catalog_update = begin_catalog_update(session, 'stock_indicators', closes, concurrency)
+
+    print(f"Starting indicator loading to Cassandra ({concurrency} batches in flight)...")
+    batches = iter_indicator_batches(prepared_stmt, long_df, load_timestamp, batch_rows)
+    loaded_count, failed_count = execute_batches(session, batches, 'stock_indicators', concurrency)
+
+    print(f"Loading complete. {loaded_count} indicator values loaded into Cassandra, {failed_count} failed.")
+    record_rows('cassandra_load', loaded_count)
+    record_rows('cassandra_load', failed_count, 'failed')
+
+    if not closes.empty:
+        finish_catalog_update(session, catalog_update, failed_count == 0, concurrency)
+    return loaded_count
+
+@stage_timer('cassandra_load')
+def load_intraday_to_cassandra(bars_df, concurrency=WRITE_CONCURRENCY, batch_rows=BATCH_ROWS):
+    """
+    Loads intraday bars (raw_intraday_bars columns) into stock_bars_intraday.
+    Each ticker's bars are partitioned by interval and day, so a partition
+    holds at most one session of bars however long the history grows.
+    Returns the number of bars loaded.
+    """
+    if bars_df.empty:
+        print("Warning: No intraday bars to load. Skipping load.")
+        return 0
+
+    # Data types must match the CQL definition: (text, text, date, timestamp, float x4, bigint, timestamp)
+    timestamps = pd.to_datetime(bars_df['Timestamp'])
+    volume = bars_df['Volume'].round().astype('Int64').astype(object)
+    bars_df = bars_df.assign(Timestamp=timestamps, Day=timestamps.dt.date,
+                             Volume=volume.where(volume.notna(), None))
+    load_timestamp = datetime.now()
+
+    session = get_cassandra_session(CASSANDRA_KEYSPACE)
+    prepared_stmt = session.prepare(INSERT_INTRADAY_BAR_CQL)
+
+    print(f"Starting intraday loading to Cassandra ({concurrency} batches in flight)...")
+    batches = iter_intraday_batches(prepared_stmt, bars_df, load_timestamp, batch_rows)
+    loaded_count, failed_count = execute_batches(session, batches, 'stock_bars_intraday', concurrency)
+
+    print(f"Loading complete. {loaded_count} intraday bars loaded into Cassandra, {failed_count} failed.")
+    record_rows('cassandra_load', loaded_count)
+    record_rows('cassandra_load', failed_count, 'failed')
     return loaded_count
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+from cassandra.cluster import Cluster
+
+# --- Configuration (overridable via environment) ---
+PG_CONFIG = {
+    'host': os.environ.get('PG_HOST', 'postgres'),
+    'database': os.environ.get('PG_DATABASE', 'airflow'),
+    'user': os.environ.get('PG_USER', 'airflow'),
+    'password': os.environ.get('PG_PASSWORD', 'airflow'),
+    'port': os.environ.get('PG_PORT', '5432'),
+}
+PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', '1'))
+PG_POOL_MAX = int(os.environ.get('PG_POOL_MAX', '8'))
+
+CASSANDRA_HOSTS = os.environ.get('CASSANDRA_HOSTS', 'cassandra').split(',')
+CASSANDRA_PORT = int(os.environ.get('CASSANDRA_PORT', '9042'))
+
+CONNECT_RETRIES = int(os.environ.get('CONNECT_RETRIES', '8'))
+BACKOFF_BASE = 0.5   # seconds, doubled on every attempt
+BACKOFF_MAX = 30.0
+
+_lock = threading.Lock()
+_pg_pool = None
+_pg_pool_pid = None
+_cassandra_cluster = None
+_cassandra_sessions = {}
+
+def connect_with_backoff(connect, description):
+    """Calls connect() until it succeeds, sleeping with jittered exponential backoff."""
+    for attempt in range(CONNECT_RETRIES):
+        try:
+            return connect()
+        except Exception as e:
+            if attempt == CONNECT_RETRIES - 1:
+                raise ConnectionError(f"Failed to connect to {description} after {CONNECT_RETRIES} attempts.") from e
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+            print(f"Connection to {description} failed: {e}. Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+# --- Postgres ---
+
+def get_pg_connection():
+    """Opens a dedicated (unpooled) Postgres connection. The caller must close it."""
+    return connect_with_backoff(lambda: psycopg2.connect(**PG_CONFIG), 'Postgres')
+
+def get_pg_pool():
+    """Returns the process-wide Postgres pool, creating it on first use (and after a fork)."""
+    global _pg_pool, _pg_pool_pid
+    with _lock:
+        if _pg_pool is None or _pg_pool_pid != os.getpid():
+            _pg_pool = connect_with_backoff(
+                lambda: ThreadedConnectionPool(PG_POOL_MIN, PG_POOL_MAX, **PG_CONFIG), 'Postgres'
+            )
+            _pg_pool_pid = os.getpid()
+        return _pg_pool
+
+@contextmanager
+def pg_connection():
+    """
+    Borrows a connection from the pool for the duration of the block.
+    Uncommitted work is rolled back before the connection goes back to the pool.
+    """
+    pool = get_pg_pool()
+    conn = pool.getconn()
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        pool.putconn(conn, close=bool(conn.closed))
+
+def close_pg_pool():
+    global _pg_pool
+    with _lock:
+        if _pg_pool is not None and _pg_pool_pid == os.getpid():
+            _pg_pool.closeall()
+        _pg_pool = None
+
+# --- Cassandra ---
+
+def get_cassandra_cluster():
+    """Returns the process-wide Cassandra Cluster, connecting with backoff on first use."""
+    global _cassandra_cluster
+    with _lock:
+        if _cassandra_cluster is None:
+            # connect once so an unreachable cluster is retried here, not by the caller
+            cluster, session = connect_with_backoff(_connect_cassandra, f"Cassandra at {CASSANDRA_HOSTS}")
+            _cassandra_sessions[None] = session
+            _cassandra_cluster = cluster
+        return _cassandra_cluster
+
+def _connect_cassandra():
+    """
+    Connects a fresh Cluster. A Cluster whose control connection failed shuts
+    itself down and cannot be reconnected, so every attempt needs its own.
+    """
+    cluster = Cluster(CASSANDRA_HOSTS, port=CASSANDRA_PORT)
+    try:
+        return cluster, cluster.connect()
+    except Exception:
+        cluster.shutdown()
+        raise
+
+def get_cassandra_session(keyspace=None):
+    """
+    Returns a shared session, one per keyspace. Sessions are thread-safe and
+    must not be shut down by callers; use shutdown_cassandra() at exit.
+    """
+    cluster = get_cassandra_cluster()
+    with _lock:
+        session = _cassandra_sessions.get(keyspace)
+        if session is None:
+            session = cluster.connect(keyspace)
+            _cassandra_sessions[keyspace] = session
+        return session
+
+def shutdown_cassandra():
+    global _cassandra_cluster
+    with _lock:
+        if _cassandra_cluster is not None:
+            _cassandra_cluster.shutdown()
+        _cassandra_cluster = None
+        _cassandra_sessions.clear()
@@ -1,90 +1,209 @@
+import argparse
 import json
-import uuid
+import os
 import random
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+import numpy as np
 from faker import Faker
 
-# Initialize Faker
-fake = Faker()
-
-# Configuration
+# Configuration (defaults; every value can be overridden from the command line)
 NUM_TRANSACTIONS = 100
 NUM_UNIQUE_USERS = 50
 NUM_UNIQUE_PRODUCTS = 20
-OUTPUT_FILE = "data/raw/transactions_{}.json".format(datetime.now().strftime("%Y%m%d%H%M%S"))
+SHARD_ROWS = 1000000       # transactions per output file
+CHUNK_ROWS = 100000        # transactions generated and written at a time
+NAME_POOL_SIZE = 1000       # distinct first/last names and product words drawn from Faker
+WINDOW_SECONDS = 3600      # transactions are spread evenly over this window
+OUTPUT_DIR = "data/raw"
+FORMATS = ("jsonl", "parquet")
+CATEGORIES = ["Electronics", "Books", "Clothing", "Home Goods", "Groceries"]
+
+# Pre-generate unique user and product data.
+# Faker is slow per call, so names and words are drawn once into small pools
+# and combined; this keeps millions of users affordable.
+def generate_master_data(num_users=NUM_UNIQUE_USERS, num_products=NUM_UNIQUE_PRODUCTS, seed=None,
+                         now=None):
+    rng = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
+    now = now or datetime.now()
+    first_names = [fake.first_name() for _ in range(min(num_users, NAME_POOL_SIZE))]
+    last_names = [fake.last_name() for _ in range(min(num_users, NAME_POOL_SIZE))]
+    words = [fake.word().capitalize() for _ in range(min(2 * num_products, NAME_POOL_SIZE))]
+
+    def new_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
 
-# Pre-generate unique user and product data
-def generate_master_data():
     users = []
-    for _ in range(NUM_UNIQUE_USERS):
+    for i in range(num_users):
+        first, last = rng.choice(first_names), rng.choice(last_names)
         users.append({
-            "user_id": str(uuid.uuid4()),
-            "name": fake.name(),
-            "email": fake.email(),
-            "registration_date": (datetime.now() - timedelta(days=random.randint(30, 365))).isoformat()
+            "user_id": new_id(),
+            "name": f"{first} {last}",
+            "email": f"{first}.{last}{i}@example.com".lower(),
+            "registration_date": (now - timedelta(days=rng.randint(30, 365))).isoformat()
         })
 
     products = []
-    categories = ["Electronics", "Books", "Clothing", "Home Goods", "Groceries"]
-    for _ in range(NUM_UNIQUE_PRODUCTS):
-        price = round(random.uniform(5.0, 500.0), 2)
+    for _ in range(num_products):
+        price = round(rng.uniform(5.0, 500.0), 2)
         products.append({
-            "product_id": str(uuid.uuid4()),
-            "name": fake.word().capitalize() + " " + fake.word().capitalize(),
-            "category": random.choice(categories),
+            "product_id": new_id(),
+            "name": rng.choice(words) + " " + rng.choice(words),
+            "category": rng.choice(CATEGORIES),
             "unit_price": price
         })
     return users, products
 
+def write_master_data(run_dir, users, products):
+    """Writes the users and products once, as JSON Lines files next to the transactions."""
+    for name, records in (("users", users), ("products", products)):
+        with open(os.path.join(run_dir, f"{name}.jsonl"), 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+def random_uuids(rng, n):
+    """n random version-4 UUID strings drawn from rng."""
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    hexes = raw.tobytes().hex()
+    return [
+        f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+        for h in (hexes[i:i + 32] for i in range(0, n * 32, 32))
+    ]
+
 # Generate transaction data
-def generate_transactions(users, products):
-    transactions = []
-    start_time = datetime.now() - timedelta(hours=1)
-    
-    for i in range(NUM_TRANSACTIONS):
-        # Select a random user and product
-        user = random.choice(users)
-        product = random.choice(products)
-        
-        # Simulate a timestamp within the last hour
-        timestamp = (start_time + timedelta(seconds=i * (3600 / NUM_TRANSACTIONS))).isoformat()
-        
-        quantity = random.randint(1, 5)
-        price = product["unit_price"]
-        total_amount = round(quantity * price, 2)
-        
-        transaction = {
-            "transaction_id": str(uuid.uuid4()),
-            "user_id": user["user_id"],
-            "product_id": product["product_id"],
-            "quantity": quantity,
-            "price": price, # Price here is the unit price from the product master data
-            "total_amount": total_amount,
-            "timestamp": timestamp,
-            # Include master data for simplicity in this junior project
-            "user_details": user,
-            "product_details": product
-        }
-        transactions.append(transaction)
-        
-    return transactions
-
-def main():
-    print("Generating master data...")
-    users, products = generate_master_data()
-    
-    print(f"Generating {NUM_TRANSACTIONS} transactions...")
-    transactions = generate_transactions(users, products)
-    
-    print(f"Writing data to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(transactions, f, indent=4)
-        
+def generate_transactions(rng, user_ids, product_ids, unit_prices, first, count, total, start_time):
+    """
+    Generates transactions first..first+count-1 (of total) as a dict of columns.
+    Timestamps are spread evenly over WINDOW_SECONDS from start_time, by global
+    position, so the output does not depend on how the run is sharded.
+    """
+    user_idx = rng.integers(0, len(user_ids), size=count)
+    product_idx = rng.integers(0, len(product_ids), size=count)
+    quantity = rng.integers(1, 6, size=count)
+    # Price here is the unit price from the product master data
+    price = unit_prices[product_idx]
+
+    offsets_us = (np.arange(first, first + count) * (WINDOW_SECONDS * 1e6 / total)).astype('int64')
+    timestamps = np.datetime64(start_time, 'us') + offsets_us.astype('timedelta64[us]')
+
+    return {
+        "transaction_id": random_uuids(rng, count),
+        "user_id": user_ids[user_idx],
+        "product_id": product_ids[product_idx],
+        "quantity": quantity,
+        "price": price,
+        "total_amount": np.round(quantity * price, 2),
+        "timestamp": np.datetime_as_string(timestamps, unit='us'),
+    }
+
+def write_jsonl_chunk(f, columns):
+    names = list(columns)
+    values = [c.tolist() if isinstance(c, np.ndarray) else c for c in columns.values()]
+    f.writelines(json.dumps(dict(zip(names, row))) + "\n" for row in zip(*values))
+
+def generate_shard(shard, first, count, total, seed, master, start_time, output_path, fmt):
+    """Generates one shard and streams it to output_path in CHUNK_ROWS pieces. Runs in a worker process."""
+    user_ids, product_ids, unit_prices = master
+    # Each shard draws from its own stream, so shards can be generated in any order
+    rng = np.random.default_rng([seed, shard])
+
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+    else:
+        f = open(output_path, 'w')
+
+    try:
+        for chunk_first in range(first, first + count, CHUNK_ROWS):
+            chunk_count = min(CHUNK_ROWS, first + count - chunk_first)
+            columns = generate_transactions(rng, user_ids, product_ids, unit_prices,
+                                            chunk_first, chunk_count, total, start_time)
+            if fmt == "parquet":
+                table = pa.table(columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            else:
+                write_jsonl_chunk(f, columns)
+    finally:
+        if fmt == "parquet":
+            if writer is not None:
+                writer.close()
+        else:
+            f.close()
+    return output_path
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generate synthetic e-commerce transactions.")
+    parser.add_argument("--transactions", type=int, default=NUM_TRANSACTIONS)
+    parser.add_argument("--users", type=int, default=NUM_UNIQUE_USERS)
+    parser.add_argument("--products", type=int, default=NUM_UNIQUE_PRODUCTS)
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS,
+                        help="transactions per output file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes generating shards in parallel")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="makes the output reproducible (together with --start)")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None,
+                        help="timestamp of the first transaction (default: one hour ago)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Generates a run directory holding users.jsonl, products.jsonl and the
+    transactions as one or more shard files. Returns the path of the
+    transactions (a file when there is a single shard, otherwise the directory
+    of shards), which is what ingest_data expects.
+    """
+    # Called from run_pipeline without arguments: use the defaults, not sys.argv
+    args = parse_args(argv if argv is not None else [])
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    start_time = args.start or (datetime.now() - timedelta(hours=1))
+
+    run_dir = os.path.join(args.output_dir, "transactions_{}".format(datetime.now().strftime("%Y%m%d%H%M%S")))
+    shard_dir = os.path.join(run_dir, "transactions")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    print(f"Generating master data (seed {seed})...")
+    users, products = generate_master_data(args.users, args.products, seed, start_time)
+    write_master_data(run_dir, users, products)
+    master = (
+        np.array([u["user_id"] for u in users]),
+        np.array([p["product_id"] for p in products]),
+        np.array([p["unit_price"] for p in products]),
+    )
+
+    total = args.transactions
+    shard_rows = max(1, args.shard_rows)
+    shards = [
+        (shard, first, min(shard_rows, total - first), total, seed, master, start_time,
+         os.path.join(shard_dir, f"part-{shard:05d}.{args.format}"), args.format)
+        for shard, first in enumerate(range(0, total, shard_rows))
+    ]
+
+    print(f"Generating {total} transactions in {len(shards)} shard(s) as {args.format}...")
+    workers = max(1, min(args.workers or 1, len(shards)))
+    if workers == 1:
+        paths = [generate_shard(*shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(generate_shard, *shard) for shard in shards]
+            paths = [future.result() for future in futures]
+
     print("Data generation complete.")
-    print(f"File saved: {OUTPUT_FILE}")
-    
+    print(f"Files saved under: {run_dir}")
+
     # Return the path for the next step in the pipeline
-    return OUTPUT_FILE
+    return paths[0] if len(paths) == 1 else shard_dir
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
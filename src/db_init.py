@@ -1,44 +1,29 @@
-import psycopg2
-import os
 # Import các câu lệnh SQL đã được bạn update cho Postgres
 from src.sql_queries import ALL_CREATE_QUERIES 
-
-def get_pg_connection():
-    """Thiết lập kết nối tới Postgres database trong Docker."""
-    return psycopg2.connect(
-        host="postgres",           # Tên service trong docker-compose.yaml
-        database="airflow",        # Tên DB mặc định
-        user="airflow",
-        password="airflow",
-        port="5432"
-    )
+# Kết nối dùng chung (pool + backoff), cấu hình qua biến môi trường PG_*
+from src.connections import pg_connection
 
 def initialize_database():
     """Kết nối tới Postgres và khởi tạo toàn bộ Schema (Ecommerce/Stock)."""
     print("Connecting to PostgreSQL to initialize schema...")
-    conn = None
-    try:
-        # 1. Kết nối tới DB
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        
-        # 2. Thực thi từng câu lệnh CREATE TABLE
-        # Đảm bảo ALL_CREATE_QUERIES đã sử dụng SERIAL và ON CONFLICT
-        for query in ALL_CREATE_QUERIES:
-            cursor.execute(query)
+    # 1. Mượn kết nối từ pool
+    with pg_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            
+            # 2. Thực thi từng câu lệnh CREATE TABLE
+            # Đảm bảo ALL_CREATE_QUERIES đã sử dụng SERIAL và ON CONFLICT
+            for query in ALL_CREATE_QUERIES:
+                cursor.execute(query)
+                
+            # 3. Xác nhận thay đổi
+            conn.commit()
+            print("PostgreSQL database schema initialized successfully.")
             
-        # 3. Xác nhận thay đổi
-        conn.commit()
-        print("PostgreSQL database schema initialized successfully.")
-        
-    except Exception as e:
-        if conn:
+        except Exception as e:
             conn.rollback()
-        print(f"An error occurred during PostgreSQL initialization: {e}")
-        raise 
-    finally:
-        if conn:
-            conn.close()
+            print(f"An error occurred during PostgreSQL initialization: {e}")
+            raise
 
 if __name__ == "__main__":
     initialize_database()
\ No newline at end of file
@@ -1,29 +1,159 @@
-import psycopg2
-from src.sql_definitions import ALL_CREATE_QUERIES
-
-def get_pg_connection():
-    return psycopg2.connect(
-        host="postgres",
-        database="airflow",
-        user="airflow",
-        password="airflow",
-        port="5432"
-    )
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from psycopg2 import sql
+from src.connections import get_pg_connection, pg_connection
+from src.metrics import record_bytes, record_round_trips
+from src.sql_definitions import (
+    ALL_CREATE_QUERIES,
+    CREATE_STAGING_TABLE,
+    COPY_INTO_STAGING,
+    MERGE_FROM_STAGING,
+    APPEND_FROM_STAGING,
+    DROP_STAGING_TABLE,
+    SELECT_TABLE_COLUMNS,
+    ADD_COLUMN,
+    SELECT_MISSING_TABLES,
+    LOCK_PARTITION_NAME,
+    SELECT_TABLE_EXISTS,
+    CREATE_MONTH_PARTITION,
+    COPY_SELECT
+)
 
 def initialize_database():
-    conn = None
-    try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        for query in ALL_CREATE_QUERIES:
-            cursor.execute(query)
-        conn.commit()
-        print("Schema initialized successfully.")
-    except Exception as e:
-        if conn:
+    with pg_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            for query in ALL_CREATE_QUERIES:
+                cursor.execute(query)
+            conn.commit()
+            print("Schema initialized successfully.")
+        except Exception as e:
             conn.rollback()
-        print(f"Initialization error: {e}")
-        raise
+            print(f"Initialization error: {e}")
+            raise
+
+def copy_upsert(conn, df, table, key_columns, update=True):
+    """
+    Bulk-upserts a DataFrame into table.
+    The frame is streamed with COPY into a temp staging table and merged into
+    the target with one INSERT ... ON CONFLICT DO UPDATE. Duplicate keys within
+    the frame collapse to the last of their rows. With update=False existing
+    rows are kept as they are (ON CONFLICT DO NOTHING), for append-only tables.
+    The caller owns the transaction. Returns the number of rows merged.
+    """
+    if df.empty:
+        return 0
+
+    columns = list(df.columns)
+    update_columns = [c for c in columns if c not in key_columns]
+    staging = sql.Identifier(f"staging_{table}")
+    target = sql.Identifier(table)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    key_list = sql.SQL(', ').join(map(sql.Identifier, key_columns))
+    updates = sql.SQL(', ').join(
+        sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(c)) for c in update_columns
+    )
+
+    # NaN/None are written as empty fields, which CSV COPY reads as NULL.
+    # Arrow's CSV writer formats numbers and timestamps in C, an order of
+    # magnitude faster than DataFrame.to_csv on intraday-sized batches.
+    buffer = io.BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer,
+                    pacsv.WriteOptions(include_header=False))
+    record_bytes('postgres', table, buffer.tell())
+    buffer.seek(0)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql.SQL(DROP_STAGING_TABLE).format(staging=staging))
+        cursor.execute(sql.SQL(CREATE_STAGING_TABLE).format(staging=staging, target=target))
+        cursor.copy_expert(sql.SQL(COPY_INTO_STAGING).format(staging=staging, columns=column_list), buffer)
+        cursor.execute(sql.SQL(MERGE_FROM_STAGING if update else APPEND_FROM_STAGING).format(
+            target=target, staging=staging, columns=column_list, keys=key_list, updates=updates
+        ))
+        merged = cursor.rowcount
+        cursor.execute(sql.SQL(DROP_STAGING_TABLE).format(staging=staging))
+        record_round_trips('postgres', table, 5)
+    finally:
+        cursor.close()
+    return merged
+
+def ensure_columns(conn, table, columns, column_type='DOUBLE PRECISION'):
+    """
+    Adds the columns that table is missing (e.g. new indicators from the
+    config). Existing tables are checked first, so the ALTER TABLE lock is
+    only taken when something changes. The caller owns the transaction.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SELECT_TABLE_COLUMNS, (table,))
+        existing = {name for (name,) in cursor.fetchall()}
+        missing = [c for c in columns if c not in existing]
+        for column in missing:
+            cursor.execute(sql.SQL(ADD_COLUMN).format(
+                table=sql.Identifier(table), column=sql.Identifier(column), column_type=sql.SQL(column_type)
+            ))
+        record_round_trips('postgres', table, 1 + len(missing))
+    finally:
+        cursor.close()
+    if missing:
+        print(f"Added columns to {table}: {', '.join(missing)}")
+    return missing
+
+def ensure_month_partitions(conn, table, timestamps):
+    """
+    Creates the monthly partitions of a range-partitioned table (named
+    <table>_YYYY_MM) that the given timestamps fall into and that don't exist
+    yet. Existing ones are looked up first, so the DDL lock on the parent is
+    only taken for a new month. A missing one is created under an advisory
+    lock on its name and looked up again first, so parallel shards reaching
+    a new month create it once; the others wait for the creator's commit.
+    The caller owns the transaction.
+    """
+    months = pd.DatetimeIndex(timestamps).to_period('M').unique()
+    names = {f"{table}_{month.year}_{month.month:02d}": month for month in months}
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SELECT_MISSING_TABLES, (list(names),))
+        missing = [name for (name,) in cursor.fetchall()]
+        created = []
+        for name in missing:
+            cursor.execute(LOCK_PARTITION_NAME, (name,))
+            cursor.execute(SELECT_TABLE_EXISTS, (name,))
+            record_round_trips('postgres', table, 2)
+            if cursor.fetchone()[0]:
+                continue   # another loader created it while we waited
+            month = names[name]
+            cursor.execute(sql.SQL(CREATE_MONTH_PARTITION).format(
+                partition=sql.Identifier(name), table=sql.Identifier(table),
+                start=sql.Literal(month.start_time.strftime('%Y-%m-%d')),
+                end=sql.Literal((month + 1).start_time.strftime('%Y-%m-%d'))
+            ))
+            created.append(name)
+        record_round_trips('postgres', table, 1 + len(created))
+    finally:
+        cursor.close()
+    if created:
+        print(f"Created partitions of {table}: {', '.join(created)}")
+    return created
+
+def copy_select(conn, query, params, table, **read_options):
+    """
+    Runs a SELECT (reading mainly from table, for the metrics) through
+    COPY ... TO STDOUT and parses the CSV into a DataFrame, which is much
+    faster than fetching rows through the cursor for large results.
+    read_options go to pandas.read_csv (e.g. parse_dates, dtype).
+    """
+    cursor = conn.cursor()
+    try:
+        bound = cursor.mogrify(query, params).decode()
+        buffer = io.StringIO()
+        cursor.copy_expert(sql.SQL(COPY_SELECT).format(query=sql.SQL(bound)), buffer)
+        record_round_trips('postgres', table)
     finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        cursor.close()
+    record_bytes('postgres', table, buffer.tell())
+    buffer.seek(0)
+    return pd.read_csv(buffer, **read_options)
@@ -0,0 +1,56 @@
+import numpy as np
+
+# Point selection for plotting long series at a fixed pixel width. Both
+# functions return the sorted positions of the points to keep, so several
+# columns of a frame can be reduced consistently with .iloc.
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, from
+    each of n_out - 2 equal buckets in between, the point forming the largest
+    triangle with the previously kept point and the next bucket's average.
+    Preserves the visual shape (peaks, troughs, trend) of the line.
+    x must be increasing and numeric (e.g. datetime64 viewed as int64).
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # average point of every bucket, plus the last point as the final "next bucket"
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1]) / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+def min_max(y, n_out):
+    """
+    Keeps the minimum and maximum of each of n_out // 2 equal buckets (and the
+    endpoints), so every spike survives. Cheaper than lttb and fully
+    vectorized, at the cost of a denser-looking line.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(len(edges)), np.diff(np.append(edges, n)))
+    # first position in each bucket where its min (max) is reached
+    lows = np.flatnonzero(y == np.minimum.reduceat(y, edges)[bucket])
+    highs = np.flatnonzero(y == np.maximum.reduceat(y, edges)[bucket])
+    first_low = lows[np.unique(bucket[lows], return_index=True)[1]]
+    first_high = highs[np.unique(bucket[highs], return_index=True)[1]]
+    return np.unique(np.concatenate([[0, n - 1], first_low, first_high]))
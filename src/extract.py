@@ -1,54 +1,271 @@
-import yfinance as yf
+import random
+import threading
+import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-from src.db_utils import get_pg_connection 
-from src.sql_definitions import CREATE_RAW_STOCK_TABLE, INSERT_RAW_STOCK_DATA
+from src.db_utils import pg_connection, copy_upsert, ensure_month_partitions
+from src.intraday import (
+    INTRADAY_INTERVALS,
+    INTRADAY_LOOKBACK_DAYS,
+    RAW_INTRADAY_COLUMNS,
+    RAW_INTRADAY_KEY_COLUMNS,
+    RAW_INTRADAY_TABLE,
+    is_intraday
+)
+from src.lake import RAW_DATASET, upsert_partitions
+from src.metrics import stage_timer, record_batch, record_error, record_rows
+from src.price_sources import YFinanceSource
+from src.sql_definitions import (
+    CREATE_RAW_STOCK_TABLE,
+    CREATE_RAW_INTRADAY_TABLE,
+    SELECT_RAW_STOCK_WATERMARKS,
+    SELECT_RAW_INTRADAY_WATERMARKS
+)
 
 TICKERS = ['AAPL', 'MSFT', 'GOOGL']
+LOOKBACK_DAYS = 365 * 2
+# Bar sizes: daily bars go to raw_stock_data, intraday ones to raw_intraday_bars
+INTERVALS = ('1d',) + tuple(INTRADAY_INTERVALS)
 
-def initialize_db():
-    conn = get_pg_connection()
+# Concurrency settings for the extraction engine
+BATCH_SIZE = 50             # tickers per multi-symbol request
+MAX_WORKERS = 4             # concurrent requests in flight
+REQUESTS_PER_SECOND = 2.0   # shared rate limit for sources that don't declare one
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0         # seconds, doubled on every retry
+
+# Tickers per mapped Airflow task group (one extract/transform/load chain each)
+TICKER_SHARD_SIZE = 100
+
+RAW_COLUMNS = ['Date', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
+RAW_KEY_COLUMNS = ['Date', 'Ticker']
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` of them start per second across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+def initialize_db(conn):
     cursor = conn.cursor()
     try:
         cursor.execute(CREATE_RAW_STOCK_TABLE)
+        cursor.execute(CREATE_RAW_INTRADAY_TABLE)
         conn.commit()
     finally:
         cursor.close()
-        conn.close()
 
-def fetch_and_load_data(tickers):
-    initialize_db()
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    
+def make_ticker_shards(tickers, shard_size=TICKER_SHARD_SIZE):
+    """Splits the ticker universe into lists of at most shard_size tickers."""
+    shard_size = max(1, int(shard_size))
+    return [list(tickers[i:i + shard_size]) for i in range(0, len(tickers), shard_size)]
+
+def get_ticker_watermarks(cursor, tickers, interval='1d'):
+    """
+    Returns {ticker: max stored Date} for the tickers already in raw_stock_data,
+    or their last stored bar of `interval` in raw_intraday_bars.
+    """
+    if is_intraday(interval):
+        cursor.execute(SELECT_RAW_INTRADAY_WATERMARKS, (list(tickers), interval))
+    else:
+        cursor.execute(SELECT_RAW_STOCK_WATERMARKS, (list(tickers),))
+    return {ticker: last_date for ticker, last_date in cursor.fetchall()}
+
+# Default fetch_fn. Any callable with the PriceSource signature can be used
+# instead, e.g. price_sources.SyntheticSource or a local stub.
+download_batch = YFinanceSource()
+
+def fetch_with_retry(fetch_fn, tickers, start_date, end_date, limiter, interval='1d'):
+    """Calls fetch_fn under the rate limiter, retrying with exponential backoff."""
+    # daily fetch_fns keep the plain three-argument signature
+    options = {'interval': interval} if is_intraday(interval) else {}
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.wait()
+        try:
+            return fetch_fn(tickers, start_date, end_date, **options)
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = RETRY_BACKOFF * (2 ** attempt) * (1 + random.random())
+            print(f"Fetch failed for {len(tickers)} tickers ({e}). Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def plan_requests(tickers, watermarks, window_start, end_date, batch_size, interval='1d'):
+    """
+    Groups tickers sharing the same start date into batches of batch_size.
+    Returns a list of (tickers, start_date) requests; up-to-date tickers are dropped.
+    Intraday requests resume on the watermark's own day, which may have more bars.
+    """
+    resume_after = timedelta(days=0 if is_intraday(interval) else 1)
+    by_start = {}
+    for ticker in tickers:
+        watermark = watermarks.get(ticker)
+        start_date = window_start
+        if watermark is not None:
+            start_date = max(window_start, (watermark + resume_after).strftime('%Y-%m-%d'))
+            if start_date >= end_date:
+                print(f"{ticker} is up to date (last bar {watermark:%Y-%m-%d}).")
+                continue
+        by_start.setdefault(start_date, []).append(ticker)
+
+    requests = []
+    for start_date, group in by_start.items():
+        for i in range(0, len(group), batch_size):
+            requests.append((group[i:i + batch_size], start_date))
+    return requests
+
+def extract_concurrently(requests, end_date, fetch_fn, max_workers, rate, interval='1d'):
+    """
+    Runs the fetch requests on a bounded thread pool.
+    Yields (tickers, frames, error) as requests complete, so the caller can act
+    as the single writer. At most 2 * max_workers requests are in flight.
+    """
+    limiter = RateLimiter(rate)
+    pending = iter(requests)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            while len(in_flight) < 2 * max_workers:
+                request = next(pending, None)
+                if request is None:
+                    break
+                tickers, start_date = request
+                future = executor.submit(fetch_with_retry, fetch_fn, tickers, start_date, end_date,
+                                         limiter, interval)
+                in_flight[future] = tickers
+
+            if not in_flight:
+                return
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                tickers = in_flight.pop(future)
+                try:
+                    yield tickers, future.result(), None
+                except Exception as e:
+                    yield tickers, {}, e
+
+def prepare_frame(ticker, frame, watermark):
+    """Shapes a fetched frame into raw_stock_data columns, dropping bars at or before the watermark."""
+    data = frame.reset_index()
+    if watermark is not None:
+        # the source may return the bar on the boundary again
+        data = data[data['Date'] > pd.Timestamp(watermark)]
+    data['Ticker'] = ticker
+    data['Date'] = data['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    # multi-symbol downloads widen Volume to float; keep it integral for the BIGINT column
+    data['Volume'] = data['Volume'].round().astype('Int64')
+    return data[RAW_COLUMNS]
+
+def prepare_intraday_frame(ticker, frame, watermark, interval):
+    """
+    Shapes a fetched intraday frame into raw_intraday_bars columns.
+    Timestamps are kept as datetime64 (no per-row formatting) in the
+    exchange's local time. The bar at the watermark is kept so that a bar
+    stored while still in progress is overwritten with its final values.
+    """
+    data = frame.reset_index()
+    data = data.rename(columns={data.columns[0]: 'Timestamp'})
+    if data['Timestamp'].dt.tz is not None:
+        data['Timestamp'] = data['Timestamp'].dt.tz_localize(None)
+    if watermark is not None:
+        data = data[data['Timestamp'] >= pd.Timestamp(watermark)]
+    data['Ticker'] = ticker
+    data['Interval'] = interval
+    data['Volume'] = data['Volume'].round().astype('Int64')
+    return data[RAW_INTRADAY_COLUMNS]
+
+@stage_timer('extract')
+def fetch_and_load_data(tickers, backfill=False, fetch_fn=None,
+                        batch_size=BATCH_SIZE, max_workers=MAX_WORKERS,
+                        requests_per_second=None, lookback_days=LOOKBACK_DAYS, interval='1d'):
+    """
+    Fetches daily bars into raw_stock_data from fetch_fn (a PriceSource;
+    yfinance by default). With an intraday interval ('1m', '5m') the bars go
+    to the monthly partitions of raw_intraday_bars instead, and lookback_days
+    is capped at what the source serves for that interval.
+    By default only bars after each ticker's stored watermark are fetched;
+    backfill=True re-downloads the full lookback_days window.
+    Tickers are fetched in batches on a thread pool while this thread writes
+    each completed batch in its own transaction. The request rate defaults to
+    the source's own rate_limit. Every batch is also merged into the Parquet
+    lake (src.lake) for columnar reads.
+    """
+    fetch_fn = fetch_fn or download_batch
+    if requests_per_second is None:
+        requests_per_second = getattr(fetch_fn, 'rate_limit', REQUESTS_PER_SECOND)
+    intraday = is_intraday(interval)
     end_date = datetime.now().strftime('%Y-%m-%d')
-    start_date = (datetime.now() - timedelta(days=365 * 2)).strftime('%Y-%m-%d')
+    if intraday:
+        lookback_days = min(lookback_days, INTRADAY_LOOKBACK_DAYS[interval])
+        # today's bars so far are included; daily bars stop at yesterday's close
+        end_date = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    window_start = (datetime.now() - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
     total_records_loaded = 0
-    
-    for ticker in tickers:
-        print(f"Fetching {ticker} from {start_date} to {end_date}...")
-        try:
-            data = yf.download(ticker, start=start_date, end=end_date, progress=False)
-            if data.empty:
+
+    with pg_connection() as conn:
+        initialize_db(conn)
+        cursor = conn.cursor()
+        watermarks = {} if backfill else get_ticker_watermarks(cursor, tickers, interval)
+        cursor.close()
+        requests = plan_requests(tickers, watermarks, window_start, end_date, batch_size, interval)
+
+        print(f"Fetching {interval} bars of {len(tickers)} tickers in {len(requests)} batches up to {end_date}...")
+        for batch, frames, error in extract_concurrently(requests, end_date, fetch_fn,
+                                                         max_workers, requests_per_second, interval):
+            if error is not None:
+                print(f"Error fetching batch {batch[0]}..{batch[-1]}: {error}")
+                record_error('extract')
                 continue
-            
-            data = data.reset_index()
-            data['Ticker'] = ticker
-            data['Date'] = data['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            data_to_insert = data[['Date', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']]
-            records = [tuple(x) for x in data_to_insert.values]
-            
-            cursor.executemany(INSERT_RAW_STOCK_DATA, records)
-            conn.commit()
-            
-            print(f"Loaded {len(records)} records for {ticker}.")
-            total_records_loaded += len(records)
-            
-        except Exception as e:
-            print(f"Error for {ticker}: {e}")
-            conn.rollback()
-            
-    cursor.close()
-    conn.close()
-    return total_records_loaded
\ No newline at end of file
+
+            if not frames:
+                continue
+            if intraday:
+                data = pd.concat(
+                    [prepare_intraday_frame(ticker, frame, watermarks.get(ticker), interval)
+                     for ticker, frame in frames.items()],
+                    ignore_index=True
+                )
+            else:
+                data = pd.concat(
+                    [prepare_frame(ticker, frame, watermarks.get(ticker)) for ticker, frame in frames.items()],
+                    ignore_index=True
+                )
+
+            try:
+                if intraday:
+                    # the lake's per-year partition files are rewritten on every
+                    # merge, which doesn't scale to minute bars; they stay in Postgres
+                    ensure_month_partitions(conn, RAW_INTRADAY_TABLE, data['Timestamp'])
+                    loaded = copy_upsert(conn, data, RAW_INTRADAY_TABLE, RAW_INTRADAY_KEY_COLUMNS)
+                else:
+                    loaded = copy_upsert(conn, data, 'raw_stock_data', RAW_KEY_COLUMNS)
+                    # lake files are written before the commit; a failed batch is
+                    # re-fetched later and simply overwrites the same dates
+                    upsert_partitions(RAW_DATASET, data)
+                conn.commit()
+            except Exception as e:
+                print(f"Error loading batch {batch[0]}..{batch[-1]}: {e}")
+                conn.rollback()
+                record_error('extract')
+                record_rows('extract', len(data), 'failed')
+                continue
+
+            print(f"Loaded {loaded} records for {len(frames)} tickers.")
+            record_batch('extract', len(data))
+            record_rows('extract', loaded)
+            total_records_loaded += loaded
+
+    return total_records_loaded
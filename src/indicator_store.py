@@ -0,0 +1,92 @@
+import pandas as pd
+from src.db_utils import pg_connection, copy_upsert
+from src.metrics import record_rows, record_round_trips
+from src.sql_definitions import (
+    SELECT_STOCK_INDICATOR_NAMES,
+    SELECT_STOCK_INDICATOR_WATERMARKS,
+    SELECT_STOCK_INDICATORS
+)
+
+# Long/narrow layout of the analyzed data: stock_indicators holds one row per
+# (Ticker, Indicator, Date) instead of one wide row per (Date, Ticker), so a
+# new indicator is written as new rows and never rewrites the existing ones.
+
+INDICATOR_KEY_COLUMNS = ['Ticker', 'Indicator', 'Date']
+
+def series_columns(df):
+    """The series of a transformed frame: Close plus its indicator columns."""
+    return [c for c in df.columns if c not in ('Date', 'Ticker', 'Load_Timestamp')]
+
+def to_long(df, series):
+    """Melts a wide (Date, Ticker, <series>...) frame into (Ticker, Indicator, Date, Value), dropping NaN values."""
+    long_df = df.melt(id_vars=['Date', 'Ticker'], value_vars=series, var_name='Indicator', value_name='Value')
+    return long_df.dropna(subset=['Value'])[['Ticker', 'Indicator', 'Date', 'Value']]
+
+def get_indicator_watermarks(conn, tickers, series):
+    """Returns {(ticker, series): last stored Date} for the pairs in stock_indicators."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SELECT_STOCK_INDICATOR_WATERMARKS, (list(tickers), list(series)))
+        record_round_trips('postgres', 'stock_indicators')
+        return {(ticker, name): last_date for ticker, name, last_date in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+def get_ticker_watermarks(conn, tickers, series):
+    """
+    Returns {ticker: Date up to which every series is stored}, for the
+    incremental transform. A ticker missing any series (e.g. a newly
+    configured indicator) is left out, so its full history is recomputed.
+    """
+    stored = get_indicator_watermarks(conn, tickers, series)
+    watermarks = {}
+    for ticker in tickers:
+        dates = [stored.get((ticker, name)) for name in series]
+        if all(d is not None for d in dates):
+            watermarks[ticker] = min(dates)
+    return watermarks
+
+def write_indicators(conn, df, load_timestamp, replace=False):
+    """
+    Appends the series of a transformed frame to stock_indicators.
+    Rows at or before a (ticker, series) pair's last stored Date are dropped
+    before the COPY, so recomputing the full history to backfill one new
+    indicator only writes that indicator's rows. replace=True overwrites
+    stored values instead (after a raw backfill rewrote older bars).
+    The caller owns the transaction. Returns the number of rows written.
+    """
+    series = series_columns(df)
+    long_df = to_long(df.assign(Date=pd.to_datetime(df['Date'])), series)
+    candidates = len(long_df)
+    if not replace and not long_df.empty:
+        stored = get_indicator_watermarks(conn, long_df['Ticker'].unique(), series)
+        if stored:
+            index = pd.MultiIndex.from_frame(long_df[['Ticker', 'Indicator']])
+            last_dates = pd.to_datetime(pd.Series(stored).reindex(index).to_numpy())
+            long_df = long_df[~(long_df['Date'].to_numpy() <= last_dates)]
+    record_rows('load', candidates - len(long_df), 'skipped')
+
+    long_df = long_df.assign(Load_Timestamp=load_timestamp)
+    return copy_upsert(conn, long_df, 'stock_indicators', INDICATOR_KEY_COLUMNS, update=replace)
+
+def read_indicators(tickers, series=None, start=None, end=None):
+    """
+    Reads series from stock_indicators and pivots them back into a wide
+    frame: one row per (Date, Ticker), one column per series, in the shape
+    transform_data produces. series defaults to every stored series.
+    """
+    with pg_connection() as conn:
+        if series is None:
+            cursor = conn.cursor()
+            cursor.execute(SELECT_STOCK_INDICATOR_NAMES, (list(tickers),))
+            series = sorted(name for (name,) in cursor.fetchall())
+            cursor.close()
+        long_df = pd.read_sql_query(SELECT_STOCK_INDICATORS, conn, params={
+            'tickers': list(tickers), 'indicators': list(series), 'start': start, 'end': end,
+        })
+        record_round_trips('postgres', 'stock_indicators')
+
+    wide_df = long_df.pivot(index=['Date', 'Ticker'], columns='Indicator', values='Value')
+    wide_df = wide_df.reindex(columns=[s for s in series if s in wide_df.columns])
+    wide_df.columns.name = None
+    return wide_df.reset_index().sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
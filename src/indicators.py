@@ -0,0 +1,309 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Technical indicator kernels.
+# Every kernel computes one indicator for all tickers of a frame at once: the
+# inputs are contiguous float64 arrays sorted by (Ticker, Date), and
+# `positions` (from group_positions) keeps windows and recurrences from
+# crossing into the next ticker. Each kernel is O(n); recurrences (EMA, Wilder
+# smoothing) are solved as blocked matrix products instead of a loop per row.
+
+# Indicators computed by default. Override with a JSON file of the same shape
+# (a list of {"indicator": <name>, <param>: <value>, ...}) via INDICATOR_CONFIG.
+DEFAULT_INDICATORS = [
+    {'indicator': 'sma', 'window': 50},
+    {'indicator': 'sma', 'window': 200},
+    {'indicator': 'ema', 'span': 12},
+    {'indicator': 'ema', 'span': 26},
+    {'indicator': 'rsi', 'period': 14},
+    {'indicator': 'macd', 'fast': 12, 'slow': 26, 'signal': 9},
+    {'indicator': 'bollinger', 'window': 20, 'num_std': 2},
+    {'indicator': 'atr', 'period': 14},
+    {'indicator': 'vwap', 'window': 20},
+]
+
+# Recursive indicators depend on the whole history; an incremental run seeds
+# them with this many periods, after which the start-up error is below 1e-8.
+RECURSIVE_WARMUP = 20
+# Rows per chunk of the blocked recurrence
+RECURRENCE_BLOCK = 64
+
+INDICATORS = {}
+
+def register(name, inputs, columns, lookback):
+    """
+    Registers a kernel under `name`.
+    inputs: the OHLCV columns it reads, passed positionally after `positions`.
+    columns(**params): the output column names, one per returned array.
+    lookback(**params): the rows before a bar needed to compute it.
+    """
+    def decorator(kernel):
+        INDICATORS[name] = {'kernel': kernel, 'inputs': inputs, 'columns': columns, 'lookback': lookback}
+        return kernel
+    return decorator
+
+# --- Building blocks ---
+
+def group_positions(tickers):
+    """Returns each row's 0-based position within its run of equal tickers."""
+    n = len(tickers)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, tickers[1:] != tickers[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    return np.arange(n) - np.repeat(starts, lengths)
+
+def rolling_mean(values, positions, window):
+    """
+    Trailing mean over `window` rows for many series at once.
+    Rows must be sorted by (ticker, date); `positions` comes from group_positions,
+    so windows never span two tickers. A window containing NaN yields NaN,
+    matching pandas rolling().mean().
+    """
+    is_nan = np.isnan(values)
+    has_nan = is_nan.any()
+    # prefix sums with a leading zero: sum(values[i - window + 1:i + 1]) = sums[i + 1] - sums[i + 1 - window]
+    sums = np.r_[0.0, np.cumsum(np.where(is_nan, 0.0, values) if has_nan else values)]
+
+    result = np.full(len(values), np.nan)
+    rows = np.flatnonzero(positions >= window - 1)
+    result[rows] = (sums[rows + 1] - sums[rows + 1 - window]) / window
+    if has_nan:
+        nans = np.r_[0, np.cumsum(is_nan)]
+        result[rows[nans[rows + 1] != nans[rows + 1 - window]]] = np.nan
+    return result
+
+def rolling_std(values, positions, window):
+    """Trailing population standard deviation over `window` rows, like rolling_mean."""
+    # shifting each series by its first value keeps the running sums small
+    centered = values - values[np.flatnonzero(positions == 0)][np.cumsum(positions == 0) - 1]
+    mean = rolling_mean(centered, positions, window)
+    mean_of_squares = rolling_mean(centered * centered, positions, window)
+    return np.sqrt(np.maximum(mean_of_squares - mean * mean, 0.0))
+
+def previous(values, positions):
+    """The value one row earlier within the same ticker (NaN on each ticker's first row)."""
+    result = np.empty(len(values))
+    result[0:1] = np.nan
+    result[1:] = values[:-1]
+    result[positions == 0] = np.nan
+    return result
+
+def segment_positions(lengths):
+    """0-based position of every row within its segment, for contiguous segments of the given lengths."""
+    starts = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) - np.repeat(starts, lengths)
+
+def linear_recurrence(drive, lengths, decay, initial):
+    """
+    Solves y[t] = decay * y[t-1] + drive[t] for contiguous segments of the
+    given lengths, each starting from y[-1] = initial[segment].
+    Segments are cut into RECURRENCE_BLOCK-row chunks that are all solved by
+    one matrix product; the state carried between chunks is itself a
+    recurrence (with decay^block), solved the same way. A NaN drive makes
+    that row and the rest of its segment NaN, leaving earlier rows intact.
+    """
+    # NaN * 0 is NaN, so a NaN left in the product would reach back through its chunk
+    is_nan = np.isnan(drive)
+    has_nan = is_nan.any()
+    if has_nan:
+        drive = np.where(is_nan, 0.0, drive)
+
+    block = RECURRENCE_BLOCK
+    chunks = -(-lengths // block)
+    segment = np.repeat(np.arange(len(lengths)), lengths)
+    position = segment_positions(lengths)
+    column = (np.cumsum(chunks) - chunks)[segment] + position // block
+    row = position % block
+
+    powers = decay ** np.arange(block + 1)
+    offsets = np.arange(block)
+    upper = np.triu(powers[np.subtract.outer(offsets, offsets).T.clip(0)])
+    # one chunk per row of `padded`; rows past a segment's end stay zero
+    flat = column * block + row
+    padded = np.zeros(chunks.sum() * block)
+    padded[flat] = drive
+    local = padded.reshape(-1, block) @ upper
+
+    # state entering each chunk: the segment's initial value for its first
+    # chunk, else the full solution at the end of the previous chunk
+    entering = np.repeat(initial, chunks)
+    if chunks.max(initial=0) > 1:
+        ends = linear_recurrence(local[:, block - 1], chunks, powers[block], initial)
+        later = segment_positions(chunks) > 0
+        entering[later] = ends[np.flatnonzero(later) - 1]
+    result = local.ravel()[flat] + powers[row + 1] * entering[column]
+    if has_nan:
+        # NaNs seen so far within each segment
+        nans = np.cumsum(is_nan)
+        starts = np.cumsum(lengths) - lengths
+        result[nans - np.r_[0, nans][starts][segment] > 0] = np.nan
+    return result
+
+def smoothed(values, positions, alpha, warmup):
+    """
+    Exponential smoothing y_t = (1 - alpha) * y_(t-1) + alpha * x_t per ticker,
+    started TA-Lib style from the mean of the first `warmup` values (so the
+    first output is at position warmup - 1 and earlier rows are NaN).
+    alpha = 2 / (span + 1) gives an EMA, alpha = 1 / period Wilder smoothing.
+    A NaN input leaves the rest of that ticker's series NaN.
+    """
+    result = np.full(len(values), np.nan)
+    seed_rows = np.flatnonzero(positions == warmup - 1)
+    if len(seed_rows) == 0:
+        return result
+    result[seed_rows] = values[np.subtract.outer(seed_rows, np.arange(warmup))].mean(axis=1)
+
+    # the rows after each ticker's seed row form one contiguous segment
+    group_ends = np.r_[np.flatnonzero(positions == 0)[1:], len(values)]
+    lengths = group_ends[np.searchsorted(group_ends, seed_rows, side='right')] - seed_rows - 1
+    rows = np.repeat(seed_rows + 1, lengths) + segment_positions(lengths)
+    result[rows] = linear_recurrence(alpha * values[rows], lengths, 1.0 - alpha, result[seed_rows])
+    return result
+
+def on_rows(kernel, mask, positions, *arrays, offset=0):
+    """Runs kernel(*arrays, positions) on the rows in mask only, re-based by offset."""
+    result = np.full(len(positions), np.nan)
+    result[mask] = kernel(*(a[mask] for a in arrays), positions[mask] - offset)
+    return result
+
+# --- Indicators ---
+
+@register('sma', inputs=('Close',),
+          columns=lambda window: [f'SMA_{window}'],
+          lookback=lambda window: window - 1)
+def sma(positions, close, window):
+    return [rolling_mean(close, positions, window)]
+
+@register('ema', inputs=('Close',),
+          columns=lambda span: [f'EMA_{span}'],
+          lookback=lambda span: RECURSIVE_WARMUP * span)
+def ema(positions, close, span):
+    return [smoothed(close, positions, 2.0 / (span + 1), span)]
+
+@register('rsi', inputs=('Close',),
+          columns=lambda period: [f'RSI_{period}'],
+          lookback=lambda period: RECURSIVE_WARMUP * period)
+def rsi(positions, close, period):
+    """Wilder's RSI: 100 - 100 / (1 + smoothed gains / smoothed losses)."""
+    change = close - previous(close, positions)
+    has_change = positions > 0
+    wilder = lambda values, pos: smoothed(values, pos, 1.0 / period, period)
+    gains = on_rows(wilder, has_change, positions, np.maximum(change, 0.0), offset=1)
+    losses = on_rows(wilder, has_change, positions, np.maximum(-change, 0.0), offset=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100.0 - 100.0 / (1.0 + gains / losses)
+    values[losses == 0] = 100.0
+    values[(losses == 0) & (gains == 0)] = 50.0
+    return [values]
+
+@register('macd', inputs=('Close',),
+          columns=lambda fast, slow, signal: [f'MACD_{fast}_{slow}_{signal}',
+                                              f'MACD_SIGNAL_{fast}_{slow}_{signal}',
+                                              f'MACD_HIST_{fast}_{slow}_{signal}'],
+          lookback=lambda fast, slow, signal: RECURSIVE_WARMUP * (slow + signal))
+def macd(positions, close, fast, slow, signal):
+    line = (smoothed(close, positions, 2.0 / (fast + 1), fast)
+            - smoothed(close, positions, 2.0 / (slow + 1), slow))
+    ema_signal = lambda values, pos: smoothed(values, pos, 2.0 / (signal + 1), signal)
+    signal_line = on_rows(ema_signal, positions >= slow - 1, positions, line, offset=slow - 1)
+    return [line, signal_line, line - signal_line]
+
+@register('bollinger', inputs=('Close',),
+          columns=lambda window, num_std: [f'BB_UPPER_{window}_{num_std:g}', f'BB_MIDDLE_{window}',
+                                           f'BB_LOWER_{window}_{num_std:g}'],
+          lookback=lambda window, num_std: window - 1)
+def bollinger(positions, close, window, num_std):
+    middle = rolling_mean(close, positions, window)
+    width = num_std * rolling_std(close, positions, window)
+    return [middle + width, middle, middle - width]
+
+@register('atr', inputs=('High', 'Low', 'Close'),
+          columns=lambda period: [f'ATR_{period}'],
+          lookback=lambda period: RECURSIVE_WARMUP * period)
+def atr(positions, high, low, close, period):
+    """Wilder-smoothed true range; the first bar's true range is its high - low."""
+    prev_close = previous(close, positions)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return [smoothed(true_range, positions, 1.0 / period, period)]
+
+@register('vwap', inputs=('High', 'Low', 'Close', 'Volume'),
+          columns=lambda window: [f'VWAP_{window}'],
+          lookback=lambda window: window - 1)
+def vwap(positions, high, low, close, volume, window):
+    """Rolling volume-weighted typical price over `window` bars."""
+    typical = (high + low + close) / 3.0
+    # the window length cancels out of sum(price * volume) / sum(volume)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return [rolling_mean(typical * volume, positions, window) / rolling_mean(volume, positions, window)]
+
+# --- Config ---
+
+def load_indicator_config(path=None):
+    """Returns the indicator config from a JSON file (INDICATOR_CONFIG), else the defaults."""
+    path = path or os.environ.get('INDICATOR_CONFIG')
+    if not path:
+        return DEFAULT_INDICATORS
+    with open(path) as f:
+        config = json.load(f)
+    validate_config(config)
+    return config
+
+def split_entry(entry):
+    params = {key: value for key, value in entry.items() if key != 'indicator'}
+    name = entry['indicator']
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator '{name}'. Available: {', '.join(sorted(INDICATORS))}")
+    return INDICATORS[name], params
+
+def output_columns(config):
+    """The indicator columns the config produces, in order."""
+    columns = []
+    for entry in config:
+        spec, params = split_entry(entry)
+        columns.extend(spec['columns'](**params))
+    return columns
+
+def required_inputs(config):
+    """The OHLCV columns the config reads."""
+    inputs = []
+    for entry in config:
+        spec, _ = split_entry(entry)
+        inputs.extend(c for c in spec['inputs'] if c not in inputs)
+    return inputs
+
+def lookback(config):
+    """Rows of history needed before the first bar to compute every indicator."""
+    rows = 0
+    for entry in config:
+        spec, params = split_entry(entry)
+        rows = max(rows, spec['lookback'](**params))
+    return rows
+
+def validate_config(config):
+    columns = output_columns(config)
+    duplicates = sorted({c for c in columns if columns.count(c) > 1})
+    if duplicates:
+        raise ValueError(f"Indicator config produces duplicate columns: {', '.join(duplicates)}")
+
+def compute_indicators(df, config=DEFAULT_INDICATORS):
+    """
+    Adds the configured indicator columns to a frame sorted by (Ticker, Date)
+    with the OHLCV columns the config needs. Each input column is converted
+    to a float64 array once and shared by all kernels.
+    """
+    # integer codes compare much faster than ticker strings
+    positions = group_positions(pd.factorize(df['Ticker'])[0])
+    arrays = {}
+    for entry in config:
+        spec, params = split_entry(entry)
+        inputs = []
+        for column in spec['inputs']:
+            if column not in arrays:
+                arrays[column] = np.ascontiguousarray(df[column].to_numpy(dtype=np.float64, na_value=np.nan))
+            inputs.append(arrays[column])
+        for column, values in zip(spec['columns'](**params), spec['kernel'](positions, *inputs, **params)):
+            df[column] = values
+    return df
@@ -1,24 +1,171 @@
 import json
 import sqlite3
 import os
-from datetime import datetime
-from sql_queries import CREATE_RAW_TRANSACTIONS_TABLE, INSERT_RAW_TRANSACTION
+from itertools import islice
+from sql_queries import CREATE_RAW_TRANSACTIONS_TABLE, SQLITE_RAW_INDEX_QUERIES, INSERT_OR_IGNORE_RAW_TRANSACTION
+from src.metrics import stage_timer, record_batch, record_rows, record_round_trips
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'warehouse', 'ecommerce_warehouse.db')
 
-def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
+BATCH_SIZE = 10000            # records per executemany / transaction
+READ_CHUNK_CHARS = 1 << 20    # characters read at a time from JSON array files
+SOURCE_EXTENSIONS = ('.json', '.jsonl', '.ndjson', '.parquet')
+RAW_FIELDS = ['transaction_id', 'user_id', 'product_id', 'quantity', 'price', 'timestamp']
+
+BUSY_TIMEOUT_SECONDS = 30    # how long a connection waits on a lock held by another one
+
+# Performance profile applied to every connection.
+# WAL lets readers run alongside the ingestion writer, and with
+# synchronous=NORMAL a commit is an append to the WAL rather than an fsync
+# of the database file.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,          # negative = KiB, i.e. a 64 MiB page cache
+    'mmap_size': 268435456,        # read pages through a 256 MiB memory map
+    'temp_store': 'MEMORY',
+}
+
+def apply_pragmas(conn, pragmas=SQLITE_PRAGMAS):
+    cursor = conn.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+def get_db_connection(read_only=False):
+    """
+    Establishes a connection to the SQLite database with the tuned pragmas.
+    With read_only=True the file is opened in read-only mode, for analytical
+    queries that run while ingestion is writing.
+    """
+    if read_only:
+        uri = f"file:{os.path.abspath(DB_PATH)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_SECONDS)
+        # journal_mode is a property of the file; a reader cannot switch it
+        apply_pragmas(conn, {k: v for k, v in SQLITE_PRAGMAS.items() if k != 'journal_mode'})
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+        apply_pragmas(conn)
     return conn
 
 def initialize_db(conn):
-    """Creates the raw_transactions table if it doesn't exist."""
+    """Creates the raw_transactions table and its secondary indexes if they don't exist."""
     cursor = conn.cursor()
     cursor.execute(CREATE_RAW_TRANSACTIONS_TABLE)
+    for query in SQLITE_RAW_INDEX_QUERIES:
+        cursor.execute(query)
     conn.commit()
 
-def ingest_data(file_path):
-    """Reads the raw JSON file and loads data into the raw_transactions table."""
+def iter_json_lines(f):
+    """Yields one record per non-empty line of a JSON Lines file."""
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def iter_json_array(f, chunk_chars=READ_CHUNK_CHARS):
+    """
+    Yields the elements of a top-level JSON array one at a time, reading the
+    file in chunks so that only the current element is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        data = f.read(chunk_chars)
+        eof = not data
+        buffer = buffer[pos:] + data
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            return
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                # the element may continue past the end of the buffer
+                if eof:
+                    raise
+                fill()
+        pos = end
+        yield record
+
+def iter_parquet(file_path, batch_rows=BATCH_SIZE):
+    """Yields the rows of a Parquet file as dicts, one record batch at a time."""
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_rows, columns=RAW_FIELDS):
+        yield from batch.to_pylist()
+
+def iter_records(f, file_path):
+    """Picks the parser from the extension (.jsonl/.ndjson) or the first character."""
+    if file_path.endswith(('.jsonl', '.ndjson')):
+        return iter_json_lines(f)
+    first = f.read(1)
+    while first and first.isspace():
+        first = f.read(1)
+    f.seek(0)
+    return iter_json_array(f) if first == '[' else iter_json_lines(f)
+
+def list_source_files(path):
+    """A single file, or every data file of a directory of shards in name order."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.endswith(SOURCE_EXTENSIONS)
+    )
+
+def iter_source_records(path):
+    """Yields the records of a file or of every shard in a directory."""
+    for file_path in list_source_files(path):
+        if file_path.endswith('.parquet'):
+            yield from iter_parquet(file_path)
+            continue
+        with open(file_path, 'r') as f:
+            yield from iter_records(f, file_path)
+
+def to_row(record):
+    # (transaction_id, user_id, product_id, quantity, price, timestamp)
+    return (
+        record['transaction_id'],
+        record['user_id'],
+        record['product_id'],
+        record['quantity'],
+        record['price'],
+        record['timestamp']
+    )
+
+@stage_timer('ingest')
+def ingest_data(file_path, batch_size=BATCH_SIZE):
+    """
+    Streams raw transactions into the raw_transactions table. file_path is a
+    JSON array, JSON Lines or Parquet file, or a directory of such shards.
+    Records are inserted in executemany batches, one transaction per batch;
+    duplicate transaction_ids are ignored.
+    """
     if not os.path.exists(file_path):
         print(f"Error: Raw data file not found at {file_path}")
         return
@@ -26,36 +173,44 @@ def ingest_data(file_path):
     conn = get_db_connection()
     initialize_db(conn)
     cursor = conn.cursor()
-    
+
     print(f"Ingesting data from {file_path}...")
-    
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-        
+
     ingested_count = 0
-    for record in data:
-        try:
-            # Data to be inserted into raw_transactions table
-            # (transaction_id, user_id, product_id, quantity, price, timestamp)
-            transaction_data = (
-                record['transaction_id'],
-                record['user_details']['user_id'],
-                record['product_details']['product_id'],
-                record['quantity'],
-                record['price'],
-                record['timestamp']
-            )
-            cursor.execute(INSERT_RAW_TRANSACTION, transaction_data)
-            ingested_count += 1
-        except sqlite3.IntegrityError:
-            print(f"Warning: Duplicate transaction_id {record['transaction_id']} skipped.")
-        except Exception as e:
-            print(f"Error ingesting record: {e}. Record: {record}")
-            
-    conn.commit()
+    records = iter_source_records(file_path)
+    batch_number = 0
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        batch_number += 1
+
+        rows = []
+        for record in batch:
+            try:
+                rows.append(to_row(record))
+            except (KeyError, TypeError) as e:
+                print(f"Error ingesting record: missing field {e}. Record: {record}")
+
+        changes_before = conn.total_changes
+        with conn:
+            cursor.executemany(INSERT_OR_IGNORE_RAW_TRANSACTION, rows)
+        inserted = conn.total_changes - changes_before
+        ingested_count += inserted
+        record_round_trips('sqlite', 'raw_transactions')
+        record_batch('ingest', len(batch))
+        record_rows('ingest', inserted)
+        record_rows('ingest', len(rows) - inserted, 'duplicate')
+        record_rows('ingest', len(batch) - len(rows), 'rejected')
+
+        print(f"Batch {batch_number}: {len(batch)} read, {inserted} inserted, "
+              f"{len(rows) - inserted} duplicates, {len(batch) - len(rows)} rejected.")
+
+    # refresh planner statistics for the indexes after a bulk load
+    conn.execute("PRAGMA optimize")
     conn.close()
     print(f"Ingestion complete. {ingested_count} records loaded into raw_transactions.")
-    
+
     return ingested_count
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from src.db_utils import pg_connection, copy_select, copy_upsert
+from src.metrics import stage_timer, record_batch, record_rows, record_round_trips
+from src.sql_definitions import (
+    SELECT_INTRADAY_ROLLUP_WATERMARKS,
+    SELECT_RAW_INTRADAY_BARS
+)
+
+# Intraday bar sizes (minutes per bar) extract.fetch_and_load_data can ingest
+INTRADAY_INTERVALS = {'1m': 1, '5m': 5}
+# How far back the sources serve intraday bars (Yahoo: 1m for ~30 days, fetched
+# in 8-day requests; 5m for 60 days)
+INTRADAY_LOOKBACK_DAYS = {'1m': 7, '5m': 59}
+
+RAW_INTRADAY_TABLE = 'raw_intraday_bars'
+RAW_INTRADAY_COLUMNS = ['Timestamp', 'Ticker', 'Interval', 'Open', 'High', 'Low', 'Close', 'Volume']
+RAW_INTRADAY_KEY_COLUMNS = ['Ticker', 'Interval', 'Timestamp']
+
+# Rollups built from the intraday bars: name -> pandas frequency of the bucket
+ROLLUP_FREQUENCIES = {'1h': 'h', '1d': 'D'}
+ROLLUP_KEY_COLUMNS = ['Ticker', 'Source_Interval', 'Interval', 'Timestamp']
+ROLLUP_COLUMNS = ['Timestamp', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume', 'Bar_Count']
+# Tickers rolled up per query and transaction, to bound memory on large histories
+ROLLUP_TICKER_CHUNK = 50
+
+def is_intraday(interval):
+    return interval in INTRADAY_INTERVALS
+
+def rollup_bars(bars, rollup):
+    """
+    Aggregates intraday bars (Timestamp, Ticker, OHLCV, sorted by Ticker then
+    Timestamp) into OHLCV bars of the rollup's bucket, e.g. '1h' or '1d'.
+    Buckets are found with one comparison over the sorted arrays and reduced
+    with ufunc.reduceat, so there is no per-group Python work. NaN prices are
+    ignored by High/Low.
+    """
+    if bars.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+
+    buckets = bars['Timestamp'].dt.floor(ROLLUP_FREQUENCIES[rollup]).to_numpy()
+    codes, _ = pd.factorize(bars['Ticker'])
+    change = np.empty(len(bars), dtype=bool)
+    change[0] = True
+    change[1:] = (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], len(bars)) - 1
+
+    return pd.DataFrame({
+        'Timestamp': buckets[starts],
+        'Ticker': bars['Ticker'].to_numpy()[starts],
+        'Open': bars['Open'].to_numpy()[starts],
+        'High': np.fmax.reduceat(bars['High'].to_numpy(dtype=float), starts),
+        'Low': np.fmin.reduceat(bars['Low'].to_numpy(dtype=float), starts),
+        'Close': bars['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(bars['Volume'].fillna(0).to_numpy(dtype=np.int64), starts),
+        'Bar_Count': ends - starts + 1,
+    })
+
+def get_rollup_starts(conn, tickers, interval, rollups):
+    """
+    Returns {ticker: Timestamp to re-read from}: the start of the earliest of
+    its latest rollup buckets, which may have been partial. Tickers missing
+    any rollup are left out and read in full.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SELECT_INTRADAY_ROLLUP_WATERMARKS, (list(tickers), interval))
+        record_round_trips('postgres', 'intraday_rollups')
+        stored = {(ticker, rollup): last for ticker, rollup, last in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+    starts = {}
+    for ticker in tickers:
+        lasts = [stored.get((ticker, rollup)) for rollup in rollups]
+        if all(last is not None for last in lasts):
+            starts[ticker] = min(lasts)
+    return starts
+
+@stage_timer('rollup')
+def rollup_intraday(tickers, interval, rollups=tuple(ROLLUP_FREQUENCIES), full_refresh=False):
+    """
+    Rolls the `interval` bars of raw_intraday_bars up into hourly/daily OHLCV
+    bars in intraday_rollups.
+    Incrementally, each ticker's bars are re-read from its last (possibly
+    partial) bucket on and those buckets are overwritten; full_refresh=True
+    rebuilds every bucket. Tickers are processed ROLLUP_TICKER_CHUNK at a
+    time, each chunk read with COPY and committed on its own.
+    Returns the number of rollup rows written.
+    """
+    if not is_intraday(interval):
+        raise ValueError(f"Unknown intraday interval '{interval}'. Available: {sorted(INTRADAY_INTERVALS)}")
+    tickers = list(tickers)
+    total_written = 0
+    with pg_connection() as conn:
+        for i in range(0, len(tickers), ROLLUP_TICKER_CHUNK):
+            chunk = tickers[i:i + ROLLUP_TICKER_CHUNK]
+            starts = {} if full_refresh else get_rollup_starts(conn, chunk, interval, rollups)
+            bars = copy_select(conn, SELECT_RAW_INTRADAY_BARS, {
+                'tickers': chunk, 'interval': interval,
+                'start_tickers': list(starts), 'starts': list(starts.values()),
+            }, RAW_INTRADAY_TABLE, parse_dates=['Timestamp'], dtype={'Ticker': str})
+            if bars.empty:
+                continue
+            record_batch('rollup', len(bars))
+
+            rolled = pd.concat(
+                [rollup_bars(bars, rollup).assign(Interval=rollup, Source_Interval=interval) for rollup in rollups],
+                ignore_index=True
+            )
+            try:
+                written = copy_upsert(conn, rolled, 'intraday_rollups', ROLLUP_KEY_COLUMNS)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"Rolled {len(bars)} {interval} bars of {len(chunk)} tickers up into {written} bars.")
+            record_rows('rollup', written)
+            total_written += written
+    return total_written
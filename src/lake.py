@@ -0,0 +1,157 @@
+import fcntl
+import glob
+import os
+import uuid
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# Columnar copy of the stock tables, partitioned as <dataset>/Ticker=<t>/year=<y>/
+LAKE_DIR = os.environ.get(
+    'LAKE_DIR',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'lake')
+)
+LAKE_ENABLED = os.environ.get('LAKE_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+RAW_DATASET = 'raw_stock_data'
+ANALYZED_DATASET = 'analyzed_stock_data'
+PARTITIONING = ds.partitioning(pa.schema([('Ticker', pa.string()), ('year', pa.int32())]), flavor='hive')
+# Conservative lower bound on trading days per year, for picking seed partitions
+MIN_BARS_PER_YEAR = 200
+
+def dataset_dir(dataset):
+    return os.path.join(LAKE_DIR, dataset)
+
+def partition_dir(dataset, ticker, year):
+    return os.path.join(dataset_dir(dataset), f"Ticker={ticker}", f"year={year}")
+
+def write_partition(path, frame):
+    """Writes one partition file atomically (readers never see a partial file)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp_path,
+                       compression='zstd', write_statistics=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+@contextmanager
+def partition_lock(path):
+    """
+    Holds an exclusive lock on a partition file for the duration of the block,
+    so concurrent shards' read-merge-write cycles on it cannot interleave.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def upsert_partitions(dataset, df):
+    """
+    Merges df (Date, Ticker, ...) into the dataset, one file per Ticker/year
+    partition. Rows replace stored rows with the same Date, so re-fetched bars
+    overwrite rather than duplicate. Each partition is merged under its lock
+    and replaced atomically. Returns the number of partitions written.
+    """
+    if not LAKE_ENABLED or df.empty:
+        return 0
+    df = df.assign(Date=pd.to_datetime(df['Date']))
+    written = 0
+    for (ticker, year), group in df.groupby([df['Ticker'], df['Date'].dt.year], sort=False):
+        path = os.path.join(partition_dir(dataset, ticker, year), 'part-0.parquet')
+        frame = group.drop(columns='Ticker')
+        with partition_lock(path):
+            if os.path.exists(path):
+                stored = pq.read_table(path).to_pandas()
+                frame = pd.concat([stored, frame], ignore_index=True).drop_duplicates('Date', keep='last')
+            write_partition(path, frame.sort_values('Date'))
+        written += 1
+    return written
+
+def partition_files(dataset, tickers, min_years=None):
+    """
+    Lists the partition files for the given tickers, skipping years below
+    min_years[ticker] by path, so pruned partitions are never opened.
+    """
+    files = []
+    for ticker in tickers:
+        min_year = (min_years or {}).get(ticker)
+        for year_dir in glob.glob(os.path.join(dataset_dir(dataset), f"Ticker={glob.escape(ticker)}", 'year=*')):
+            if min_year is not None and int(year_dir.rsplit('=', 1)[1]) < min_year:
+                continue
+            files.extend(glob.glob(os.path.join(year_dir, '*.parquet')))
+    return files
+
+def read_dataset(dataset, tickers, columns=None, min_years=None, row_filter=None):
+    """
+    Reads the given tickers' partitions into a DataFrame sorted by (Ticker, Date).
+    Files are memory-mapped; only `columns` are decoded, and row_filter (a
+    pyarrow.dataset expression, e.g. on Date) is checked against the Parquet
+    column statistics before any row group is read.
+    """
+    files = partition_files(dataset, tickers, min_years)
+    if not files:
+        return pd.DataFrame(columns=['Date', 'Ticker'] + list(columns or []))
+    dataset_ = ds.dataset(files, format='parquet', partitioning=PARTITIONING,
+                          partition_base_dir=dataset_dir(dataset),
+                          filesystem=fs.LocalFileSystem(use_mmap=True))
+    read_columns = ['Date', 'Ticker'] + [c for c in (columns or []) if c not in ('Date', 'Ticker')] \
+        if columns else None
+    table = dataset_.to_table(columns=read_columns, filter=row_filter)
+    return table.to_pandas().sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+
+def seed_filter(tickers, seed_starts):
+    """
+    A row filter keeping the bars of each ticker from its seed_starts date
+    (all bars of tickers without one). Tickers sharing a start share one
+    term, so a batch with a common watermark gives a single Date bound.
+    """
+    by_start = {}
+    for ticker, start in seed_starts.items():
+        by_start.setdefault(start, []).append(ticker)
+    unbounded = [ticker for ticker in tickers if ticker not in seed_starts]
+    terms = [ds.field('Ticker').isin(unbounded)] if unbounded else []
+    terms += [ds.field('Ticker').isin(group) & (ds.field('Date') >= pa.scalar(start.to_datetime64()))
+              for start, group in by_start.items()]
+    if not terms:
+        return None
+    row_filter = terms[0]
+    for term in terms[1:]:
+        row_filter = row_filter | term
+    return row_filter
+
+def read_bars(tickers, watermarks, seed_rows, columns=('Close',)):
+    """
+    Lake equivalent of SELECT_RAW_BARS(_INCREMENTAL): Date, Ticker, `columns`
+    and Is_Seed for the given tickers. Tickers with a watermark (last analyzed
+    Date) get only the bars after it plus the seed_rows bars before it,
+    flagged as seeds. Their older years are pruned by path, and the Date
+    bound of the seed window is pushed down to the Parquet statistics.
+    """
+    columns = [c for c in dict.fromkeys(columns) if c not in ('Date', 'Ticker')]
+    # a calendar window that holds at least seed_rows bars
+    seed_years = pd.DateOffset(years=seed_rows // MIN_BARS_PER_YEAR + 1)
+    seed_starts = {ticker: pd.Timestamp(last_date) - seed_years for ticker, last_date in watermarks.items()}
+    min_years = {ticker: start.year for ticker, start in seed_starts.items()}
+    df = read_dataset(RAW_DATASET, tickers, columns=columns, min_years=min_years,
+                      row_filter=seed_filter(tickers, seed_starts))
+    if df.empty:
+        return pd.DataFrame(columns=['Date', 'Ticker'] + columns + ['Is_Seed'])
+
+    last_dates = pd.to_datetime(df['Ticker'].map(watermarks))
+    is_seed = (df['Date'] <= last_dates).to_numpy()
+    # rank the seeds of each ticker from the newest backwards and keep seed_rows of them
+    seed_rank = df[is_seed].groupby('Ticker', sort=False).cumcount(ascending=False)
+    keep = ~is_seed
+    keep[np.flatnonzero(is_seed)[seed_rank.to_numpy() < seed_rows]] = True
+    return df.loc[keep, ['Date', 'Ticker'] + columns].assign(Is_Seed=is_seed[keep]).reset_index(drop=True)
@@ -1,60 +1,84 @@
 import pandas as pd
 from datetime import datetime
-from src.db_utils import get_pg_connection
-from src.sql_definitions import (
-    CREATE_ANALYZED_STOCK_TABLE, 
-    INSERT_ANALYZED_STOCK_DATA
-)
-
-def initialize_analyzed_table():
-    conn = get_pg_connection()
+from src.artifacts import read_artifact
+from src.db_utils import pg_connection, copy_upsert, ensure_columns
+from src.indicator_store import write_indicators
+from src.lake import ANALYZED_DATASET, upsert_partitions
+from src.metrics import stage_timer, record_rows
+from src.sql_definitions import CREATE_ANALYZED_STOCK_TABLE, CREATE_STOCK_INDICATORS_TABLE
+from src.transform import STORAGE_LAYOUTS
+
+ANALYZED_KEY_COLUMNS = ['Date', 'Ticker']
+# Columns that are not indicators; everything else in a transformed frame is
+BASE_COLUMNS = ['Date', 'Ticker', 'Close', 'Load_Timestamp']
+
+def initialize_analyzed_table(conn):
     cursor = conn.cursor()
     try:
         cursor.execute(CREATE_ANALYZED_STOCK_TABLE)
+        cursor.execute(CREATE_STOCK_INDICATORS_TABLE)
         conn.commit()
     finally:
         cursor.close()
-        conn.close()
 
-def load_data(transformed_df):
+@stage_timer('load')
+def load_data(transformed_df=None, artifact=None, layout='wide', replace=False):
+    """
+    Upserts transformed rows into analyzed_stock_data and its lake dataset.
+    Accepts either a DataFrame or an artifact manifest from transform_to_artifact.
+    Indicator columns the table does not have yet are added first.
+    With layout='long' the rows are appended to stock_indicators instead, one
+    row per series value (see indicator_store.write_indicators; replace=True
+    overwrites stored values).
+    """
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f"Unknown storage layout '{layout}'. Available: {', '.join(STORAGE_LAYOUTS)}")
+    if artifact is not None:
+        transformed_df = read_artifact(artifact)
+
     if transformed_df is None or transformed_df.empty:
         print("Warning: Transformed DataFrame is empty. Skipping load.")
         return 0
 
-    initialize_analyzed_table()
-    
-    conn = get_pg_connection()
-    cursor = conn.cursor()
-    
-    try:
-        print("Starting data loading into Postgres...")
-        
-        load_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        transformed_df['Load_Timestamp'] = load_timestamp
-        
-        # Select columns matching the INSERT_ANALYZED_STOCK_DATA schema
-        records_df = transformed_df[['Date', 'Ticker', 'Close', 'SMA_50', 'SMA_200', 'Load_Timestamp']]
-        
-        # Filter out rows with NaN in SMA columns to ensure data quality
-        # Postgres expects None instead of NaN for NULL values
-        records_df = records_df.dropna(subset=['SMA_50', 'SMA_200'])
-        
-        if records_df.empty:
-            print("Warning: No valid records after filtering. Skipping load.")
-            return 0
+    with pg_connection() as conn:
+        initialize_analyzed_table(conn)
+
+        try:
+            print("Starting data loading into Postgres...")
             
-        records = [tuple(x) for x in records_df.values]
-        
-        cursor.executemany(INSERT_ANALYZED_STOCK_DATA, records)
-        conn.commit()
-        
-        print(f"Loading complete. {len(records)} records loaded.")
-        return len(records)
-
-    except Exception as e:
-        print(f"Error loading data to Postgres: {e}")
-        conn.rollback()
-        raise
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+            load_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            if layout == 'long':
+                loaded = write_indicators(conn, transformed_df, load_timestamp, replace)
+                conn.commit()
+                record_rows('load', loaded)
+                print(f"Loading complete. {loaded} indicator values loaded.")
+                return loaded
+
+            transformed_df['Load_Timestamp'] = load_timestamp
+            
+            # The indicator columns come from the transform's config
+            indicator_columns = [c for c in transformed_df.columns if c not in BASE_COLUMNS]
+            ensure_columns(conn, 'analyzed_stock_data', indicator_columns)
+            records_df = transformed_df[['Date', 'Ticker', 'Close'] + indicator_columns + ['Load_Timestamp']]
+            
+            # Filter out rows still in an indicator's warm-up (NaN) to ensure data quality
+            candidates = len(records_df)
+            records_df = records_df.dropna(subset=indicator_columns)
+            record_rows('load', candidates - len(records_df), 'rejected')
+            
+            if records_df.empty:
+                print("Warning: No valid records after filtering. Skipping load.")
+                return 0
+                
+            loaded = copy_upsert(conn, records_df, 'analyzed_stock_data', ANALYZED_KEY_COLUMNS)
+            upsert_partitions(ANALYZED_DATASET, records_df)
+            conn.commit()
+            
+            record_rows('load', loaded)
+            print(f"Loading complete. {loaded} records loaded.")
+            return loaded
+
+        except Exception as e:
+            print(f"Error loading data to Postgres: {e}")
+            conn.rollback()
+            raise
@@ -0,0 +1,93 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client import pushadd_to_gateway, write_to_textfile
+
+# Where metrics go at the end of a run (see push_metrics).
+# PUSHGATEWAY_URL takes precedence over METRICS_TEXTFILE_DIR; with neither set
+# metrics are only collected in-process.
+PUSHGATEWAY_URL = os.environ.get('PUSHGATEWAY_URL')
+METRICS_TEXTFILE_DIR = os.environ.get('METRICS_TEXTFILE_DIR')
+
+# Pipeline metrics get their own registry so a push carries only them
+REGISTRY = CollectorRegistry()
+
+ROWS = Counter(
+    'pipeline_rows', 'Rows handled by a pipeline stage, by outcome',
+    ['stage', 'status'], registry=REGISTRY
+)
+STAGE_DURATION = Histogram(
+    'pipeline_stage_duration_seconds', 'Wall-clock duration of a pipeline stage',
+    ['stage'], registry=REGISTRY,
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+STAGE_LAST_SUCCESS = Gauge(
+    'pipeline_stage_last_success_timestamp_seconds', 'Unix time the stage last completed',
+    ['stage'], registry=REGISTRY
+)
+STAGE_ERRORS = Counter(
+    'pipeline_stage_errors', 'Failed batches or requests within a stage',
+    ['stage'], registry=REGISTRY
+)
+BATCH_ROWS = Histogram(
+    'pipeline_batch_rows', 'Rows per batch written or fetched',
+    ['stage'], registry=REGISTRY,
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+)
+DB_ROUND_TRIPS = Counter(
+    'pipeline_db_round_trips', 'Statements sent to a database',
+    ['backend', 'target'], registry=REGISTRY
+)
+BYTES_WRITTEN = Counter(
+    'pipeline_bytes_written', 'Bytes written to a database or file',
+    ['backend', 'target'], registry=REGISTRY
+)
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Times the block (or, used as a decorator, the function) into
+    STAGE_DURATION and records the success time or an error.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_DURATION.labels(stage).observe(time.perf_counter() - start)
+    STAGE_LAST_SUCCESS.labels(stage).set_to_current_time()
+
+def record_rows(stage, count, status='ok'):
+    if count:
+        ROWS.labels(stage, status).inc(count)
+
+def record_batch(stage, rows):
+    BATCH_ROWS.labels(stage).observe(rows)
+
+def record_round_trips(backend, target, count=1):
+    DB_ROUND_TRIPS.labels(backend, target).inc(count)
+
+def record_bytes(backend, target, count):
+    BYTES_WRITTEN.labels(backend, target).inc(count)
+
+def record_error(stage):
+    STAGE_ERRORS.labels(stage).inc()
+
+def push_metrics(job, grouping_key=None):
+    """
+    Exports everything collected in this process: pushed (added) to the
+    Pushgateway under job/grouping_key, or written to <job>.prom in the
+    node_exporter textfile directory. The textfile holds the latest run only,
+    so concurrent tasks (mapped Airflow shards) should use the Pushgateway.
+    Export failures are reported, never raised.
+    """
+    try:
+        if PUSHGATEWAY_URL:
+            pushadd_to_gateway(PUSHGATEWAY_URL, job=job, registry=REGISTRY, grouping_key=grouping_key or {})
+        elif METRICS_TEXTFILE_DIR:
+            write_to_textfile(os.path.join(METRICS_TEXTFILE_DIR, f"{job}.prom"), REGISTRY)
+    except Exception as e:
+        print(f"Warning: could not export metrics for {job}: {e}")
@@ -0,0 +1,239 @@
+import zlib
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Synthetic market defaults
+SYNTHETIC_EPOCH = '2000-01-03'   # every synthetic series starts here
+TRADING_DAYS_PER_YEAR = 252
+
+# Regular session of the synthetic market, in exchange-local time
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+SESSION_MINUTES = 390
+
+class PriceSource:
+    """
+    A source of daily bars. Instances are callables with the fetch_fn signature
+    used by extract.fetch_and_load_data:
+        source(tickers, start_date, end_date) -> {ticker: DataFrame}
+    where each DataFrame is indexed by Date (start inclusive, end exclusive)
+    and has Open/High/Low/Close/Volume columns. Tickers without data are left
+    out of the result. Sources that support intraday bars also take
+    interval='1m' or '5m' and index the frames by bar start time instead.
+    """
+    name = None
+    # Requests per second the source tolerates; None means unthrottled
+    rate_limit = None
+
+    def fetch(self, tickers, start_date, end_date, interval='1d'):
+        raise NotImplementedError
+
+    def __call__(self, tickers, start_date, end_date, interval='1d'):
+        return self.fetch(tickers, start_date, end_date, interval)
+
+class YFinanceSource(PriceSource):
+    """Downloads several tickers per request from Yahoo Finance."""
+    name = 'yfinance'
+    rate_limit = 2.0
+
+    def fetch(self, tickers, start_date, end_date, interval='1d'):
+        # Yahoo serves 1m bars for the last 30 days (8 per request) and 5m bars for 60 days
+        data = yf.download(tickers, start=start_date, end=end_date, interval=interval,
+                           group_by='ticker', progress=False, threads=False)
+        frames = {}
+        if data.empty:
+            return frames
+
+        available = set(data.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker not in available:
+                continue
+            frame = data[ticker].dropna(how='all')
+            if not frame.empty:
+                frames[ticker] = frame
+        return frames
+
+class SyntheticSource(PriceSource):
+    """
+    Seeded geometric Brownian motion bars for any ticker, without network.
+    Every ticker's path starts at `epoch`. Its daily shocks are drawn from a
+    stream per (seed, crc32(ticker), year), and the close each year starts
+    from is checkpointed from a per-ticker stream of yearly totals, so a
+    fetch only simulates the years it covers and a given (seed, ticker,
+    date) always yields the same bar whatever the requested range or batch.
+    Incremental extracts therefore continue the stored series. All tickers
+    of a batch are simulated together as one (tickers x days) array.
+    Intraday bars bridge each day's open to its close over the regular
+    session, drawn from a stream per (seed, ticker, month, bar size), so they
+    are just as reproducible and their first open and last close match the
+    daily bar.
+    """
+    name = 'synthetic'
+
+    def __init__(self, seed=0, epoch=SYNTHETIC_EPOCH, drift=0.07, volatility=(0.15, 0.45),
+                 start_price=(10.0, 500.0), mean_volume=1000000):
+        self.seed = seed
+        self.epoch = pd.Timestamp(epoch)
+        self.drift = drift
+        self.volatility = volatility
+        self.start_price = start_price
+        self.mean_volume = mean_volume
+
+    def year_starts(self, first_year, last_year):
+        """The first calendar day of each year (the epoch for its own year) and of the year after."""
+        starts = pd.to_datetime([f"{year}-01-01" for year in range(first_year, last_year + 2)])
+        return starts.where(starts > self.epoch, self.epoch)
+
+    def simulate(self, tickers, first_year, last_year):
+        """
+        Returns (dates, (open, high, low, close, volume)) for the business
+        days of first_year..last_year, the arrays of shape
+        (len(tickers), len(dates)). Each year's close shocks are conditioned
+        to sum to the year's total from the ticker's stream of yearly totals,
+        which also gives the close every year starts from, so earlier years
+        are never simulated.
+        """
+        n = len(tickers)
+        dt = 1.0 / TRADING_DAYS_PER_YEAR
+        # business days of every year since the epoch, for the yearly totals
+        bounds = self.year_starts(self.epoch.year, last_year).to_numpy().astype('datetime64[D]')
+        days_per_year = np.busday_count(bounds[:-1], bounds[1:])
+        skipped = first_year - self.epoch.year
+        dates = pd.bdate_range(bounds[skipped], bounds[-1], inclusive='left', name='Date')
+
+        sigma = np.empty((n, 1))
+        shocks = np.empty((n, len(dates), 3))
+        open_ = np.empty((n, len(dates)))
+        close = np.empty((n, len(dates)))
+        for i, ticker in enumerate(tickers):
+            key = zlib.crc32(ticker.encode())
+            rng = np.random.default_rng([self.seed, key])
+            sigma[i, 0] = rng.uniform(*self.volatility)
+            start = rng.uniform(*self.start_price)
+            drift = (self.drift - 0.5 * sigma[i, 0] ** 2) * dt
+            # the sum of each year's close shocks is N(0, days in the year)
+            totals = rng.standard_normal(len(days_per_year)) * np.sqrt(days_per_year)
+            year_returns = drift * days_per_year + sigma[i, 0] * np.sqrt(dt) * totals
+            year_opens = start * np.exp(np.concatenate([[0.0], np.cumsum(year_returns)[:-1]]))
+
+            offset = 0
+            for year in range(first_year, last_year + 1):
+                y = year - self.epoch.year
+                days = days_per_year[y]
+                year_shocks = np.random.default_rng([self.seed, key, year]).standard_normal((days, 3))
+                # condition the draws on their sum; iid N(0, 1) again as the total is N(0, days)
+                year_shocks[:, 0] += (totals[y] - year_shocks[:, 0].sum()) / days
+                # every year compounds from its checkpointed open, so a bar does not depend on the range
+                year_close = year_opens[y] * np.exp(np.cumsum(drift + sigma[i, 0] * np.sqrt(dt) * year_shocks[:, 0]))
+                shocks[i, offset:offset + days] = year_shocks
+                close[i, offset:offset + days] = year_close
+                open_[i, offset] = year_opens[y]
+                open_[i, offset + 1:offset + days] = year_close[:-1]
+                offset += days
+
+        # intraday range: beyond the open/close by a half-normal fraction of daily vol
+        spread = sigma * np.sqrt(dt) * 0.5
+        high = np.maximum(open_, close) * np.exp(spread * np.abs(shocks[:, :, 1]))
+        low = np.minimum(open_, close) * np.exp(-spread * np.abs(shocks[:, :, 2]))
+        volume = np.round(self.mean_volume * np.exp(0.5 * shocks[:, :, 1] - 0.125)).astype(np.int64)
+        return dates, (open_, high, low, close, volume)
+
+    def simulate_intraday(self, tickers, dates, daily, minutes):
+        """
+        Splits the daily bars of `dates` into bars of `minutes`. Returns
+        (open, high, low, close, volume) arrays of shape
+        (len(tickers), len(dates), bars per day). A month's shocks are drawn
+        at once and the requested days picked from them.
+        """
+        bars = SESSION_MINUTES // minutes
+        shocks = np.empty((len(tickers), len(dates), bars, 3))
+        months = dates.to_period('M')
+        chunks = []
+        for month in months.unique():
+            month_dates = pd.bdate_range(max(month.start_time, self.epoch), month.end_time.normalize())
+            positions = month_dates.get_indexer(dates[months == month])
+            chunks.append((month.year * 100 + month.month, len(month_dates), np.flatnonzero(months == month), positions))
+        for i, ticker in enumerate(tickers):
+            key = zlib.crc32(ticker.encode())
+            for month_key, days, columns, positions in chunks:
+                rng = np.random.default_rng([self.seed, key, month_key, minutes])
+                shocks[i, columns] = rng.standard_normal((days, bars, 3))[positions]
+
+        day_open, day_high, day_low, day_close, day_volume = (values[..., None] for values in daily)
+        # Brownian bridge in log price from the day's open to its close, scaled to its range
+        scale = (np.log(day_high) - np.log(day_low)) / np.sqrt(bars) * 0.5
+        walk = np.concatenate([np.zeros(shocks.shape[:2] + (1,)), np.cumsum(shocks[..., 0], axis=2)], axis=2)
+        fraction = np.arange(bars + 1) / bars
+        bridge = walk - fraction * walk[..., -1:]
+        path = np.exp(np.log(day_open) + fraction * (np.log(day_close) - np.log(day_open)) + scale * bridge)
+
+        open_, close = path[..., :-1], path[..., 1:]
+        spread = scale * 0.5
+        high = np.maximum(open_, close) * np.exp(spread * np.abs(shocks[..., 1]))
+        low = np.minimum(open_, close) * np.exp(-spread * np.abs(shocks[..., 2]))
+        # U-shaped volume profile: busiest at the open and the close
+        profile = 1.0 + 2.0 * (2.0 * (np.arange(bars) + 0.5) / bars - 1.0) ** 2
+        weights = profile * np.exp(0.5 * shocks[..., 1] - 0.125)
+        volume = np.round(day_volume * weights / weights.sum(axis=2, keepdims=True)).astype(np.int64)
+        return open_, high, low, close, volume
+
+    def fetch(self, tickers, start_date, end_date, interval='1d'):
+        tickers = list(tickers)
+        start = max(pd.Timestamp(start_date).normalize(), self.epoch)
+        end = pd.Timestamp(end_date)
+        if not tickers or start >= end:
+            return {}
+
+        # only the years of [start, end) are simulated
+        dates, columns = self.simulate(tickers, start.year, (end - pd.Timedelta(1, unit='ns')).year)
+        first, stop = dates.searchsorted(start), dates.searchsorted(end)
+        if first >= stop:
+            return {}
+
+        dates = dates[first:stop]
+        columns = [values[:, first:stop] for values in columns]
+        if interval != '1d':
+            return self.fetch_intraday(tickers, start_date, end_date, dates, columns, interval)
+        return {
+            ticker: pd.DataFrame(
+                {name: values[i] for name, values in zip(OHLCV_COLUMNS, columns)},
+                index=dates
+            )
+            for i, ticker in enumerate(tickers)
+        }
+
+    def fetch_intraday(self, tickers, start_date, end_date, dates, daily, interval):
+        minutes = int(interval.rstrip('m'))
+        columns = self.simulate_intraday(tickers, dates, daily, minutes)
+        offsets = SESSION_OPEN + pd.to_timedelta(np.arange(SESSION_MINUTES // minutes) * minutes, unit='min')
+        index = pd.DatetimeIndex((dates.to_numpy()[:, None] + offsets.to_numpy()).ravel(), name='Datetime')
+        # start/end may carry a time of day; bars are kept if they start within [start, end)
+        keep = (index >= pd.Timestamp(start_date)) & (index < pd.Timestamp(end_date))
+        if not keep.any():
+            return {}
+        return {
+            ticker: pd.DataFrame(
+                {name: values[i].ravel()[keep] for name, values in zip(OHLCV_COLUMNS, columns)},
+                index=index[keep]
+            )
+            for i, ticker in enumerate(tickers)
+        }
+
+PRICE_SOURCES = {
+    YFinanceSource.name: YFinanceSource,
+    SyntheticSource.name: SyntheticSource,
+}
+
+def get_price_source(name='yfinance', **options):
+    """Builds the price source registered under name, e.g. get_price_source('synthetic', seed=42)."""
+    try:
+        source_class = PRICE_SOURCES[name]
+    except KeyError:
+        raise ValueError(f"Unknown price source '{name}'. Available: {sorted(PRICE_SOURCES)}")
+    return source_class(**options)
+
+def synthetic_tickers(count):
+    """A ticker universe of `count` made-up symbols (SYN00000, SYN00001, ...)."""
+    return [f"SYN{i:05d}" for i in range(count)]
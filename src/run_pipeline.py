@@ -1,17 +1,157 @@
+import argparse
+import cProfile
+import json
 import os
+import pstats
+import resource
 import sys
 import time
+import tracemalloc
+from contextlib import contextmanager
 from datetime import datetime
 
-# Add the src directory to the path to allow module imports
+# Add the src directory (bare imports) and the project root (src.* imports) to the path
 sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from db_init import initialize_database
 from data_generator import main as generate_data
 from ingestion_script import ingest_data
 from transformation_script import main as transform_data
+from src.db_utils import initialize_database as initialize_stock_database
+from src.extract import fetch_and_load_data, TICKERS, LOOKBACK_DAYS, INTERVALS
+from src.intraday import is_intraday, rollup_intraday
+from src.transform import transform_data as transform_stock_data, TRANSFORM_SOURCES, STORAGE_LAYOUTS
+from src.load import load_data as load_stock_data
+from src.price_sources import PRICE_SOURCES, get_price_source, synthetic_tickers
+from src.metrics import push_metrics
 
-def run_pipeline():
+# Run reports (and .prof files) go to <REPORT_DIR>/<pipeline>_<timestamp>/
+REPORT_DIR = os.environ.get('PIPELINE_REPORT_DIR', os.path.join('data', 'runs'))
+PROFILE_TOP_FUNCTIONS = 20   # hottest functions (by cumulative time) listed per step
+
+def env_flag(name):
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+def reset_peak_rss():
+    """Resets the kernel's RSS high-water mark, so the next reading covers only what follows (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak RSS since the last reset_peak_rss() (VmHWM), else the process-wide ru_maxrss."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxrss / 1024.0, 1)
+
+class RunReport:
+    """
+    Times the steps of one pipeline run and writes them to report.json in the
+    run directory: duration, rows processed and peak memory per step.
+    A step's peak_rss_mb is its own: the kernel's high-water mark is reset
+    when it starts. Where that is not possible (outside Linux) the step gets
+    process_peak_rss_mb, the peak of the whole run so far, instead.
+    With profile=True every step runs under cProfile (stats saved as
+    <step>.prof, the hottest functions listed in the report; only the
+    calling thread is profiled, not worker threads); with
+    trace_memory=True tracemalloc reports each step's peak Python allocation.
+    Defaults come from the PIPELINE_PROFILE / PIPELINE_TRACEMALLOC env vars.
+    """
+
+    def __init__(self, pipeline, profile=None, trace_memory=None, report_dir=REPORT_DIR):
+        self.pipeline = pipeline
+        self.profile = env_flag('PIPELINE_PROFILE') if profile is None else profile
+        self.trace_memory = env_flag('PIPELINE_TRACEMALLOC') if trace_memory is None else trace_memory
+        self.started_at = datetime.now()
+        self.run_dir = os.path.join(report_dir, f"{pipeline}_{self.started_at:%Y%m%d%H%M%S}")
+        self.steps = []
+        self.peak_rss = 0.0
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def step(self, name):
+        """Instruments one step. The block may set entry['rows'] on the yielded dict."""
+        entry = {'step': name, 'status': 'ok', 'rows': None}
+        self.steps.append(entry)
+        profiler = cProfile.Profile() if self.profile else None
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+        # the run's peak may have been reached before this step; keep it before resetting
+        self.peak_rss = max(self.peak_rss, peak_rss_mb())
+        own_peak = reset_peak_rss()
+        if profiler:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield entry
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry['duration_seconds'] = round(time.perf_counter() - start, 3)
+            if profiler:
+                profiler.disable()
+                entry['profile'] = self.save_profile(name, profiler)
+            if self.trace_memory:
+                entry['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0), 1)
+            peak = peak_rss_mb()
+            self.peak_rss = max(self.peak_rss, peak)
+            entry['peak_rss_mb' if own_peak else 'process_peak_rss_mb'] = peak
+            print(f"[{name}] {entry['duration_seconds']:.2f}s, rows={entry['rows']}, peak RSS {peak} MB")
+
+    def save_profile(self, name, profiler):
+        os.makedirs(self.run_dir, exist_ok=True)
+        path = os.path.join(self.run_dir, f"{name}.prof")
+        profiler.dump_stats(path)
+        stats = pstats.Stats(profiler).stats
+        hottest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        return {
+            'stats_file': path,
+            'top_cumulative': [
+                {'function': f"{filename}:{line}({function})", 'calls': calls,
+                 'total_seconds': round(total, 4), 'cumulative_seconds': round(cumulative, 4)}
+                for (filename, line, function), (_, calls, total, cumulative, _) in hottest
+            ],
+        }
+
+    def write(self, status, **details):
+        """Writes report.json and returns its path."""
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        report = {
+            'pipeline': self.pipeline,
+            'status': status,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_seconds': round(time.perf_counter() - self.start, 3),
+            'peak_rss_mb': max(self.peak_rss, peak_rss_mb()),
+            'profile': self.profile,
+            'trace_memory': self.trace_memory,
+            'steps': self.steps,
+        }
+        report.update(details)
+        os.makedirs(self.run_dir, exist_ok=True)
+        path = os.path.join(self.run_dir, 'report.json')
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Run report written to {path}")
+        return path
+
+def run_pipeline(report=None):
     """
     The main orchestration function for the E-commerce Data Pipeline.
     It executes the steps in the correct order:
@@ -19,9 +159,9 @@ def run_pipeline():
     2. Generate Raw Data
     3. Ingest Raw Data to Staging
     4. Transform and Load Data to Data Warehouse
+    Every step is recorded in `report` (a RunReport), written at the end.
     """
-    
-    start_time = time.time()
+    report = report or RunReport("ecommerce")
     print("="*50)
     print(f"E-COMMERCE DATA PIPELINE STARTING at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*50)
@@ -29,46 +169,153 @@ def run_pipeline():
     # --- Step 1: Initialize Database ---
     print("\n--- STEP 1: INITIALIZING DATABASE ---")
     try:
-        initialize_database()
+        with report.step("initialize_database"):
+            initialize_database()
     except Exception as e:
         print(f"FATAL ERROR in DB Initialization: {e}")
-        return
+        return report.write("failed")
 
     # --- Step 2: Generate Raw Data ---
     print("\n--- STEP 2: GENERATING RAW DATA ---")
     try:
-        raw_file_path = generate_data()
+        with report.step("generate_data"):
+            raw_file_path = generate_data()
         if not raw_file_path:
             print("FATAL ERROR: Data generation failed to return a file path.")
-            return
+            return report.write("failed")
     except Exception as e:
         print(f"FATAL ERROR in Data Generation: {e}")
-        return
+        return report.write("failed")
 
     # --- Step 3: Ingest Raw Data ---
     print("\n--- STEP 3: INGESTING RAW DATA ---")
     try:
-        ingested_count = ingest_data(raw_file_path)
+        with report.step("ingest_data") as step:
+            ingested_count = ingest_data(raw_file_path)
+            step['rows'] = ingested_count
         if ingested_count == 0:
             print("WARNING: No data ingested. Transformation step may be skipped.")
     except Exception as e:
         print(f"FATAL ERROR in Data Ingestion: {e}")
-        return
+        return report.write("failed", raw_data=raw_file_path)
 
     # --- Step 4: Transform and Load ---
     print("\n--- STEP 4: TRANSFORMING AND LOADING DATA ---")
     try:
-        transform_data()
+        with report.step("transform_and_load") as step:
+            step['rows'] = transform_data()
     except Exception as e:
         print(f"FATAL ERROR in Data Transformation: {e}")
-        return
+        return report.write("failed", raw_data=raw_file_path)
 
-    end_time = time.time()
-    duration = end_time - start_time
+    duration = time.perf_counter() - report.start
     
     print("="*50)
     print(f"PIPELINE COMPLETED SUCCESSFULLY in {duration:.2f} seconds.")
     print("="*50)
+    return report.write("success", raw_data=raw_file_path)
+
+def run_stock_pipeline(price_source="yfinance", num_tickers=0, seed=0,
+                       lookback_days=LOOKBACK_DAYS, backfill=False, report=None,
+                       transform_source="postgres", full_refresh=False, storage_layout="wide",
+                       interval="1d"):
+    """
+    Runs the stock ETL (extract >> transform >> load) in-process, outside Airflow.
+    With price_source="synthetic" no network is needed; num_tickers > 0 then
+    replaces TICKERS with a made-up universe of that size.
+    transform_source="lake" computes the indicators from the Parquet lake;
+    storage_layout="long" stores them in stock_indicators.
+    An intraday interval ("1m", "5m") ingests minute bars and rolls them up
+    hourly and daily instead of computing the indicators.
+    """
+    report = report or RunReport("stock")
+    print("="*50)
+    print(f"STOCK DATA PIPELINE ({price_source}) STARTING at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("="*50)
+
+    options = {"seed": seed} if price_source == "synthetic" else {}
+    source = get_price_source(price_source, **options)
+    tickers = synthetic_tickers(num_tickers) if price_source == "synthetic" and num_tickers else TICKERS
+    details = {"price_source": price_source, "tickers": len(tickers), "lookback_days": lookback_days,
+               "transform_source": transform_source, "storage_layout": storage_layout, "interval": interval}
+
+    # --- Step 1: Initialize Database ---
+    print("\n--- STEP 1: INITIALIZING DATABASE ---")
+    try:
+        with report.step("initialize_database"):
+            initialize_stock_database()
+    except Exception as e:
+        print(f"FATAL ERROR in DB Initialization: {e}")
+        return report.write("failed", **details)
+
+    # --- Step 2: Extract ---
+    print(f"\n--- STEP 2: EXTRACTING {len(tickers)} TICKERS ---")
+    try:
+        with report.step("extract") as step:
+            step['rows'] = fetch_and_load_data(tickers, backfill=backfill, fetch_fn=source,
+                                               lookback_days=lookback_days, interval=interval)
+    except Exception as e:
+        print(f"FATAL ERROR in Extraction: {e}")
+        return report.write("failed", **details)
+
+    if is_intraday(interval):
+        # --- Step 3: Roll Up ---
+        print("\n--- STEP 3: ROLLING UP INTRADAY BARS ---")
+        try:
+            with report.step("rollup") as step:
+                step['rows'] = rollup_intraday(tickers, interval, full_refresh=full_refresh)
+        except Exception as e:
+            print(f"FATAL ERROR in Rollup: {e}")
+            return report.write("failed", **details)
+        print("="*50)
+        print(f"PIPELINE COMPLETED SUCCESSFULLY in {time.perf_counter() - report.start:.2f} seconds.")
+        print("="*50)
+        return report.write("success", **details)
+
+    # --- Step 3: Transform and Load ---
+    print("\n--- STEP 3: TRANSFORMING AND LOADING DATA ---")
+    try:
+        with report.step("transform") as step:
+            transformed_df = transform_stock_data(tickers, full_refresh=full_refresh,
+                                                  source=transform_source, layout=storage_layout)
+            step['rows'] = len(transformed_df)
+        with report.step("load") as step:
+            step['rows'] = load_stock_data(transformed_df, layout=storage_layout, replace=full_refresh)
+    except Exception as e:
+        print(f"FATAL ERROR in Transformation: {e}")
+        return report.write("failed", **details)
+
+    duration = time.perf_counter() - report.start
+    print("="*50)
+    print(f"PIPELINE COMPLETED SUCCESSFULLY in {duration:.2f} seconds.")
+    print("="*50)
+    return report.write("success", **details)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run a data pipeline locally.")
+    parser.add_argument("--pipeline", choices=["ecommerce", "stock"], default="ecommerce")
+    parser.add_argument("--price-source", choices=sorted(PRICE_SOURCES), default="yfinance",
+                        help="stock pipeline only")
+    parser.add_argument("--tickers", type=int, default=0,
+                        help="size of the synthetic ticker universe (0 = default tickers)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lookback-days", type=int, default=LOOKBACK_DAYS)
+    parser.add_argument("--backfill", action="store_true")
+    parser.add_argument("--transform-source", choices=TRANSFORM_SOURCES, default="postgres",
+                        help="where the stock transform reads raw closes")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="recompute the stock indicators over the whole history")
+    parser.add_argument("--storage-layout", choices=STORAGE_LAYOUTS, default="wide",
+                        help="wide analyzed_stock_data rows or long stock_indicators rows")
+    parser.add_argument("--interval", choices=INTERVALS, default="1d",
+                        help="bar size; intraday bars are rolled up instead of transformed")
+    # Instrumentation (also enabled by PIPELINE_PROFILE=1 / PIPELINE_TRACEMALLOC=1)
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="run every step under cProfile and save <step>.prof files")
+    parser.add_argument("--trace-memory", action="store_true", default=None,
+                        help="record each step's peak Python allocation with tracemalloc")
+    parser.add_argument("--report-dir", default=REPORT_DIR)
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
     # Ensure I are in the correct directory to run the script
@@ -79,4 +326,14 @@ if __name__ == "__main__":
     # In a real-world scenario, the orchestrator (e.g., Airflow) handles the environment.
     # Here, I assume the user has activated the environment manually or I run it directly.
     
-    run_pipeline()
+    args = parse_args(sys.argv[1:])
+    report = RunReport(args.pipeline, args.profile, args.trace_memory, args.report_dir)
+    try:
+        if args.pipeline == "stock":
+            run_stock_pipeline(args.price_source, args.tickers, args.seed, args.lookback_days,
+                               args.backfill, report, args.transform_source, args.full_refresh,
+                               args.storage_layout, args.interval)
+        else:
+            run_pipeline(report)
+    finally:
+        push_metrics(f"{args.pipeline}_pipeline")
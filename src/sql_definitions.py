@@ -27,37 +27,228 @@ CREATE TABLE IF NOT EXISTS analyzed_stock_data (
 );
 """
 
+# --- DDL: Create Long/Narrow Indicator Table ---
+# One row per (ticker, series, bar); "Indicator" is an indicator column name
+# from the transform (e.g. 'SMA_50') or 'Close'. Adding an indicator adds rows,
+# not columns.
+CREATE_STOCK_INDICATORS_TABLE = """
+CREATE TABLE IF NOT EXISTS stock_indicators (
+    "Ticker" TEXT NOT NULL,
+    "Indicator" TEXT NOT NULL,
+    "Date" TIMESTAMP NOT NULL,
+    "Value" DOUBLE PRECISION,
+    "Load_Timestamp" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY ("Ticker", "Indicator", "Date")
+);
+"""
+
+# --- DDL: Create Raw Intraday Bars Table ---
+# Minute bars with timestamp precision ("Timestamp" is the bar's start in
+# exchange-local time). Range-partitioned by month (see
+# db_utils.ensure_month_partitions), so old months can be detached or
+# dropped whole and a day's scan only touches one partition.
+CREATE_RAW_INTRADAY_TABLE = """
+CREATE TABLE IF NOT EXISTS raw_intraday_bars (
+    "Timestamp" TIMESTAMP NOT NULL,
+    "Ticker" TEXT NOT NULL,
+    "Interval" TEXT NOT NULL,
+    "Open" DOUBLE PRECISION,
+    "High" DOUBLE PRECISION,
+    "Low" DOUBLE PRECISION,
+    "Close" DOUBLE PRECISION,
+    "Volume" BIGINT,
+    PRIMARY KEY ("Ticker", "Interval", "Timestamp")
+) PARTITION BY RANGE ("Timestamp");
+"""
+
+# --- DDL: Create Intraday Rollups Table ---
+# Hourly and daily OHLCV aggregates of raw_intraday_bars ("Interval" is the
+# rollup, e.g. '1h'; "Source_Interval" the bars it was built from).
+CREATE_INTRADAY_ROLLUPS_TABLE = """
+CREATE TABLE IF NOT EXISTS intraday_rollups (
+    "Timestamp" TIMESTAMP NOT NULL,
+    "Ticker" TEXT NOT NULL,
+    "Interval" TEXT NOT NULL,
+    "Source_Interval" TEXT NOT NULL,
+    "Open" DOUBLE PRECISION,
+    "High" DOUBLE PRECISION,
+    "Low" DOUBLE PRECISION,
+    "Close" DOUBLE PRECISION,
+    "Volume" BIGINT,
+    "Bar_Count" INTEGER,
+    PRIMARY KEY ("Ticker", "Source_Interval", "Interval", "Timestamp")
+);
+"""
+
 ALL_CREATE_QUERIES = [
     CREATE_RAW_STOCK_TABLE,
-    CREATE_ANALYZED_STOCK_TABLE
+    CREATE_ANALYZED_STOCK_TABLE,
+    CREATE_STOCK_INDICATORS_TABLE,
+    CREATE_RAW_INTRADAY_TABLE,
+    CREATE_INTRADAY_ROLLUPS_TABLE
 ]
 
-# --- DML: Insert Raw Data ---
-INSERT_RAW_STOCK_DATA = """
-INSERT INTO raw_stock_data ("Date", "Ticker", "Open", "High", "Low", "Close", "Volume")
-VALUES (%s, %s, %s, %s, %s, %s, %s)
-ON CONFLICT ("Date", "Ticker") 
-DO UPDATE SET 
-    "Open" = EXCLUDED."Open",
-    "High" = EXCLUDED."High",
-    "Low" = EXCLUDED."Low",
-    "Close" = EXCLUDED."Close",
-    "Volume" = EXCLUDED."Volume";
-"""
-
-# --- DML: Insert Analyzed Data ---
-INSERT_ANALYZED_STOCK_DATA = """
-INSERT INTO analyzed_stock_data ("Date", "Ticker", "Close", "SMA_50", "SMA_200", "Load_Timestamp")
-VALUES (%s, %s, %s, %s, %s, %s)
-ON CONFLICT ("Date", "Ticker") 
-DO UPDATE SET 
-    "Close" = EXCLUDED."Close",
-    "SMA_50" = EXCLUDED."SMA_50",
-    "SMA_200" = EXCLUDED."SMA_200",
-    "Load_Timestamp" = EXCLUDED."Load_Timestamp";
-"""
-
-# --- DML: Select Raw Data for Transformation ---
-SELECT_RAW_STOCK_DATA = """
-SELECT * FROM raw_stock_data WHERE "Ticker" = %s ORDER BY "Date" ASC;
-"""
\ No newline at end of file
+# --- DML: Bulk Upsert via COPY into a Staging Table ---
+# Identifiers are filled in with psycopg2.sql by db_utils.copy_upsert.
+# staging_seq numbers the rows in COPY order, which names only the frame's
+# columns, so duplicate keys can resolve to the last row
+CREATE_STAGING_TABLE = """
+CREATE TEMP TABLE {staging} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP;
+ALTER TABLE {staging} ADD COLUMN staging_seq BIGINT GENERATED ALWAYS AS IDENTITY;
+"""
+
+COPY_INTO_STAGING = """
+COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv);
+"""
+
+MERGE_FROM_STAGING = """
+INSERT INTO {target} ({columns})
+SELECT DISTINCT ON ({keys}) {columns} FROM {staging}
+ORDER BY {keys}, staging_seq DESC
+ON CONFLICT ({keys})
+DO UPDATE SET {updates};
+"""
+
+# Append-only variant: rows whose key already exists are left untouched
+APPEND_FROM_STAGING = """
+INSERT INTO {target} ({columns})
+SELECT DISTINCT ON ({keys}) {columns} FROM {staging}
+ORDER BY {keys}, staging_seq DESC
+ON CONFLICT ({keys})
+DO NOTHING;
+"""
+
+DROP_STAGING_TABLE = """
+DROP TABLE IF EXISTS {staging};
+"""
+
+# --- DDL: Add Columns Derived from Config (see db_utils.ensure_columns) ---
+SELECT_TABLE_COLUMNS = """
+SELECT column_name FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = %s;
+"""
+
+ADD_COLUMN = """
+ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type};
+"""
+
+# --- DDL: Monthly Partitions of a Range-Partitioned Table ---
+SELECT_MISSING_TABLES = """
+SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NULL;
+"""
+
+# Serializes the creation of one partition (by name) across concurrent loaders;
+# held until the caller's transaction ends
+LOCK_PARTITION_NAME = """
+SELECT pg_advisory_xact_lock(hashtext(%s));
+"""
+
+# Re-check after the lock: a catalog scan sees tables committed meanwhile,
+# while to_regclass may still answer from a stale relation cache
+SELECT_TABLE_EXISTS = """
+SELECT EXISTS (SELECT 1 FROM pg_catalog.pg_tables WHERE schemaname = current_schema() AND tablename = %s);
+"""
+
+CREATE_MONTH_PARTITION = """
+CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table}
+FOR VALUES FROM ({start}) TO ({end});
+"""
+
+# --- DML: Bulk Read via COPY (see db_utils.copy_select) ---
+COPY_SELECT = """
+COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER);
+"""
+
+# --- DML: Select Per-Ticker Watermarks for Incremental Extraction ---
+SELECT_RAW_STOCK_WATERMARKS = """
+SELECT "Ticker", MAX("Date") FROM raw_stock_data WHERE "Ticker" = ANY(%s) GROUP BY "Ticker";
+"""
+
+# --- DML: Select Last Analyzed Date per Ticker ---
+SELECT_ANALYZED_STOCK_WATERMARKS = """
+SELECT "Ticker", MAX("Date") FROM analyzed_stock_data WHERE "Ticker" = ANY(%s) GROUP BY "Ticker";
+"""
+
+# --- DML: Select Last Stored Date per Ticker and Series (long layout) ---
+SELECT_STOCK_INDICATOR_WATERMARKS = """
+SELECT "Ticker", "Indicator", MAX("Date") FROM stock_indicators
+WHERE "Ticker" = ANY(%s) AND "Indicator" = ANY(%s)
+GROUP BY "Ticker", "Indicator";
+"""
+
+SELECT_STOCK_INDICATOR_NAMES = """
+SELECT DISTINCT "Indicator" FROM stock_indicators WHERE "Ticker" = ANY(%s);
+"""
+
+# --- DML: Select Series from the Long Layout (pivoted by indicator_store.read_indicators) ---
+SELECT_STOCK_INDICATORS = """
+SELECT "Date", "Ticker", "Indicator", "Value" FROM stock_indicators
+WHERE "Ticker" = ANY(%(tickers)s) AND "Indicator" = ANY(%(indicators)s)
+  AND "Date" >= COALESCE(%(start)s, '-infinity'::timestamp)
+  AND "Date" <= COALESCE(%(end)s, 'infinity'::timestamp)
+ORDER BY "Ticker", "Date";
+"""
+
+# --- DML: Select Bars for All Tickers (full recompute) ---
+SELECT_RAW_BARS = """
+SELECT "Date", "Ticker", "Open", "High", "Low", "Close", "Volume", FALSE AS "Is_Seed"
+FROM raw_stock_data
+WHERE "Ticker" = ANY(%(tickers)s)
+ORDER BY "Ticker", "Date";
+"""
+
+# --- DML: Select Bars for All Tickers (incremental) ---
+# Returns the bars after each ticker's watermark (its last analyzed Date,
+# passed as parallel %(watermark_tickers)s / %(watermark_dates)s arrays) plus
+# the %(seed_rows)s bars before it, flagged as seeds for the indicator windows.
+SELECT_RAW_BARS_INCREMENTAL = """
+WITH watermarks AS (
+    SELECT * FROM unnest(%(watermark_tickers)s::text[], %(watermark_dates)s::timestamp[])
+        AS w("Ticker", last_date)
+),
+ranked AS (
+    SELECT r."Date", r."Ticker", r."Open", r."High", r."Low", r."Close", r."Volume", w.last_date,
+           ROW_NUMBER() OVER (
+               PARTITION BY r."Ticker", r."Date" <= w.last_date
+               ORDER BY r."Date" DESC
+           ) AS seed_rank
+    FROM raw_stock_data r
+    LEFT JOIN watermarks w ON w."Ticker" = r."Ticker"
+    WHERE r."Ticker" = ANY(%(tickers)s)
+)
+SELECT "Date", "Ticker", "Open", "High", "Low", "Close", "Volume",
+       COALESCE("Date" <= last_date, FALSE) AS "Is_Seed"
+FROM ranked
+WHERE last_date IS NULL OR "Date" > last_date OR seed_rank <= %(seed_rows)s
+ORDER BY "Ticker", "Date";
+"""
+
+# --- DML: Select Per-Ticker Watermarks of Intraday Bars ---
+SELECT_RAW_INTRADAY_WATERMARKS = """
+SELECT "Ticker", MAX("Timestamp") FROM raw_intraday_bars
+WHERE "Ticker" = ANY(%s) AND "Interval" = %s
+GROUP BY "Ticker";
+"""
+
+# --- DML: Select Last Rolled-Up Bucket per Ticker and Rollup ---
+SELECT_INTRADAY_ROLLUP_WATERMARKS = """
+SELECT "Ticker", "Interval", MAX("Timestamp") FROM intraday_rollups
+WHERE "Ticker" = ANY(%s) AND "Source_Interval" = %s
+GROUP BY "Ticker", "Interval";
+"""
+
+# --- DML: Select Intraday Bars to Roll Up ---
+# Bars from each ticker's %(starts)s timestamp on (parallel arrays with
+# %(start_tickers)s; tickers without one are read in full). Ordered as the
+# vectorized rollup expects.
+SELECT_RAW_INTRADAY_BARS = """
+WITH starts AS (
+    SELECT * FROM unnest(%(start_tickers)s::text[], %(starts)s::timestamp[]) AS s("Ticker", start_at)
+)
+SELECT r."Timestamp", r."Ticker", r."Open", r."High", r."Low", r."Close", r."Volume"
+FROM raw_intraday_bars r
+LEFT JOIN starts s ON s."Ticker" = r."Ticker"
+WHERE r."Ticker" = ANY(%(tickers)s) AND r."Interval" = %(interval)s
+  AND (s.start_at IS NULL OR r."Timestamp" >= s.start_at)
+ORDER BY r."Ticker", r."Timestamp"
+"""
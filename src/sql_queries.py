@@ -31,6 +31,70 @@ CREATE TABLE IF NOT EXISTS dim_products (
 );
 """
 
+CREATE_FACT_ORDERS_TABLE = """
+CREATE TABLE IF NOT EXISTS fact_orders (
+    order_key SERIAL PRIMARY KEY,
+    transaction_id TEXT UNIQUE,
+    user_key INTEGER REFERENCES dim_users (user_key),
+    product_key INTEGER REFERENCES dim_products (product_key),
+    quantity INTEGER,
+    total_amount REAL,
+    order_timestamp TIMESTAMP
+);
+"""
+
+# Serves time-range scans of raw_transactions
+CREATE_RAW_TRANSACTIONS_TIMESTAMP_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_raw_transactions_timestamp ON raw_transactions (timestamp);
+"""
+
+# Ingestion order of the Postgres raw_transactions rows. Event timestamps
+# can arrive late, so the incremental scan follows this sequence instead;
+# the fact row keeps the sequence value of the raw row it came from.
+ADD_RAW_TRANSACTIONS_INGEST_SEQ = """
+ALTER TABLE raw_transactions ADD COLUMN IF NOT EXISTS ingest_seq BIGSERIAL;
+"""
+
+CREATE_RAW_TRANSACTIONS_INGEST_SEQ_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_raw_transactions_ingest_seq ON raw_transactions (ingest_seq);
+"""
+
+ADD_FACT_ORDERS_RAW_SEQ = """
+ALTER TABLE fact_orders ADD COLUMN IF NOT EXISTS raw_seq BIGINT;
+"""
+
+CREATE_FACT_ORDERS_RAW_SEQ_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_fact_orders_raw_seq ON fact_orders (raw_seq);
+"""
+
+# Secondary indexes for the SQLite staging copy of raw_transactions
+# (lookups by customer/product and time-range scans)
+CREATE_RAW_TRANSACTIONS_USER_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_raw_transactions_user_id ON raw_transactions (user_id);
+"""
+
+CREATE_RAW_TRANSACTIONS_PRODUCT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_raw_transactions_product_id ON raw_transactions (product_id);
+"""
+
+SQLITE_RAW_INDEX_QUERIES = [
+    CREATE_RAW_TRANSACTIONS_USER_INDEX,
+    CREATE_RAW_TRANSACTIONS_PRODUCT_INDEX,
+    CREATE_RAW_TRANSACTIONS_TIMESTAMP_INDEX
+]
+
+ALL_CREATE_QUERIES = [
+    CREATE_RAW_TRANSACTIONS_TABLE,
+    CREATE_RAW_TRANSACTIONS_TIMESTAMP_INDEX,
+    CREATE_DIM_USERS_TABLE,
+    CREATE_DIM_PRODUCTS_TABLE,
+    CREATE_FACT_ORDERS_TABLE,
+    ADD_RAW_TRANSACTIONS_INGEST_SEQ,
+    CREATE_RAW_TRANSACTIONS_INGEST_SEQ_INDEX,
+    ADD_FACT_ORDERS_RAW_SEQ,
+    CREATE_FACT_ORDERS_RAW_SEQ_INDEX
+]
+
 # --- Data Ingestion & Transformation Queries ---
 
 INSERT_RAW_TRANSACTION = """
@@ -38,17 +102,48 @@ INSERT INTO raw_transactions (transaction_id, user_id, product_id, quantity, pri
 VALUES (%s, %s, %s, %s, %s, %s);
 """
 
-INSERT_DIM_USER = """
+# SQLite variant used by ingestion_script: duplicates are skipped instead of raising
+INSERT_OR_IGNORE_RAW_TRANSACTION = """
+INSERT OR IGNORE INTO raw_transactions (transaction_id, user_id, product_id, quantity, price, timestamp)
+VALUES (?, ?, ?, ?, ?, ?);
+"""
+
+# Ordered by ingestion so that every committed chunk advances the high-water mark
+SELECT_RAW_TRANSACTIONS = """
+SELECT transaction_id, user_id, product_id, quantity, price, timestamp, ingest_seq
+FROM raw_transactions
+ORDER BY ingest_seq;
+"""
+
+# Rows ingested after the mark, whatever their event time
+SELECT_RAW_TRANSACTIONS_SINCE = """
+SELECT transaction_id, user_id, product_id, quantity, price, timestamp, ingest_seq
+FROM raw_transactions
+WHERE ingest_seq > %s
+ORDER BY ingest_seq;
+"""
+
+SELECT_FACT_HIGH_WATER_MARK = "SELECT MAX(raw_seq) FROM fact_orders"
+
+# Multi-row upserts for psycopg2.extras.execute_values (VALUES %s).
+# The no-op DO UPDATE makes RETURNING yield the surrogate key of existing rows too.
+UPSERT_DIM_USERS = """
 INSERT INTO dim_users (user_id, name, email, registration_date)
-VALUES (%s, %s, %s, %s)
-ON CONFLICT (user_id) DO NOTHING;
+VALUES %s
+ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+RETURNING user_id, user_key;
 """
 
-INSERT_DIM_PRODUCT = """
+UPSERT_DIM_PRODUCTS = """
 INSERT INTO dim_products (product_id, name, category, unit_price)
-VALUES (%s, %s, %s, %s)
-ON CONFLICT (product_id) DO NOTHING;
+VALUES %s
+ON CONFLICT (product_id) DO UPDATE SET product_id = EXCLUDED.product_id
+RETURNING product_id, product_key;
 """
 
-SELECT_USER_KEY = "SELECT user_key FROM dim_users WHERE user_id = %s"
-SELECT_PRODUCT_KEY = "SELECT product_key FROM dim_products WHERE product_id = %s"
\ No newline at end of file
+INSERT_FACT_ORDERS = """
+INSERT INTO fact_orders (transaction_id, user_key, product_key, quantity, total_amount, order_timestamp, raw_seq)
+VALUES %s
+ON CONFLICT (transaction_id) DO NOTHING
+RETURNING 1;
+"""
\ No newline at end of file
@@ -1,47 +1,116 @@
 import pandas as pd
-from src.db_utils import get_pg_connection
-from src.sql_definitions import SELECT_RAW_STOCK_DATA
+from src.artifacts import write_artifact
+from src.db_utils import pg_connection
+from src.indicator_store import get_ticker_watermarks
+from src.indicators import compute_indicators, load_indicator_config, lookback, output_columns, required_inputs
+from src.lake import read_bars
+from src.metrics import stage_timer, record_rows, record_round_trips
+from src.sql_definitions import (
+    CREATE_ANALYZED_STOCK_TABLE,
+    CREATE_STOCK_INDICATORS_TABLE,
+    SELECT_ANALYZED_STOCK_WATERMARKS,
+    SELECT_RAW_BARS,
+    SELECT_RAW_BARS_INCREMENTAL
+)
 
 TICKERS = ['AAPL', 'MSFT', 'GOOGL']
+# Indicators computed by transform_data; the INDICATOR_CONFIG env var can name a JSON config
+INDICATOR_CONFIG = load_indicator_config()
+# Where transform_data reads raw bars: the raw_stock_data table or the Parquet lake
+TRANSFORM_SOURCES = ('postgres', 'lake')
+# Where the analyzed data is stored: analyzed_stock_data (one column per
+# indicator) or stock_indicators (one row per indicator value, see src.indicator_store)
+STORAGE_LAYOUTS = ('wide', 'long')
 
-def calculate_sma(df, window):
-    df = df.sort_values(by='Date')
-    df[f'SMA_{window}'] = df['Close'].rolling(window=window).mean()
-    return df
-
-def transform_data():
-    all_transformed_data = pd.DataFrame()
-    conn = get_pg_connection()
-    
-    print("Starting data transformation...")
-    
+def get_analyzed_watermarks(conn, tickers):
+    """Returns {ticker: last analyzed Date} for the tickers in analyzed_stock_data."""
+    cursor = conn.cursor()
     try:
-        for ticker in TICKERS:
-            print(f"Processing {ticker}...")
-            
-            # Using pandas read_sql with %s placeholder for Postgres
-            df = pd.read_sql_query(SELECT_RAW_STOCK_DATA, conn, params=(ticker,))
-            
-            if df.empty:
-                print(f"Warning: No data for {ticker}. Skipping.")
-                continue
-            
-            df['Date'] = pd.to_datetime(df['Date'])
-            
-            # Technical Indicators
-            df = calculate_sma(df, 50)
-            df = calculate_sma(df, 200)
-            
-            transformed_df = df[['Date', 'Ticker', 'Close', 'SMA_50', 'SMA_200']].copy()
-            transformed_df['Date'] = transformed_df['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            all_transformed_data = pd.concat([all_transformed_data, transformed_df], ignore_index=True)
-            
-    except Exception as e:
-        print(f"Transformation error: {e}")
-        raise
+        cursor.execute(SELECT_ANALYZED_STOCK_WATERMARKS, (list(tickers),))
+        return dict(cursor.fetchall())
     finally:
-        conn.close()
-        
-    print("Transformation complete.")
-    return all_transformed_data
\ No newline at end of file
+        cursor.close()
+
+@stage_timer('transform')
+def transform_data(tickers=TICKERS, indicators=None, full_refresh=False, source='postgres', layout='wide'):
+    """
+    Computes the configured indicators (default INDICATOR_CONFIG) for all
+    tickers from one query, in one pass over the bars.
+    Incrementally, only bars after each ticker's last analyzed Date are returned,
+    seeded with the preceding bars the indicators look back on. Use
+    full_refresh=True after a raw backfill that rewrote older bars, or to
+    backfill a newly configured indicator.
+    With source='lake' the bars are read from the Parquet lake instead, so a
+    bulk recomputation only asks Postgres for the analyzed watermarks.
+    `layout` names the storage the watermarks come from; in the long layout a
+    ticker whose series are not all stored yet gets its full history.
+    """
+    if source not in TRANSFORM_SOURCES:
+        raise ValueError(f"Unknown transform source '{source}'. Available: {', '.join(TRANSFORM_SOURCES)}")
+    if layout not in STORAGE_LAYOUTS:
+        raise ValueError(f"Unknown storage layout '{layout}'. Available: {', '.join(STORAGE_LAYOUTS)}")
+    indicators = indicators or INDICATOR_CONFIG
+    seed_rows = lookback(indicators)
+
+    print("Starting data transformation...")
+
+    with pg_connection() as conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(CREATE_ANALYZED_STOCK_TABLE)
+            cursor.execute(CREATE_STOCK_INDICATORS_TABLE)
+            conn.commit()
+            cursor.close()
+
+            watermarks = {}
+            if not full_refresh:
+                if layout == 'long':
+                    series = ['Close'] + output_columns(indicators)
+                    watermarks = get_ticker_watermarks(conn, tickers, series)
+                else:
+                    watermarks = get_analyzed_watermarks(conn, tickers)
+                    record_round_trips('postgres', 'analyzed_stock_data')
+
+            if source == 'lake':
+                df = read_bars(tickers, watermarks, seed_rows, ['Close'] + required_inputs(indicators))
+            else:
+                if full_refresh:
+                    query, params = SELECT_RAW_BARS, {'tickers': list(tickers)}
+                else:
+                    query = SELECT_RAW_BARS_INCREMENTAL
+                    params = {'tickers': list(tickers), 'seed_rows': seed_rows,
+                              'watermark_tickers': list(watermarks),
+                              'watermark_dates': list(watermarks.values())}
+                df = pd.read_sql_query(query, conn, params=params)
+                record_round_trips('postgres', 'raw_stock_data')
+
+        except Exception as e:
+            print(f"Transformation error: {e}")
+            raise
+
+    if df.empty:
+        print("Warning: No new data to transform.")
+        return pd.DataFrame()
+
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = compute_indicators(df, indicators)
+
+    columns = ['Date', 'Ticker', 'Close'] + output_columns(indicators)
+    transformed_df = df.loc[~df['Is_Seed'].astype(bool), columns]
+    transformed_df = transformed_df.reset_index(drop=True)
+    transformed_df['Date'] = transformed_df['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    record_rows('transform', len(transformed_df))
+    print(f"Transformation complete. {len(transformed_df)} rows for {transformed_df['Ticker'].nunique()} tickers.")
+    return transformed_df
+
+def transform_to_artifact(tickers=TICKERS, indicators=None, full_refresh=False, source='postgres', layout='wide'):
+    """
+    Runs transform_data and stages the result as a columnar artifact.
+    Returns the artifact manifest (or None when there is nothing to load), so
+    only the manifest goes through XCom.
+    """
+    transformed_df = transform_data(tickers, indicators, full_refresh, source, layout)
+    if transformed_df.empty:
+        return None
+    return write_artifact(transformed_df, 'transformed')
@@ -1,102 +1,210 @@
-import psycopg2
-from src.db_utils import get_pg_connection
+from collections import OrderedDict
+from itertools import islice
+from psycopg2.extras import execute_values
+from src.db_utils import pg_connection
+from src.metrics import stage_timer, record_batch, record_rows, record_round_trips
 from src.sql_queries import (
     ALL_CREATE_QUERIES,
     SELECT_RAW_TRANSACTIONS,
-    INSERT_DIM_USER,
-    INSERT_DIM_PRODUCT,
-    SELECT_USER_KEY,
-    SELECT_PRODUCT_KEY,
-    INSERT_FACT_ORDER
+    SELECT_RAW_TRANSACTIONS_SINCE,
+    SELECT_FACT_HIGH_WATER_MARK,
+    UPSERT_DIM_USERS,
+    UPSERT_DIM_PRODUCTS,
+    INSERT_FACT_ORDERS
 )
 
+PAGE_SIZE = 5000          # rows per multi-row INSERT statement
+CHUNK_SIZE = 50000        # raw transactions per loaded (and committed) chunk
+KEY_CACHE_SIZE = 100000   # natural keys kept per dimension across batches
+
+class SurrogateKeyCache:
+    """Bounded LRU map of natural key -> surrogate key for one dimension."""
+
+    def __init__(self, max_size=KEY_CACHE_SIZE):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+
+    def get(self, natural_key):
+        surrogate_key = self.keys.get(natural_key)
+        if surrogate_key is not None:
+            self.keys.move_to_end(natural_key)
+        return surrogate_key
+
+    def put(self, natural_key, surrogate_key):
+        self.keys[natural_key] = surrogate_key
+        self.keys.move_to_end(natural_key)
+        if len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+
+    def clear(self):
+        self.keys.clear()
+
+# Shared by every batch loaded in this process
+USER_KEYS = SurrogateKeyCache()
+PRODUCT_KEYS = SurrogateKeyCache()
+
 def initialize_dwh(conn):
     cursor = conn.cursor()
     for query in ALL_CREATE_QUERIES:
         cursor.execute(query)
     conn.commit()
 
-def extract_raw_data(conn):
+def get_high_water_mark(conn):
+    """Returns the ingest_seq of the latest raw transaction loaded into fact_orders, or None."""
     cursor = conn.cursor()
-    cursor.execute(SELECT_RAW_TRANSACTIONS)
-    cols = [desc[0] for desc in cursor.description]
-    return [dict(zip(cols, row)) for row in cursor.fetchall()]
+    cursor.execute(SELECT_FACT_HIGH_WATER_MARK)
+    high_water = cursor.fetchone()[0]
+    cursor.close()
+    return high_water
 
-def transform_and_load(raw_data):
-    conn = get_pg_connection()
-    initialize_dwh(conn)
+def extract_raw_data(conn, since=None, chunk_size=CHUNK_SIZE):
+    """
+    Streams raw transactions (ingested after `since`, if given) as lists of at
+    most chunk_size dicts. Uses a server-side cursor, so memory stays
+    constant regardless of table size. The connection must not be committed
+    while the generator is being consumed.
+    """
+    cursor = conn.cursor(name='raw_transactions_stream')
+    cursor.itersize = chunk_size
+    if since is None:
+        cursor.execute(SELECT_RAW_TRANSACTIONS)
+    else:
+        cursor.execute(SELECT_RAW_TRANSACTIONS_SINCE, (since,))
+
+    try:
+        rows = iter(cursor)
+        chunk = list(islice(rows, chunk_size))
+        cols = [desc[0] for desc in cursor.description] if chunk else []
+        while chunk:
+            yield [dict(zip(cols, row)) for row in chunk]
+            chunk = list(islice(rows, chunk_size))
+    finally:
+        cursor.close()
+
+def resolve_keys(cursor, cache, upsert_query, dimension_rows, table):
+    """
+    Returns {natural_key: surrogate_key} for every row in dimension_rows
+    ({natural_key: row tuple}). Keys missing from the cache are upserted in
+    one multi-row statement whose RETURNING clause fills the cache.
+    """
+    resolved = {}
+    missing = []
+    for natural_key, row in dimension_rows.items():
+        surrogate_key = cache.get(natural_key)
+        if surrogate_key is None:
+            missing.append(row)
+        else:
+            resolved[natural_key] = surrogate_key
+
+    if missing:
+        returned = execute_values(cursor, upsert_query, missing, page_size=PAGE_SIZE, fetch=True)
+        record_round_trips('postgres', table, -(-len(missing) // PAGE_SIZE))
+        for natural_key, surrogate_key in returned:
+            cache.put(natural_key, surrogate_key)
+            resolved[natural_key] = surrogate_key
+    return resolved
+
+def load_batch(conn, raw_data):
+    """Loads one batch of raw transactions into the star schema and commits it."""
     cursor = conn.cursor()
-    
-    print("Loading dimensions...")
+
     unique_users = {}
     unique_products = {}
-    
-    for row in raw_data:        
+    for row in raw_data:
         u_id = row['user_id']
         p_id = row['product_id']
-        
+
         if u_id not in unique_users:
             unique_users[u_id] = (u_id, f"User_{u_id[:8]}", f"u_{u_id[:8]}@example.com", "2025-01-01")
-            
+
         if p_id not in unique_products:
             unique_products[p_id] = (p_id, f"Prod_{p_id[:8]}", "Category_A", 10.0)
-            
-    for user_data in unique_users.values():
-        cursor.execute(INSERT_DIM_USER, user_data)
-        
-    for product_data in unique_products.values():
-        cursor.execute(INSERT_DIM_PRODUCT, product_data)
-        
+
+    user_keys = resolve_keys(cursor, USER_KEYS, UPSERT_DIM_USERS, unique_users, 'dim_users')
+    product_keys = resolve_keys(cursor, PRODUCT_KEYS, UPSERT_DIM_PRODUCTS, unique_products, 'dim_products')
+    print(f"Dimensions resolved: {len(user_keys)} users, {len(product_keys)} products.")
+
+    facts = []
+    for row in raw_data:
+        user_key = user_keys.get(row['user_id'])
+        product_key = product_keys.get(row['product_id'])
+        if user_key is None or product_key is None:
+            print(f"Error loading record {row.get('transaction_id')}: unresolved dimension key")
+            record_rows('star_schema', 1, 'rejected')
+            continue
+
+        total_amount = float(row['price']) * int(row['quantity'])
+        facts.append((
+            row['transaction_id'],
+            user_key,
+            product_key,
+            row['quantity'],
+            total_amount,
+            row['timestamp'],
+            row.get('ingest_seq')
+        ))
+
+    # RETURNING only yields rows actually inserted, so duplicates are not counted
+    inserted = execute_values(cursor, INSERT_FACT_ORDERS, facts, page_size=PAGE_SIZE, fetch=True)
     conn.commit()
-    print(f"Dimensions loaded: {len(unique_users)} users, {len(unique_products)} products.")
-    
-    print("Loading facts...")
+    record_round_trips('postgres', 'fact_orders', -(-len(facts) // PAGE_SIZE))
+    record_rows('star_schema', len(inserted))
+    record_rows('star_schema', len(facts) - len(inserted), 'duplicate')
+    cursor.close()
+    return len(inserted)
+
+@stage_timer('star_schema')
+def load_chunks(conn, chunks):
+    """Loads an iterable of raw-transaction chunks, committing after each one."""
     loaded_count = 0
-    for row in raw_data:
+    for chunk in chunks:
         try:
-            cursor.execute(SELECT_USER_KEY, (row['user_id'],))
-            user_key = cursor.fetchone()[0]
-            
-            cursor.execute(SELECT_PRODUCT_KEY, (row['product_id'],))
-            product_key = cursor.fetchone()[0]
-            
-            total_amount = float(row['price']) * int(row['quantity'])
-            
-            fact_data = (
-                row['transaction_id'],
-                user_key,
-                product_key,
-                row['quantity'],
-                total_amount,
-                row['timestamp']
-            )
-            
-            cursor.execute(INSERT_FACT_ORDER, fact_data)
-            loaded_count += 1
-            
-        except Exception as e:
-            print(f"Error loading record {row.get('transaction_id')}: {e}")
-            
-    conn.commit()
-    conn.close()
-    print(f"Facts loaded: {loaded_count} records.")
+            loaded_count += load_batch(conn, chunk)
+            record_batch('star_schema', len(chunk))
+        except Exception:
+            conn.rollback()
+            # keys handed out inside the rolled-back transaction are no longer valid
+            USER_KEYS.clear()
+            PRODUCT_KEYS.clear()
+            raise
+        print(f"Chunk of {len(chunk)} transactions loaded ({loaded_count} facts so far).")
     return loaded_count
 
-def main():
+def transform_and_load(raw_data):
+    with pg_connection() as conn:
+        initialize_dwh(conn)
+        loaded_count = load_chunks(conn, [raw_data])
+        print(f"Facts loaded: {loaded_count} records.")
+        return loaded_count
+
+def main(full_refresh=False):
+    """
+    Streams unprocessed raw transactions into the warehouse chunk by chunk.
+    Only rows ingested after the fact table's high-water mark are read
+    unless full_refresh is set. Returns the number of facts loaded; errors
+    are reported and re-raised.
+    """
     print("Starting ETL process...")
     try:
-        conn = get_pg_connection()
-        raw_data = extract_raw_data(conn)
-        conn.close()
-        
-        if not raw_data:
-            print("No data found. Exiting.")
-            return
-            
-        transform_and_load(raw_data)
+        # The server-side cursor lives on its own connection, since every
+        # loaded chunk is committed on the other one.
+        with pg_connection() as read_conn, pg_connection() as write_conn:
+            initialize_dwh(write_conn)
+            since = None if full_refresh else get_high_water_mark(write_conn)
+            if since is not None:
+                print(f"Reading raw transactions ingested after #{since}...")
+
+            loaded_count = load_chunks(write_conn, extract_raw_data(read_conn, since))
+
+        if loaded_count == 0:
+            print("No new data found.")
+        else:
+            print(f"Facts loaded: {loaded_count} records.")
         print("ETL pipeline finished successfully.")
+        return loaded_count
     except Exception as e:
         print(f"Pipeline failed: {e}")
+        raise
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()